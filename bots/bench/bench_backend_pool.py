@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Benchmark: sesión aiohttp por mensaje vs. BackendClient con pool compartido.
+
+Uso:
+    python bots/bench/bench_backend_pool.py --requests 2000 --concurrency 50
+"""
+
+import time
+import asyncio
+import argparse
+import aiohttp
+
+from stubs import StubBackend, percentile
+from weatherkit.http import BackendClient
+
+
+async def per_request_session(url: str, payload: dict) -> None:
+    """Comportamiento anterior: una ClientSession nueva por cada mensaje"""
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=payload) as response:
+            await response.read()
+
+
+async def run(label: str, call, total: int, concurrency: int) -> None:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await call({'city': f'Ciudad {i % 50}', 'platform': 'bench'})
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{label:<22} {total / elapsed:>9.0f} req/s   "
+        f"p50 {percentile(latencies, 50) * 1000:>7.2f} ms   "
+        f"p99 {percentile(latencies, 99) * 1000:>7.2f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.002, help='latencia simulada del backend (s)')
+    args = parser.parse_args()
+
+    backend = StubBackend(latency=args.latency)
+    await backend.start()
+    url = f"{backend.base_url}/api/weather/bench"
+
+    try:
+        await run('sesión por mensaje', lambda p: per_request_session(url, p), args.requests, args.concurrency)
+
+        async with BackendClient() as client:
+            await run('pool compartido', lambda p: client.post(url, p), args.requests, args.concurrency)
+    finally:
+        await backend.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Benchmark: mensajes con varias ciudades, una por una vs. fan-out vs. endpoint batch.
+
+Cada mensaje pide `--cities` ciudades distintas (sin cache) a un backend
+falso con `--latency` segundos por request. Una de cada lista no existe,
+para verificar que su 404 no arrastra al resto.
+
+Uso:
+    python bots/bench/bench_multi_city.py --messages 200 --cities 5 --latency 0.05
+"""
+
+import time
+import asyncio
+import argparse
+
+from stubs import StubBackend, percentile
+from weatherkit.http import BackendClient
+from weatherkit.cache import WeatherCache
+from weatherkit.gazetteer import Resolution
+from weatherkit.resilience import ResilientBackend
+from weatherkit.batch import WeatherBatcher
+
+UNKNOWN = 'Ciudad Inexistente'
+
+
+async def run(label: str, backend: StubBackend, batch: bool, sequential: bool,
+              messages: int, cities: int) -> None:
+    backend.batch = batch
+    backend.requests = 0
+    async with BackendClient() as client:
+        resilient = ResilientBackend(client, hedge=False)
+        url = f"{backend.base_url}/api/weather/bench"
+        cache = WeatherCache(ttl_for=lambda response: None)
+        batcher = WeatherBatcher(cache, resilient, url, f"{backend.base_url}/api/weather/batch")
+
+        latencies = []
+        states = {}
+
+        async def one(i: int) -> None:
+            names = [f"Ciudad {i}-{n}" for n in range(cities - 1)] + [UNKNOWN]
+            resolutions = [Resolution(name, None, 'unknown') for name in names]
+            started = time.perf_counter()
+            if sequential:
+                # Comportamiento anterior: el usuario reintenta ciudad por ciudad
+                for name in names:
+                    response = await resilient.post(url, {'city': name})
+                    states[response.status] = states.get(response.status, 0) + 1
+            else:
+                for result in await batcher.lookup_many(resolutions, {'platform': 'bench'}):
+                    states[result.state] = states.get(result.state, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(messages)))
+        elapsed = time.perf_counter() - started
+
+    print(
+        f"{label:<14} {messages / elapsed:>8.1f} msg/s   "
+        f"p50 {percentile(latencies, 50) * 1000:>7.1f} ms   "
+        f"p99 {percentile(latencies, 99) * 1000:>7.1f} ms   "
+        f"requests {backend.requests:>5}   {states}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--cities', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    backend = StubBackend(latency=args.latency, unknown=[UNKNOWN])
+    await backend.start()
+    try:
+        await run('una por una', backend, False, True, args.messages, args.cities)
+        await run('fan-out', backend, False, False, args.messages, args.cities)
+        await run('batch', backend, True, False, args.messages, args.cities)
+    finally:
+        await backend.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Benchmark: armado de la respuesta con f-strings + any() vs. weatherkit.render.
+
+Uso:
+    python bots/bench/bench_render.py --iterations 200000
+"""
+
+import time
+import argparse
+
+from stubs import SAMPLE_WEATHER
+from weatherkit import render
+from weatherkit.model import WeatherReport
+
+DESCRIPTIONS = (
+    'cielo despejado', 'parcialmente nublado', 'lluvia ligera', 'tormenta eléctrica',
+    'nieve', 'niebla', 'overcast clouds', 'clear sky', 'llovizna', 'calor',
+)
+
+
+def legacy_emoji(description: str) -> str:
+    """Comportamiento anterior: una pasada de `in` por cada palabra clave"""
+    description_lower = description.lower()
+
+    if any(word in description_lower for word in ['sunny', 'clear', 'despejado', 'soleado']):
+        return '☀️'
+    elif any(word in description_lower for word in ['cloud', 'nublado', 'parcialmente']):
+        return '⛅'
+    elif any(word in description_lower for word in ['rain', 'lluvia', 'llovizna']):
+        return '🌧️'
+    elif any(word in description_lower for word in ['storm', 'tormenta']):
+        return '⛈️'
+    elif any(word in description_lower for word in ['snow', 'nieve']):
+        return '❄️'
+    elif any(word in description_lower for word in ['fog', 'mist', 'niebla']):
+        return '🌫️'
+    else:
+        return '🌤️'
+
+
+def legacy_render(data: dict, stale: bool = False) -> str:
+    """Comportamiento anterior del bot de WhatsApp"""
+    city = data.get('city', 'Ciudad desconocida')
+    country = data.get('country', '')
+    temp = data.get('temperature', 'N/A')
+    feels_like = data.get('feels_like', 'N/A')
+    description = data.get('description', 'Sin descripción')
+    humidity = data.get('humidity', 'N/A')
+    pressure = data.get('pressure', 'N/A')
+    wind_speed = data.get('wind_speed', 'N/A')
+
+    weather_emoji = legacy_emoji(description)
+
+    return (
+        f"{weather_emoji} *Clima en {city}*"
+        f"{f', {country}' if country else ''}\n\n"
+        f"🌡️ *Temperatura:* {temp}°C\n"
+        f"🤗 *Sensación térmica:* {feels_like}°C\n"
+        f"📝 *Descripción:* {description.capitalize()}\n"
+        f"💧 *Humedad:* {humidity}%\n"
+        f"🔽 *Presión:* {pressure} hPa\n"
+        f"💨 *Viento:* {wind_speed} m/s\n\n"
+        f"{'📅 _Últimos datos disponibles (el servicio no responde)_' if stale else '📅 _Actualizado ahora_'}\n\n"
+        f"💡 Envía el nombre de otra ciudad para más información"
+    )
+
+
+def run(label: str, func, samples: list, iterations: int) -> None:
+    count = len(samples)
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(samples[i % count])
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} {iterations / elapsed:>11.0f} renders/s   {elapsed / iterations * 1e6:>6.2f} µs/render")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    samples = [dict(SAMPLE_WEATHER, description=description) for description in DESCRIPTIONS]
+    reports = [WeatherReport.from_dict(sample) for sample in samples]
+
+    # Misma salida para WhatsApp: el cambio no altera el mensaje
+    for sample, report in zip(samples, reports):
+        assert legacy_render(sample) == render.WHATSAPP.render(report), sample['description']
+
+    run('f-string + any()', legacy_render, samples, args.iterations)
+    run('render.WHATSAPP', render.WHATSAPP.render, reports, args.iterations)
+    run('render.TELEGRAM', render.TELEGRAM.render, reports, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Benchmark: decodificar + renderizar una respuesta por mensaje, dict vs. WeatherReport.
+
+- dict (json): lo que hacía cada mensaje antes, json.loads del cuerpo
+  cacheado y lectura campo por campo con data.get.
+- dict (orjson): lo mismo con el backend rápido, si está instalado.
+- WeatherReport.from_bytes: primer mensaje de una ciudad (decodifica y valida).
+- WeatherReport cacheado: el resto de los mensajes (el cache ya guarda el reporte).
+
+También mide la memoria por entrada del cache: cuerpo crudo, dict decodificado
+y WeatherReport.
+
+Uso:
+    python bots/bench/bench_report.py --iterations 200000
+"""
+
+import json
+import time
+import argparse
+import tracemalloc
+
+from stubs import SAMPLE_WEATHER
+from loadgen import CITIES
+from weatherkit import render, model
+from weatherkit.model import WeatherReport
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DESCRIPTIONS = ('nubes dispersas', 'cielo despejado', 'lluvia ligera', 'niebla', 'overcast clouds')
+RENDERER = render.WHATSAPP
+
+
+def render_dict(data: dict, stale: bool = False) -> str:
+    """El renderer tal como leía los dicts antes de WeatherReport"""
+    get = data.get
+    emoji, description = RENDERER._describe(get('description', 'Sin descripción'))
+    city, country = RENDERER._place(get('city', 'Ciudad desconocida'), get('country', ''))
+    return RENDERER.template % (
+        emoji, city, country,
+        get('temperature', 'N/A'), get('feels_like', 'N/A'), description,
+        get('humidity', 'N/A'), get('pressure', 'N/A'), get('wind_speed', 'N/A'),
+        RENDERER.stale_footer if stale else RENDERER.footer,
+    )
+
+
+def run(label: str, func, samples: list, iterations: int) -> None:
+    count = len(samples)
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(samples[i % count])
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {iterations / elapsed:>11.0f} msg/s   {elapsed / iterations * 1e6:>6.2f} µs/msg")
+
+
+def footprint(build, bodies: list) -> float:
+    """Bytes por entrada que quedan vivos tras construir una por cuerpo"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(body) for body in bodies]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(kept)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    bodies = [
+        json.dumps(dict(SAMPLE_WEATHER, city=city, description=DESCRIPTIONS[i % len(DESCRIPTIONS)])).encode()
+        for i, city in enumerate(CITIES)
+    ]
+    reports = [WeatherReport.from_bytes(body) for body in bodies]
+
+    # El reporte no cambia el mensaje
+    for body, report in zip(bodies, reports):
+        assert render_dict(json.loads(body)) == RENDERER.render(report)
+
+    print(f"backend JSON de weatherkit: {model.JSON_BACKEND}")
+    run('dict (json) + render', lambda body: render_dict(json.loads(body)), bodies, args.iterations)
+    if orjson is not None:
+        run('dict (orjson) + render', lambda body: render_dict(orjson.loads(body)), bodies, args.iterations)
+    run('WeatherReport.from_bytes', lambda body: RENDERER.render(WeatherReport.from_bytes(body)),
+        bodies, args.iterations)
+    run('WeatherReport cacheado', RENDERER.render, reports, args.iterations)
+
+    # Muchas entradas distintas, como un cache lleno
+    many = [body.replace(b'"temperature": 21.4', f'"temperature": {i % 400 / 10}'.encode())
+            for i, body in enumerate(bodies * 50)]
+    print(f"\nmemoria por entrada del cache ({len(many)} entradas):")
+    print(f"{'cuerpo crudo (bytes)':<28} {footprint(lambda body: bytes(bytearray(body)), many):>7.0f} B")
+    print(f"{'dict decodificado':<28} {footprint(json.loads, many):>7.0f} B")
+    print(f"{'WeatherReport':<28} {footprint(WeatherReport.from_bytes, many):>7.0f} B")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Benchmark de arranque de los bots: tiempo de import y tiempo hasta estar listo.
+
+1. Import: ejecuta `python -X importtime -c "import main"` en el directorio
+   del bot (con el .pyc ya generado) y muestra el total y los módulos que
+   más pesan (tiempo acumulado, mediana de `--runs` corridas).
+2. Arranque: lanza el bot real (`python main.py`) contra stubs locales de la
+   API, Telegram y Green API, le manda un mensaje en el mismo instante y
+   mide cuándo responde /healthz, cuándo /readyz da 200 y cuándo llega la
+   primera respuesta. Con `--snapshot N` el bot arranca con un snapshot de
+   N ciudades para precalentar.
+
+Uso:
+    python bots/bench/bench_startup.py telegram
+    python bots/bench/bench_startup.py whatsapp --snapshot 20 --runs 5
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+from stubs import StubBackend, StubTelegramAPI, StubGreenAPI, ServerThread, BOTS_DIR
+from loadgen import CITIES
+
+
+def bot_env(extra: dict = None) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.path.join(BOTS_DIR, 'shared'))
+    env.update(extra or {})
+    return env
+
+
+def import_times(bot: str) -> dict:
+    """módulo -> (propio, acumulado, profundidad) en µs de una corrida de -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=os.path.join(BOTS_DIR, bot), env=bot_env(), capture_output=True, text=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(own), int(cumulative), depth)
+    return times
+
+
+def report_imports(bot: str, runs: int, top: int) -> None:
+    import_times(bot)  # generar los .pyc antes de medir
+    samples = [import_times(bot) for _ in range(runs)]
+    total = statistics.median(sample['main'][1] for sample in samples) / 1000
+    print(f"== import de {bot}/main.py: {total:.1f} ms (mediana de {runs}) ==")
+    # Sólo los imports directos de main y sus hijos inmediatos
+    names = {name for name, (_, _, depth) in samples[0].items() if 1 <= depth <= 2}
+    rows = []
+    for name in names:
+        cumulative = [sample[name][1] for sample in samples if name in sample]
+        own = [sample[name][0] for sample in samples if name in sample]
+        rows.append((statistics.median(cumulative) / 1000, statistics.median(own) / 1000,
+                     samples[0][name][2], name))
+    print(f"{'acumulado':>10} {'propio':>8}  módulo")
+    for cumulative, own, depth, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative:>8.1f}ms {own:>6.1f}ms  {'  ' * (depth - 1)}{name}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def probe(url: str) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=0.5) as response:
+            return response.status == 200
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return False
+
+
+def boot_once(bot: str, stubs: ServerThread, backend, provider, snapshot: int, timeout: float,
+              tmp: str) -> dict:
+    """Lanzar el bot con su estado en `tmp` y medir healthz / readyz / primera respuesta"""
+    port = free_port()
+    warmup = os.path.join(tmp, 'warmup.json')
+    if snapshot and not os.path.exists(warmup):
+        with open(warmup, 'w', encoding='utf-8') as f:
+            json.dump({'cities': CITIES[:snapshot]}, f)
+    env = bot_env({
+        'API_BASE_URL': backend.base_url,
+        'METRICS_PORT': str(port),
+        'METRICS_HOST': '127.0.0.1',
+        'WARMUP_SNAPSHOT_PATH': warmup,
+        'WARMUP_TOP_N': str(snapshot),
+        'CACHE_SNAPSHOT_PATH': os.path.join(tmp, 'cache.snapshot'),
+        'PROFILES_PATH': os.path.join(tmp, 'profiles.db'),
+        'SUBSCRIPTIONS_PATH': os.path.join(tmp, 'subscriptions.db'),
+        'WHATSAPP_SESSION_PATH': tmp,
+        'WHATSAPP_POLL_IDLE_MIN': '0.01',
+        'DIAG_DIR': tmp,
+        'LOG_LEVEL': 'WARNING',
+        'TELEGRAM_BOT_TOKEN': '123456:STUB',
+        'TELEGRAM_BASE_URL': f"{provider.base_url}/bot",
+        'GREEN_API_INSTANCE_ID': '1101000000',
+        'GREEN_API_TOKEN': 'stub',
+        'GREEN_API_HOST': provider.base_url,
+    })
+    replies_before = provider.log.replies
+    requests_before = backend.requests
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'main.py'], cwd=os.path.join(BOTS_DIR, bot), env=env)
+    stubs.call(provider.inject, 4242, CITIES[0])
+    marks = {}
+    try:
+        while time.perf_counter() - started < timeout and len(marks) < 3:
+            if process.poll() is not None:
+                raise RuntimeError(f"el bot terminó con código {process.returncode}")
+            elapsed = (time.perf_counter() - started) * 1000
+            if 'healthz' not in marks and probe(f"http://127.0.0.1:{port}/healthz"):
+                marks['healthz'] = elapsed
+            if 'healthz' in marks and 'readyz' not in marks and probe(f"http://127.0.0.1:{port}/readyz"):
+                marks['readyz'] = elapsed
+            if 'first_reply' not in marks and provider.log.replies > replies_before:
+                marks['first_reply'] = elapsed
+            time.sleep(0.005)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    marks['backend_requests'] = backend.requests - requests_before
+    return marks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('bot', choices=['telegram', 'whatsapp'])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15, help='módulos a mostrar en el desglose')
+    parser.add_argument('--snapshot', type=int, default=0, help='ciudades en el snapshot de precalentamiento')
+    parser.add_argument('--latency', type=float, default=0.05, help='latencia del backend falso (s)')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--keep-state', action='store_true',
+                        help='las corridas comparten directorio (arrancan con el snapshot del cache anterior)')
+    args = parser.parse_args()
+
+    report_imports(args.bot, args.runs, args.top)
+
+    backend = StubBackend(latency=args.latency)
+    provider = StubTelegramAPI() if args.bot == 'telegram' else StubGreenAPI(hold=0.2)
+    stubs = ServerThread(backend, provider)
+    stubs.start()
+    runs = []
+    shared = tempfile.TemporaryDirectory() if args.keep_state else None
+    try:
+        for _ in range(args.runs):
+            if shared is not None:
+                runs.append(boot_once(args.bot, stubs, backend, provider, args.snapshot, args.timeout, shared.name))
+                continue
+            with tempfile.TemporaryDirectory() as tmp:
+                runs.append(boot_once(args.bot, stubs, backend, provider, args.snapshot, args.timeout, tmp))
+    finally:
+        stubs.stop()
+        if shared is not None:
+            shared.cleanup()
+
+    print(f"\n== arranque de {args.bot} (snapshot de {args.snapshot} ciudades, mediana de {args.runs}) ==")
+    for mark in ('healthz', 'readyz', 'first_reply'):
+        values = [run[mark] for run in runs if mark in run]
+        shown = f"{statistics.median(values):8.0f} ms" if values else "   (nunca)"
+        print(f"{mark:<12}{shown}")
+    print(f"{'backend':<12}{statistics.median(run['backend_requests'] for run in runs):8.0f} requests")
+    if args.keep_state:
+        print(f"{'por corrida':<12}{' '.join(str(run['backend_requests']) for run in runs)} requests al backend")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Benchmark del scheduler de suscripciones diarias.
+
+Carga `--subscriptions` suscripciones repartidas en `--cities` ciudades y
+mide: alta en la rueda de tiempo, memoria, carga desde SQLite y un tick en
+el que vencen `--due` suscripciones (una consulta de pronóstico por
+ciudad contra un backend falso, envíos a un sender que sólo cuenta).
+
+Uso:
+    python bots/bench/bench_subscriptions.py --subscriptions 200000 --due 5000
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+from stubs import StubBackend
+from weatherkit import render
+from weatherkit.http import BackendClient
+from weatherkit.resilience import ResilientBackend
+from weatherkit.subscriptions import (
+    SubscriptionScheduler, SubscriptionStore, ForecastSource, DailyTimerWheel, MINUTES_PER_DAY
+)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscriptions', type=int, default=200000)
+    parser.add_argument('--cities', type=int, default=500)
+    parser.add_argument('--due', type=int, default=5000, help='suscripciones que vencen en el tick medido')
+    parser.add_argument('--latency', type=float, default=0.05, help='latencia del backend falso (s)')
+    parser.add_argument('--send-rate', type=float, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    cities = [f'Ciudad {i}' for i in range(args.cities)]
+    busy = 7 * 60
+    rows = [
+        (f'chat-{i}', rng.choice(cities), busy if i < args.due else rng.randrange(MINUTES_PER_DAY))
+        for i in range(args.subscriptions)
+    ]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    wheel = DailyTimerWheel()
+    for chat_id, city, minute in rows:
+        wheel.add(chat_id, city, minute)
+    elapsed = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"alta en rueda    {len(rows) / elapsed:>10.0f} subs/s   memoria {memory / 2 ** 20:.1f} MiB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SubscriptionStore(os.path.join(tmp, 'subscriptions.db'))
+        db = store._connect()
+        with db:
+            db.executemany('INSERT INTO subscriptions (chat_id, city, minute) VALUES (?, ?, ?)', rows)
+
+        backend = StubBackend(latency=args.latency)
+        await backend.start()
+        sent = 0
+
+        async def send(chat_id, text):
+            nonlocal sent
+            sent += 1
+
+        async with BackendClient() as client:
+            resilient = ResilientBackend(client)
+            scheduler = SubscriptionScheduler(
+                store, ForecastSource(resilient, backend.base_url),
+                render.TELEGRAM_FORECAST.render, send, send_rate=args.send_rate
+            )
+            started = time.perf_counter()
+            await scheduler.start()
+            print(f"carga SQLite     {time.perf_counter() - started:>10.2f} s      {len(scheduler.wheel)} suscripciones")
+
+            due = scheduler.wheel.due(busy)
+            started = time.perf_counter()
+            await scheduler._tick(busy)
+            elapsed = time.perf_counter() - started
+            print(
+                f"tick {busy // 60:02d}:{busy % 60:02d}       {elapsed:>10.2f} s      "
+                f"{sent} envíos, {len(due)} ciudades, {backend.requests} requests al backend"
+            )
+            await scheduler.stop()
+        await backend.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Prueba de carga del bot de Telegram con updates sintéticos.
+
+Los updates pasan por PerUserUpdateProcessor y el handler real
+(TelegramWeatherBot.handle_weather_request) contra un backend falso. Se mide
+throughput, latencia, gauges máximos y se verifica el orden por usuario.
+
+Uso:
+    python bots/bench/bench_telegram_load.py --updates 5000 --users 300
+"""
+
+import time
+import random
+import asyncio
+import logging
+import argparse
+from collections import defaultdict
+from types import SimpleNamespace
+
+from stubs import StubBackend, percentile, load_bot
+
+CITIES = ['Buenos Aires', 'Madrid', 'Londres', 'Rosario', 'Córdoba', 'Lima', 'Montevideo', 'Paris']
+
+
+class FakeTelegramBot:
+    """Bot de Telegram falso: registra los mensajes en vez de enviarlos"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        pass
+
+
+def make_update(update_id: int, user_id: int, text: str, fake_bot) -> object:
+    from telegram import Update
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+    data = {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user,
+            'text': text,
+        },
+    }
+    return Update.de_json(data, fake_bot)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--rps', type=float, default=2000, help='tasa de llegada de updates')
+    parser.add_argument('--latency', type=float, default=0.02, help='latencia del backend falso (s)')
+    parser.add_argument('--max-in-flight', type=int, default=32)
+    parser.add_argument('--max-pending', type=int, default=256)
+    parser.add_argument('--user-rate', type=float, default=1000)
+    parser.add_argument('--no-cache', action='store_true', help='cada update llega al backend')
+    args = parser.parse_args()
+
+    telegram_bot = load_bot('telegram')
+    from concurrency import PerUserUpdateProcessor
+    logging.getLogger().setLevel(logging.WARNING)
+
+    backend = StubBackend(latency=args.latency)
+    await backend.start()
+
+    bot = telegram_bot.TelegramWeatherBot()
+    bot.api_url = f"{backend.base_url}/api/weather/telegram"
+    await bot.backend.start()
+    if args.no_cache:
+        bot.cache.ttl_for = lambda response: None
+
+    fake_bot = FakeTelegramBot()
+    context = SimpleNamespace(bot=fake_bot)
+    processor = PerUserUpdateProcessor(
+        max_in_flight=args.max_in_flight, max_pending=args.max_pending,
+        user_max_pending=10_000, user_rate=args.user_rate, user_burst=args.user_rate
+    )
+    await processor.initialize()
+
+    latencies = []
+    order = defaultdict(list)
+    peaks = {'in_flight': 0, 'queue_depth': 0}
+
+    async def handle(update, enqueued: float):
+        await bot.handle_weather_request(update, context)
+        latencies.append(time.perf_counter() - enqueued)
+        order[update.effective_user.id].append(update.update_id)
+
+    async def sample_gauges():
+        while True:
+            stats = processor.stats()
+            for key in peaks:
+                peaks[key] = max(peaks[key], stats[key])
+            await asyncio.sleep(0.005)
+
+    # Popularidad sesgada: pocos usuarios mandan la mayoría de los mensajes
+    weights = [1 / (rank + 1) for rank in range(args.users)]
+    users = random.choices(range(1, args.users + 1), weights=weights, k=args.updates)
+
+    sampler = asyncio.create_task(sample_gauges())
+    tasks = []
+    started = time.perf_counter()
+    for update_id, user_id in enumerate(users, 1):
+        update = make_update(update_id, user_id, random.choice(CITIES), fake_bot)
+        coroutine = handle(update, time.perf_counter())
+        tasks.append(asyncio.create_task(processor.process_update(update, coroutine)))
+        # Respetar la tasa de llegada sin depender de la granularidad de sleep()
+        ahead = started + update_id / args.rps - time.perf_counter()
+        await asyncio.sleep(ahead if ahead > 0 else 0)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+
+    in_order = all(ids == sorted(ids) for ids in order.values())
+    stats = processor.stats()
+    print(f"updates procesados  {len(latencies)} / {args.updates} en {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:.0f} upd/s)")
+    print(f"latencia            p50 {percentile(latencies, 50) * 1000:.1f} ms   "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"picos               in_flight {peaks['in_flight']}   queue_depth {peaks['queue_depth']}")
+    print(f"descartados         sobrecarga {stats['shed']}   flood {stats['flooded']}")
+    print(f"orden por usuario   {'OK' if in_order else 'ROTO'}")
+    print(f"requests al backend {backend.requests}   cache {bot.cache.stats()}")
+
+    await processor.shutdown()
+    await bot.backend.close()
+    await backend.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
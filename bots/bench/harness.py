@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Harness de carga de punta a punta para los bots, sin salir a internet.
+
+Levanta stubs de la API de Symfony, la Bot API de Telegram y Green API en
+un hilo aparte, arranca el bot real apuntando a ellos (handlers, cache,
+colas y dispatchers de verdad) y le inyecta un flujo de mensajes sintético
+o grabado. Al final informa throughput, latencia mensaje -> respuesta
+(p50/p95/p99), memoria y lag del event loop del bot.
+
+Uso:
+    python bots/bench/harness.py telegram --messages 5000 --rps 500
+    python bots/bench/harness.py whatsapp --messages 1000 --rps 100 --error-rate 0.02
+    python bots/bench/harness.py whatsapp --workers 4 --messages 2000 --rps 300
+    python bots/bench/harness.py telegram --record stream.jsonl --messages 2000
+    python bots/bench/harness.py telegram --replay stream.jsonl --speed 2
+    python bots/bench/harness.py telegram --json run.json --baseline base.json --tolerance 0.2
+
+Con --baseline el proceso termina con código 1 si el throughput bajó o la
+latencia p95/p99 subió más que --tolerance respecto del reporte guardado.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+
+from stubs import StubBackend, StubTelegramAPI, StubGreenAPI, ServerThread, percentile, load_bot
+from loadgen import synthetic, read_recording, write_recording, paced, UNKNOWN_CITY
+
+# Límites del proveedor que se levantan por defecto: el harness mide el código
+# del bot, no la cuota de la cuenta (usar --real-limits para dejarlos)
+BENCH_ENV = {
+    'TELEGRAM_USER_RATE': '1000000',
+    'TELEGRAM_USER_BURST': '1000000',
+    'TELEGRAM_USER_MAX_PENDING': '1000000',
+    'WHATSAPP_SEND_RATE': '1000000',
+    'WHATSAPP_SEND_BURST': '1000000',
+    'WHATSAPP_CHAT_RATE': '1000000',
+    'WHATSAPP_CHAT_BURST': '1000000',
+    'WHATSAPP_POLL_IDLE_MIN': '0.01',
+    'METRICS_PORT': '0',
+}
+
+
+class LoopLag:
+    """Mide cuánto se atrasa un sleep corto: el lag del event loop"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.samples = []
+
+    async def run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+
+def rss_mib() -> float:
+    """RSS actual del proceso (Linux)"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def inject(stubs: ServerThread, stub, messages: list, speed: float) -> float:
+    """Inyectar el flujo en el stub del proveedor; devuelve el instante de inicio"""
+    started = time.perf_counter()
+    async for message in paced(messages, speed):
+        stubs.call(stub.inject, message.user, message.text)
+    return started
+
+
+async def drain(log, expected: int, timeout: float) -> None:
+    """Esperar todas las respuestas o hasta `timeout` segundos sin progreso"""
+    last_count, last_progress = -1, time.perf_counter()
+    while log.replies < expected:
+        if log.replies != last_count:
+            last_count, last_progress = log.replies, time.perf_counter()
+        elif time.perf_counter() - last_progress > timeout:
+            break
+        await asyncio.sleep(0.05)
+
+
+async def drive_telegram(args, messages: list, stubs: ServerThread, provider) -> float:
+    module = load_bot('telegram')
+    from concurrency import PerUserUpdateProcessor
+    from telegram.ext import Application
+    logging.getLogger().setLevel(logging.ERROR)
+
+    bot = module.TelegramWeatherBot()
+    if args.no_cache:
+        bot.cache.ttl_for = lambda response: None
+    application = (
+        Application.builder()
+        .token('123456:STUB')
+        .base_url(f"{provider.base_url}/bot")
+        .concurrent_updates(PerUserUpdateProcessor())
+        .build()
+    )
+    bot.register_handlers(application)
+
+    async with application:
+        await bot.on_startup(application)
+        await application.start()
+        await application.updater.start_polling(
+            poll_interval=0, timeout=1, allowed_updates=module.ALLOWED_UPDATES
+        )
+        try:
+            started = await inject(stubs, provider, messages, args.speed)
+            await drain(provider.log, len(messages), args.drain_timeout)
+        finally:
+            await application.updater.stop()
+            await application.stop()
+            await bot.on_shutdown(application)
+    return started
+
+
+async def drive_whatsapp(args, messages: list, stubs: ServerThread, provider) -> float:
+    module = load_bot('whatsapp')
+    logging.getLogger().setLevel(logging.ERROR)
+
+    if args.workers:
+        # Modo multiproceso: los workers son procesos hijos contra los mismos stubs
+        supervisor = module.build_supervisor(workers=args.workers)
+        running = asyncio.create_task(supervisor.run())
+        try:
+            # Medir el régimen estable, no el arranque de los procesos
+            while len(supervisor.ring.nodes) < args.workers and not running.done():
+                await asyncio.sleep(0.05)
+            started = await inject(stubs, provider, messages, args.speed)
+            await drain(provider.log, len(messages), args.drain_timeout)
+        finally:
+            running.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+        return started
+
+    bot = module.WhatsAppWeatherBot()
+    if args.no_cache:
+        bot.cache.ttl_for = lambda response: None
+    if not await bot.initialize_api():
+        raise RuntimeError("El stub de Green API no inicializó")
+    await bot.start_services()
+    polling = asyncio.create_task(bot.start_polling())
+    try:
+        started = await inject(stubs, provider, messages, args.speed)
+        await drain(provider.log, len(messages), args.drain_timeout)
+    finally:
+        polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+        await bot.stop_services()
+    return started
+
+
+def build_report(args, messages: list, provider, backend, lag: LoopLag, started: float) -> dict:
+    log = provider.log
+    duration = max(1e-9, log.last_reply - started) if log.last_reply else 0.0
+    return {
+        'bot': args.bot,
+        'messages': len(messages),
+        'offered_rps': round(len(messages) / max(1e-9, messages[-1].at / args.speed), 1) if messages else 0,
+        'replies': log.replies,
+        'unanswered': log.unanswered,
+        'unmatched': log.unmatched,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(log.replies / duration, 1) if duration else 0.0,
+        'latency_ms': {
+            f'p{pct}': round(percentile(log.latencies, pct) * 1000, 2) for pct in (50, 95, 99)
+        } | {'max': round(max(log.latencies, default=0) * 1000, 2)},
+        'backend_requests': backend.requests,
+        'injected': {
+            'backend_errors': backend.injected_errors,
+            'backend_slow': backend.injected_slow,
+            'send_errors': provider.injected_errors,
+        },
+        'rss_mib': round(rss_mib(), 1),
+        'peak_rss_mib': round(peak_rss_mib(), 1),
+        'loop_lag_ms': {
+            f'p{pct}': round(percentile(lag.samples, pct) * 1000, 2) for pct in (50, 99)
+        } | {'max': round(max(lag.samples, default=0) * 1000, 2)},
+    }
+
+
+def print_report(report: dict) -> None:
+    latency, lag, injected = report['latency_ms'], report['loop_lag_ms'], report['injected']
+    print(f"== {report['bot']}: {report['messages']} mensajes @ {report['offered_rps']} rps ==")
+    print(
+        f"respuestas  {report['replies']}   sin respuesta {report['unanswered']}   "
+        f"sin emparejar {report['unmatched']}   duración {report['duration_s']:.2f} s"
+    )
+    print(f"throughput  {report['throughput_rps']:.1f} msg/s")
+    print(
+        f"latencia    p50 {latency['p50']:.1f} ms   p95 {latency['p95']:.1f} ms   "
+        f"p99 {latency['p99']:.1f} ms   max {latency['max']:.1f} ms"
+    )
+    print(
+        f"backend     {report['backend_requests']} requests   errores inyectados "
+        f"{injected['backend_errors']}   lentos {injected['backend_slow']}   "
+        f"fallas de envío {injected['send_errors']}"
+    )
+    print(f"memoria     rss {report['rss_mib']:.1f} MiB   pico {report['peak_rss_mib']:.1f} MiB")
+    print(f"event loop  lag p50 {lag['p50']:.2f} ms   p99 {lag['p99']:.2f} ms   max {lag['max']:.2f} ms")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regresiones respecto de un reporte anterior (lista vacía si no hay)"""
+    problems = []
+    if report['throughput_rps'] < baseline['throughput_rps'] * (1 - tolerance):
+        problems.append(
+            f"throughput {report['throughput_rps']} < {baseline['throughput_rps']} msg/s"
+        )
+    for pct in ('p95', 'p99'):
+        now, before = report['latency_ms'][pct], baseline['latency_ms'][pct]
+        if now > before * (1 + tolerance):
+            problems.append(f"latencia {pct} {now} > {before} ms")
+    return problems
+
+
+async def run(args, messages: list) -> dict:
+    backend = StubBackend(
+        latency=args.latency, unknown=[UNKNOWN_CITY], error_rate=args.error_rate,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency, seed=args.seed
+    )
+    if args.bot == 'telegram':
+        provider = StubTelegramAPI(send_latency=args.send_latency, send_error_rate=args.send_error_rate,
+                                   seed=args.seed)
+    else:
+        provider = StubGreenAPI(send_latency=args.send_latency, send_error_rate=args.send_error_rate,
+                                seed=args.seed)
+    stubs = ServerThread(backend, provider)
+    stubs.start()
+
+    session = tempfile.TemporaryDirectory()
+    os.environ.update({
+        'API_BASE_URL': backend.base_url,
+        'SUBSCRIPTIONS_PATH': os.path.join(session.name, 'subscriptions.db'),
+        'WHATSAPP_SESSION_PATH': session.name,
+        'WARMUP_SNAPSHOT_PATH': os.path.join(session.name, 'warmup.json'),
+        'CACHE_SNAPSHOT_PATH': os.path.join(session.name, 'cache.snapshot'),
+        'PROFILES_PATH': os.path.join(session.name, 'profiles.db'),
+        'GREEN_API_INSTANCE_ID': '1101000000',
+        'GREEN_API_TOKEN': 'stub',
+        'GREEN_API_HOST': provider.base_url,
+    })
+
+    lag = LoopLag()
+    lag_task = asyncio.create_task(lag.run())
+    try:
+        if args.bot == 'telegram':
+            started = await drive_telegram(args, messages, stubs, provider)
+        else:
+            started = await drive_whatsapp(args, messages, stubs, provider)
+        return build_report(args, messages, provider, backend, lag, started)
+    finally:
+        lag_task.cancel()
+        stubs.stop()
+        session.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('bot', choices=['telegram', 'whatsapp'])
+    stream = parser.add_argument_group('flujo de mensajes')
+    stream.add_argument('--messages', type=int, default=2000)
+    stream.add_argument('--rps', type=float, default=200, help='tasa de llegada (Poisson)')
+    stream.add_argument('--users', type=int, default=300)
+    stream.add_argument('--city-skew', type=float, default=1.1, help='exponente Zipf de popularidad de ciudades')
+    stream.add_argument('--user-skew', type=float, default=1.0, help='exponente Zipf de actividad de usuarios')
+    stream.add_argument('--multi-rate', type=float, default=0.05, help='fracción de mensajes con varias ciudades')
+    stream.add_argument('--unknown-rate', type=float, default=0.02, help='fracción de ciudades inexistentes')
+    stream.add_argument('--seed', type=int, default=1)
+    stream.add_argument('--replay', help='reproducir un flujo grabado (JSONL) en vez del sintético')
+    stream.add_argument('--record', help='guardar el flujo usado en JSONL')
+    stream.add_argument('--speed', type=float, default=1.0, help='acelerar (>1) o frenar el flujo')
+    faults = parser.add_argument_group('stubs e inyección de fallas')
+    faults.add_argument('--latency', type=float, default=0.02, help='latencia del backend (s)')
+    faults.add_argument('--error-rate', type=float, default=0.0, help='fracción de 500 del backend')
+    faults.add_argument('--slow-rate', type=float, default=0.0, help='fracción de respuestas lentas del backend')
+    faults.add_argument('--slow-latency', type=float, default=1.0)
+    faults.add_argument('--send-latency', type=float, default=0.005, help='latencia de envío del proveedor (s)')
+    faults.add_argument('--send-error-rate', type=float, default=0.0, help='fracción de 429 al enviar')
+    run_opts = parser.add_argument_group('ejecución y reporte')
+    run_opts.add_argument('--no-cache', action='store_true', help='cada mensaje llega al backend')
+    run_opts.add_argument('--workers', type=int, default=0,
+                          help='whatsapp: procesos worker detrás del supervisor (0 = un solo proceso)')
+    run_opts.add_argument('--real-limits', action='store_true', help='no levantar los límites de tasa del proveedor')
+    run_opts.add_argument('--env', action='append', default=[], metavar='CLAVE=VALOR',
+                          help='variable de entorno para el bot (se puede repetir)')
+    run_opts.add_argument('--drain-timeout', type=float, default=10.0)
+    run_opts.add_argument('--json', help='guardar el reporte en JSON')
+    run_opts.add_argument('--baseline', help='reporte JSON anterior para detectar regresiones')
+    run_opts.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if not args.real_limits:
+        for key, value in BENCH_ENV.items():
+            os.environ.setdefault(key, value)
+    for item in args.env:
+        key, _, value = item.partition('=')
+        os.environ[key] = value
+
+    if args.replay:
+        messages = read_recording(args.replay)
+    else:
+        messages = synthetic(
+            args.messages, args.rps, args.users, args.city_skew, args.user_skew,
+            args.multi_rate, args.unknown_rate, args.seed
+        )
+    if args.record:
+        write_recording(args.record, messages)
+
+    report = asyncio.run(run(args, messages))
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESIÓN: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
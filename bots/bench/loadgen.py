@@ -0,0 +1,89 @@
+"""Generador de tráfico para el harness: flujos sintéticos o grabados de mensajes."""
+
+import json
+import time
+import random
+import asyncio
+from bisect import bisect
+from itertools import accumulate
+
+CITIES = [
+    'Buenos Aires', 'Madrid', 'London', 'Paris', 'Córdoba', 'Rosario', 'Lima', 'Montevideo',
+    'Santiago', 'Bogotá', 'Mexico City', 'New York', 'Barcelona', 'Roma', 'Berlin', 'Tokyo',
+    'Mendoza', 'La Plata', 'Mar del Plata', 'Valencia', 'Sevilla', 'Quito', 'Caracas', 'Miami',
+]
+UNKNOWN_CITY = 'Ciudad Inexistente'
+
+
+class Message:
+    """Un mensaje del flujo: `at` segundos desde el inicio, usuario y texto"""
+
+    __slots__ = ('at', 'user', 'text')
+
+    def __init__(self, at: float, user: int, text: str):
+        self.at = at
+        self.user = user
+        self.text = text
+
+    def to_json(self) -> str:
+        return json.dumps({'at': round(self.at, 6), 'user': self.user, 'text': self.text}, ensure_ascii=False)
+
+
+class Zipf:
+    """Muestreo de rangos 0..n-1 con P(k) ∝ 1 / (k + 1) ** s"""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.cumulative = list(accumulate(1 / (k + 1) ** s for k in range(n)))
+        self.rng = rng
+
+    def sample(self) -> int:
+        return bisect(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+
+def synthetic(count: int, rps: float, users: int = 300, city_skew: float = 1.1, user_skew: float = 1.0,
+              multi_rate: float = 0.0, unknown_rate: float = 0.0, seed: int = 1) -> list:
+    """Flujo sintético con llegadas de Poisson a `rps` y popularidad Zipf de ciudades y usuarios"""
+    rng = random.Random(seed)
+    cities = Zipf(len(CITIES), city_skew, rng)
+    senders = Zipf(users, user_skew, rng)
+    messages = []
+    at = 0.0
+    for _ in range(count):
+        at += rng.expovariate(rps) if rps > 0 else 0.0
+        if rng.random() < unknown_rate:
+            text = UNKNOWN_CITY
+        elif rng.random() < multi_rate:
+            text = ', '.join(dict.fromkeys(CITIES[cities.sample()] for _ in range(rng.randint(2, 4))))
+        else:
+            text = CITIES[cities.sample()]
+        messages.append(Message(at, 1000 + senders.sample(), text))
+    return messages
+
+
+def read_recording(path: str) -> list:
+    """Flujo grabado en JSONL: {"at": s, "user": id, "text": "..."} por línea"""
+    messages = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                messages.append(Message(float(item.get('at', 0)), int(item['user']), item['text']))
+    messages.sort(key=lambda message: message.at)
+    return messages
+
+
+def write_recording(path: str, messages: list) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for message in messages:
+            f.write(message.to_json() + '\n')
+
+
+async def paced(messages: list, speed: float = 1.0):
+    """Entregar los mensajes respetando sus tiempos (`speed` > 1 acelera)"""
+    started = time.perf_counter()
+    for message in messages:
+        delay = message.at / speed - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield message
@@ -0,0 +1,419 @@
+"""Servidores HTTP locales que imitan a la API de Symfony, Telegram y Green API.
+
+Todo corre en 127.0.0.1 sin salir a internet. `ServerThread` levanta los
+stubs en un hilo con su propio event loop, así no compiten con el bot
+medido por el mismo loop.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import threading
+import importlib.util
+from collections import deque
+from aiohttp import web
+
+BOTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Paquete compartido de los bots
+sys.path.append(os.path.join(BOTS_DIR, 'shared'))
+
+SAMPLE_WEATHER = {
+    'city': 'Buenos Aires',
+    'country': 'AR',
+    'temperature': 21.4,
+    'feels_like': 20.9,
+    'description': 'nubes dispersas',
+    'humidity': 64,
+    'pressure': 1015,
+    'wind_speed': 4.1,
+}
+
+SAMPLE_FORECAST = {
+    'city': {'name': 'Buenos Aires', 'country': 'AR', 'timezone': -10800},
+    'list': [
+        {'dt': 1700000000 + i * 10800, 'main': {'temp': 18 + i}, 'pop': 0.1 * i,
+         'weather': [{'description': 'nubes dispersas'}]}
+        for i in range(8)
+    ],
+}
+
+
+class StubServer:
+    """Base de los stubs: servidor aiohttp en un puerto libre"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def make_app(self) -> web.Application:
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class StubBackend(StubServer):
+    """API de clima falsa: responde 200 con un JSON fijo tras `latency` segundos.
+
+    Con `batch=False` el endpoint /api/weather/batch responde 404, como un
+    backend que todavía no lo tiene. Las ciudades de `unknown` dan 404.
+    Inyección de fallas: `error_rate` de respuestas 500 y `slow_rate` de
+    respuestas que tardan `slow_latency` segundos más.
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0,
+                 batch: bool = True, unknown=(), error_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 1.0, seed: int = 1):
+        super().__init__(host, port)
+        self.latency = latency
+        self.batch = batch
+        self.unknown = set(unknown)
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.injected_errors = 0
+        self.injected_slow = 0
+
+    async def _delay(self) -> None:
+        latency = self.latency
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            self.injected_slow += 1
+            latency += self.slow_latency
+        if latency:
+            await asyncio.sleep(latency)
+
+    def _failed(self) -> bool:
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.injected_errors += 1
+            return True
+        return False
+
+    async def handle_weather(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        payload = await request.json()
+        await self._delay()
+        if self._failed():
+            return web.json_response({'message': 'Error inyectado'}, status=500)
+        city = payload.get('city', SAMPLE_WEATHER['city'])
+        if city in self.unknown:
+            return web.json_response({'message': 'Ciudad no encontrada'}, status=404)
+        return web.Response(body=json.dumps(dict(SAMPLE_WEATHER, city=city)), content_type='application/json')
+
+    async def handle_forecast(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await self._delay()
+        if self._failed():
+            return web.json_response({'message': 'Error inyectado'}, status=500)
+        city = request.match_info['city']
+        if city in self.unknown:
+            return web.json_response({'message': 'Ciudad no encontrada'}, status=404)
+        body = dict(SAMPLE_FORECAST, city=dict(SAMPLE_FORECAST['city'], name=city))
+        return web.json_response(body)
+
+    async def handle_batch(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not self.batch:
+            return web.json_response({'error': 'Not Found'}, status=404)
+        payload = await request.json()
+        await self._delay()
+        if self._failed():
+            return web.json_response({'message': 'Error inyectado'}, status=500)
+        results = [
+            {'city': city, 'status': 404, 'data': {'message': 'Ciudad no encontrada'}}
+            if city in self.unknown else
+            {'city': city, 'status': 200, 'data': dict(SAMPLE_WEATHER, city=city)}
+            for city in payload.get('cities', [])
+        ]
+        return web.json_response({'results': results})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/api/weather/batch', self.handle_batch)
+        app.router.add_get('/api/weather/today/{city}', self.handle_forecast)
+        app.router.add_post('/api/weather/{platform}', self.handle_weather)
+        return app
+
+
+class ReplyLog:
+    """Registro de mensajes entrantes y respuestas para medir latencia de punta a punta.
+
+    Las respuestas de un chat salen en el mismo orden que sus mensajes (el
+    bot garantiza orden por usuario), así que la k-ésima respuesta de un
+    chat corresponde a su k-ésimo mensaje.
+    """
+
+    def __init__(self):
+        self.sent = {}
+        self.latencies = []
+        self.replies = 0
+        self.unmatched = 0
+        self.last_reply = None
+
+    def message_sent(self, chat) -> None:
+        self.sent.setdefault(chat, deque()).append(time.perf_counter())
+
+    def reply_received(self, chat) -> None:
+        self.replies += 1
+        self.last_reply = time.perf_counter()
+        pending = self.sent.get(chat)
+        if pending:
+            self.latencies.append(time.perf_counter() - pending.popleft())
+        else:
+            self.unmatched += 1
+
+    @property
+    def unanswered(self) -> int:
+        return sum(len(pending) for pending in self.sent.values())
+
+
+class StubTelegramAPI(StubServer):
+    """Bot API de Telegram falsa: getUpdates (long polling), sendMessage y compañía.
+
+    `inject(user_id, text)` encola un update como si lo hubiera escrito el
+    usuario; `send_error_rate` hace que sendMessage responda 429.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, send_latency: float = 0.0,
+                 send_error_rate: float = 0.0, seed: int = 1):
+        super().__init__(host, port)
+        self.send_latency = send_latency
+        self.send_error_rate = send_error_rate
+        self.rng = random.Random(seed)
+        self.log = ReplyLog()
+        self.updates = deque()
+        self._update_id = 0
+        self._message_id = 0
+        self._arrived = None
+        self.injected_errors = 0
+
+    def inject(self, user_id: int, text: str) -> None:
+        """Encolar un mensaje de texto (llamar desde el loop del stub)"""
+        self._update_id += 1
+        self.updates.append({
+            'update_id': self._update_id,
+            'message': {
+                'message_id': self._update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+                'text': text,
+            },
+        })
+        self.log.message_sent(user_id)
+        if self._arrived is not None:
+            self._arrived.set()
+
+    @staticmethod
+    async def _params(request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        return dict(await request.post())
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await self._params(request)
+
+        if method == 'getUpdates':
+            return self._ok(await self._get_updates(params))
+        if method == 'getMe':
+            return self._ok({'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'})
+        if method == 'sendMessage':
+            return await self._send_message(params)
+        # sendChatAction, deleteWebhook, setWebhook...
+        return self._ok(True)
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        while self.updates and self.updates[0]['update_id'] < offset:
+            self.updates.popleft()
+        if not self.updates:
+            self._arrived = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._arrived = None
+        limit = int(params.get('limit') or 100)
+        return list(self.updates)[:limit]
+
+    async def _send_message(self, params: dict) -> web.Response:
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        if self.send_error_rate and self.rng.random() < self.send_error_rate:
+            self.injected_errors += 1
+            return web.json_response({
+                'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1},
+            }, status=429)
+        chat_id = int(params['chat_id'])
+        self.log.reply_received(chat_id)
+        self._message_id += 1
+        return self._ok({
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', ''),
+        })
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        return app
+
+
+class StubGreenAPI(StubServer):
+    """Green API falsa: receiveNotification / deleteNotification / sendMessage.
+
+    Igual que la real, una notificación se vuelve a entregar hasta que se
+    borra con su receiptId. `send_error_rate` hace que sendMessage responda
+    429 (el dispatcher saliente reintenta).
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, hold: float = 1.0,
+                 send_latency: float = 0.0, send_error_rate: float = 0.0, seed: int = 1):
+        super().__init__(host, port)
+        self.hold = hold
+        self.send_latency = send_latency
+        self.send_error_rate = send_error_rate
+        self.rng = random.Random(seed)
+        self.log = ReplyLog()
+        self.notifications = {}
+        self._receipt_id = 0
+        self._arrived = None
+        self.redelivered = 0
+        self.injected_errors = 0
+
+    def inject(self, user_id: int, text: str) -> None:
+        """Encolar un mensaje de texto entrante (llamar desde el loop del stub)"""
+        self._receipt_id += 1
+        chat_id = f"{user_id}@c.us"
+        self.notifications[self._receipt_id] = {
+            'receiptId': self._receipt_id,
+            'body': {
+                'typeWebhook': 'incomingMessageReceived',
+                'idMessage': f'STUB{self._receipt_id:012d}',
+                'timestamp': int(time.time()),
+                'senderData': {'chatId': chat_id, 'sender': chat_id, 'senderName': f'user{user_id}'},
+                'messageData': {'typeMessage': 'textMessage', 'textMessageData': {'textMessage': text}},
+            },
+            '_delivered': False,
+        }
+        self.log.message_sent(chat_id)
+        if self._arrived is not None:
+            self._arrived.set()
+
+    async def handle_receive(self, request: web.Request) -> web.Response:
+        if not self.notifications:
+            self._arrived = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), self.hold)
+            except asyncio.TimeoutError:
+                return web.json_response(None)
+            finally:
+                self._arrived = None
+        notification = next(iter(self.notifications.values()))
+        if notification['_delivered']:
+            self.redelivered += 1
+        notification['_delivered'] = True
+        return web.json_response({k: v for k, v in notification.items() if not k.startswith('_')})
+
+    async def handle_delete(self, request: web.Request) -> web.Response:
+        removed = self.notifications.pop(int(request.match_info['receipt']), None)
+        return web.json_response({'result': removed is not None})
+
+    async def handle_send(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        if self.send_error_rate and self.rng.random() < self.send_error_rate:
+            self.injected_errors += 1
+            return web.json_response({'message': 'Too Many Requests'}, status=429)
+        self.log.reply_received(payload['chatId'])
+        return web.json_response({'idMessage': f'OUT{self.log.replies:012d}'})
+
+    async def handle_state(self, request: web.Request) -> web.Response:
+        return web.json_response({'stateInstance': 'authorized'})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        prefix = '/waInstance{instance}'
+        app.router.add_get(prefix + '/receiveNotification/{token}', self.handle_receive)
+        app.router.add_delete(prefix + '/deleteNotification/{token}/{receipt}', self.handle_delete)
+        app.router.add_post(prefix + '/sendMessage/{token}', self.handle_send)
+        app.router.add_get(prefix + '/getStateInstance/{token}', self.handle_state)
+        return app
+
+
+class ServerThread:
+    """Event loop propio en un hilo para los stubs (no comparten loop con el bot)"""
+
+    def __init__(self, *servers):
+        self.servers = servers
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='stubs', daemon=True)
+
+    def run(self, coro):
+        """Ejecutar una corrutina en el loop de los stubs y esperar el resultado"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def call(self, func, *args) -> None:
+        """Llamar `func(*args)` en el loop de los stubs sin esperar"""
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def start(self) -> None:
+        self._thread.start()
+        for server in self.servers:
+            self.run(server.start())
+
+    def stop(self) -> None:
+        for server in self.servers:
+            self.run(server.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista de muestras"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def load_bot(name: str):
+    """Importar bots/<name>/main.py como módulo `<name>_bot` (sin ejecutar main())"""
+    bot_dir = os.path.join(BOTS_DIR, name)
+    if bot_dir not in sys.path:
+        sys.path.insert(0, bot_dir)
+    spec = importlib.util.spec_from_file_location(f'{name}_bot', os.path.join(bot_dir, 'main.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
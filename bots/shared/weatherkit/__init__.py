@@ -0,0 +1,5 @@
+"""Código compartido por los bots de Telegram y WhatsApp.
+
+En Docker el paquete se copia a /opt/shared (PYTHONPATH); en local cada
+bot agrega ../shared al path al arrancar.
+"""
@@ -0,0 +1,214 @@
+import os
+import time
+import asyncio
+import logging
+
+from weatherkit.http import BackendResponse
+from weatherkit.model import WeatherReport, ReportError
+from weatherkit.cache import WeatherCache
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno de las consultas de varias ciudades
+MULTI_CITY_MAX = int(os.getenv('MULTI_CITY_MAX', '5'))
+MULTI_CITY_CONCURRENCY = int(os.getenv('MULTI_CITY_CONCURRENCY', '4'))
+API_BATCH_ENDPOINT = os.getenv('API_BATCH_ENDPOINT', '/api/weather/batch')
+# Cuánto tiempo dejar de intentar el endpoint batch si el backend no lo tiene
+API_BATCH_RETRY_AFTER = float(os.getenv('API_BATCH_RETRY_AFTER', '300'))
+
+# Status del endpoint batch que indican que el backend no lo implementa
+BATCH_UNSUPPORTED = (404, 405, 501)
+# Status de una ciudad que el backend dejó fuera del lote por superar su tope
+BATCH_OVERFLOW = 413
+
+
+class BatchUnavailable(Exception):
+    """El endpoint batch no respondió un lote usable: se consulta ciudad por ciudad"""
+
+
+def resolve_many(gazetteer, cities: list, limit: int = MULTI_CITY_MAX):
+    """Resolver las ciudades de un mensaje sin inválidas ni repetidas.
+
+    Devuelve (resoluciones, cuántas quedaron afuera por superar `limit`).
+    """
+    unique = {}
+    for city in cities:
+        resolution = gazetteer.resolve(city)
+        if resolution.kind != 'invalid':
+            unique.setdefault(WeatherCache.normalize(resolution.lookup), resolution)
+    resolutions = list(unique.values())
+    return resolutions[:limit], max(0, len(resolutions) - limit)
+
+
+class CityResult:
+    """Resultado de una ciudad dentro de una consulta múltiple.
+
+    state: 'ok', 'stale' (último dato cacheado porque el backend falló),
+    'missing' (el backend no la encontró) o 'error'. `data` es el
+    WeatherReport en los dos primeros casos.
+    """
+
+    __slots__ = ('resolution', 'state', 'data')
+
+    def __init__(self, resolution, state: str, data=None):
+        self.resolution = resolution
+        self.state = state
+        self.data = data
+
+    def __repr__(self):
+        return f"CityResult({self.resolution.lookup!r}, state={self.state!r})"
+
+
+class WeatherBatcher:
+    """Consulta varias ciudades a la vez compartiendo el cache de clima.
+
+    Las ciudades que no están en cache se piden en un único POST al
+    endpoint batch; si el backend no lo tiene (o el lote falla sin llegar a
+    responder) se consultan por separado con a lo sumo `concurrency`
+    requests en paralelo. Cada ciudad pasa por `cache.get_or_load`, así que
+    se coalesce con otros pedidos en vuelo por la misma ciudad, y una falla
+    queda aislada en su propio resultado.
+    """
+
+    def __init__(self, cache, backend, url: str, batch_url: str,
+                 concurrency: int = MULTI_CITY_CONCURRENCY):
+        self.cache = cache
+        self.backend = backend
+        self.url = url
+        self.batch_url = batch_url
+        self.concurrency = concurrency
+        self._batch_disabled_until = 0.0
+        self.batches = 0
+        self.batch_fallbacks = 0
+        self.fanned_out = 0
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'batch_fallbacks': self.batch_fallbacks,
+            'fanned_out': self.fanned_out,
+            'batch_enabled': int(time.monotonic() >= self._batch_disabled_until),
+        }
+
+    async def lookup_many(self, resolutions: list, payload: dict) -> list:
+        """Consultar las ciudades de `resolutions` y clasificar cada resultado"""
+        responses = await self.fetch_many([r.lookup for r in resolutions], payload)
+        results = []
+        for resolution, response in zip(resolutions, responses):
+            if isinstance(response, BackendResponse) and response.status == 200:
+                try:
+                    results.append(CityResult(resolution, 'ok', response.report()))
+                    continue
+                except ReportError as e:
+                    response = e
+            elif isinstance(response, BackendResponse) and response.status == 404:
+                results.append(CityResult(resolution, 'missing'))
+                continue
+            if isinstance(response, Exception):
+                logger.warning(
+                    "Falló la consulta de '%s' (%s): %s",
+                    resolution.lookup, type(response).__name__, response
+                )
+            report = self.fallback_report(resolution.lookup)
+            if report is not None:
+                results.append(CityResult(resolution, 'stale', report))
+            else:
+                results.append(CityResult(resolution, 'error'))
+        return results
+
+    def fallback_report(self, city: str):
+        """Último WeatherReport cacheado de `city` aunque esté vencido (None si no hay)"""
+        cached = self.cache.fallback(city)
+        if cached is None or cached.status != 200:
+            return None
+        try:
+            return cached.report()
+        except ReportError:
+            return None
+
+    async def fetch_many(self, cities: list, payload: dict) -> list:
+        """Respuestas en el mismo orden que `cities` (o la excepción de cada una)"""
+        misses = {
+            self.cache.normalize(city) for city in cities if self.cache.peek(city) is None
+        }
+        batch = None
+        if len(misses) > 1 and time.monotonic() >= self._batch_disabled_until:
+            batch = asyncio.ensure_future(
+                self._post_batch([city for city in cities if self.cache.normalize(city) in misses], payload)
+            )
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def load(city: str):
+            if batch is not None and self.cache.normalize(city) in misses:
+                try:
+                    response = (await asyncio.shield(batch)).get(self.cache.normalize(city))
+                except BatchUnavailable:
+                    response = None
+                if response is not None:
+                    return response
+            async with semaphore:
+                self.fanned_out += 1
+                return await self.backend.post(self.url, dict(payload, city=city), hedge=True)
+
+        async def one(city: str):
+            try:
+                return await self.cache.get_or_load(city, lambda: load(city))
+            except Exception as e:
+                return e
+
+        try:
+            return await asyncio.gather(*(one(city) for city in cities))
+        finally:
+            if batch is not None:
+                if not batch.done():
+                    batch.cancel()
+                elif not batch.cancelled():
+                    # Marcar la excepción como leída aunque nadie haya esperado el lote
+                    batch.exception()
+
+    async def _post_batch(self, cities: list, payload: dict) -> dict:
+        """POST de todas las ciudades juntas: clave normalizada -> BackendResponse"""
+        # Sin hedge: un segundo lote duplicaría todas las ciudades contra el
+        # backend, y las consultas por ciudad del respaldo ya van con hedge
+        try:
+            response = await self.backend.post(self.batch_url, dict(payload, cities=cities))
+        except Exception as e:
+            # Timeout, error de red o circuito del batch abierto: el endpoint
+            # por ciudad puede estar bien, así que se consulta por separado
+            self.batch_fallbacks += 1
+            raise BatchUnavailable(f"{self.batch_url} no respondió ({type(e).__name__}: {e})") from e
+
+        if response.status in BATCH_UNSUPPORTED:
+            self._batch_disabled_until = time.monotonic() + API_BATCH_RETRY_AFTER
+            logger.info(
+                "El backend no tiene %s (status %d): consultas por ciudad durante %.0fs",
+                self.batch_url, response.status, API_BATCH_RETRY_AFTER
+            )
+        body = response.safe_json() if response.status == 200 else None
+        items = body.get('results') if isinstance(body, dict) else None
+        if not isinstance(items, list):
+            self.batch_fallbacks += 1
+            raise BatchUnavailable(f"{self.batch_url} respondió {response.status}")
+
+        self.batches += 1
+        results = {}
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('city'), str):
+                continue
+            status = item.get('status', 200)
+            if not isinstance(status, int):
+                status = 500
+            if status == BATCH_OVERFLOW:
+                # El lote tiene un tope: la ciudad se consulta por separado
+                continue
+            report = None
+            if status == 200:
+                # Cada ciudad del lote se valida sola: una inválida no tira el resto
+                try:
+                    report = WeatherReport.from_dict(item.get('data'))
+                except ReportError:
+                    status = 500
+            results[self.cache.normalize(item['city'])] = BackendResponse(
+                status, None if report is not None else b'', report
+            )
+        return results
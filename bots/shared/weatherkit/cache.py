@@ -0,0 +1,209 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del cache de clima (el backend ya cachea 600 s)
+CACHE_MAX_ENTRIES = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', '2048'))
+CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', '300'))
+CACHE_STALE_TTL = float(os.getenv('WEATHER_CACHE_STALE_TTL', '600'))
+CACHE_NEGATIVE_TTL = float(os.getenv('WEATHER_CACHE_NEGATIVE_TTL', '60'))
+
+
+def response_ttl(response):
+    """TTL según el status: 200 se cachea, 404 poco tiempo, el resto nunca"""
+    if response.status == 200:
+        return CACHE_TTL
+    if response.status == 404:
+        return CACHE_NEGATIVE_TTL
+    return None
+
+
+def compact_response(response) -> None:
+    """Las respuestas 200 se guardan como WeatherReport ya validado, sin el cuerpo crudo"""
+    if response.status == 200:
+        response.compact()
+
+
+def _retrieve(task) -> None:
+    """Marcar el error como leído aunque todos los que esperaban se hayan cancelado"""
+    if not task.cancelled():
+        task.exception()
+
+
+class CacheEntry:
+    __slots__ = ('value', 'fresh_until', 'stale_until')
+
+    def __init__(self, value, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class WeatherCache:
+    """Cache LRU con TTL, coalescing de pedidos y stale-while-revalidate.
+
+    - Pedidos simultáneos por la misma ciudad comparten un único request.
+    - Una entrada vencida pero dentro de `stale_ttl` se devuelve igual y se
+      refresca en segundo plano.
+    - `compact` se aplica a cada valor antes de guardarlo (por defecto las
+      respuestas del clima quedan decodificadas una vez, como WeatherReport).
+    - `backing` (un CacheSnapshot) aporta las entradas de antes de un
+      reinicio: una clave que no está en memoria se busca ahí la primera vez.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, stale_ttl: float = CACHE_STALE_TTL,
+                 ttl_for=response_ttl, compact=compact_response):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.ttl_for = ttl_for
+        self.compact = compact
+        self.backing = None
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._refreshing = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.restored = 0
+
+    @staticmethod
+    def normalize(city: str) -> str:
+        """Clave del cache: minúsculas y espacios colapsados"""
+        return ' '.join(city.casefold().split())
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'coalesced': self.coalesced,
+            'restored': self.restored,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None and self.backing is not None:
+            restored = self.backing.take(key)
+            if restored is not None:
+                self.restored += 1
+                entry = self._store(key, CacheEntry(*restored))
+        return entry
+
+    def entries(self) -> list:
+        """(clave, valor, fresh_until, stale_until) de las entradas todavía servibles"""
+        now = time.monotonic()
+        return [
+            (key, entry.value, entry.fresh_until, entry.stale_until)
+            for key, entry in self._entries.items() if entry.stale_until > now
+        ]
+
+    def peek(self, city: str, allow_stale: bool = True):
+        """Valor cacheado sin cargar ni tocar contadores (None si no hay)"""
+        entry = self._entry(self.normalize(city))
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now < entry.fresh_until or (allow_stale and now < entry.stale_until):
+            return entry.value
+        return None
+
+    def fallback(self, city: str):
+        """Último valor conocido aunque esté vencido (para cuando el backend falla)"""
+        entry = self._entry(self.normalize(city))
+        return entry.value if entry is not None else None
+
+    def hot_keys(self, limit: int) -> list:
+        """Claves con respuesta 200, de la usada más recientemente a la menos"""
+        keys = []
+        for key, entry in reversed(self._entries.items()):
+            if len(keys) >= limit:
+                break
+            if getattr(entry.value, 'status', None) == 200:
+                keys.append(key)
+        return keys
+
+    def set(self, key: str, value) -> None:
+        ttl = self.ttl_for(value)
+        if not ttl:
+            return
+        if self.compact is not None:
+            self.compact(value)
+        if self.backing is not None:
+            # El dato nuevo reemplaza al del snapshot aunque después se desaloje
+            self.backing.discard(key)
+        now = time.monotonic()
+        self._store(key, CacheEntry(value, now + ttl, now + ttl + self.stale_ttl))
+
+    def _store(self, key: str, entry: CacheEntry) -> CacheEntry:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def get_or_load(self, city: str, loader):
+        """Devolver el valor cacheado o cargarlo con `await loader()`"""
+        key = self.normalize(city)
+        entry = self._entry(key)
+
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.fresh_until:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                self._refresh(key, loader)
+                return entry.value
+            # La entrada vencida queda (hasta que la desaloje el LRU) como
+            # respaldo para fallback() si el backend no responde
+
+        self.misses += 1
+        return await self._load(key, loader)
+
+    async def _load(self, key: str, loader):
+        # El loader corre en su propia tarea: si se cancela quien lo pidió
+        # primero, los demás que esperan la misma clave reciben igual el valor
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.get_running_loop().create_task(self._fill(key, loader))
+            task.add_done_callback(_retrieve)
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, loader):
+        try:
+            value = await loader()
+        finally:
+            del self._inflight[key]
+        self.set(key, value)
+        return value
+
+    def _refresh(self, key: str, loader) -> None:
+        """Recargar la entrada en segundo plano (una sola vez por clave)"""
+        if key in self._inflight or key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._load(key, loader)
+            except Exception as e:
+                logger.warning("No se pudo refrescar '%s' en segundo plano: %s", key, e)
+            finally:
+                self._refreshing.pop(key, None)
+
+        # Guardamos la tarea para que no la recolecte el GC antes de terminar
+        self._refreshing[key] = asyncio.get_running_loop().create_task(refresh())
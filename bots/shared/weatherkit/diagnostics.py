@@ -0,0 +1,223 @@
+import os
+import sys
+import hmac
+import time
+import signal
+import asyncio
+import logging
+import threading
+import traceback
+from aiohttp import web
+from prometheus_client import Counter, Histogram
+
+from weatherkit.stats import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno de diagnóstico del event loop
+DIAG_LAG_INTERVAL = float(os.getenv('DIAG_LAG_INTERVAL', '0.25'))
+# Un callback que retiene el loop más que esto se registra con su stack
+DIAG_SLOW_CALLBACK = float(os.getenv('DIAG_SLOW_CALLBACK', '0.1'))
+DIAG_DIR = os.getenv('DIAG_DIR', 'diagnostics')
+# El profiler se apaga solo pasado este tiempo si nadie lo detiene
+DIAG_PROFILE_SECONDS = float(os.getenv('DIAG_PROFILE_SECONDS', '60'))
+DIAG_PROFILE_TOP = int(os.getenv('DIAG_PROFILE_TOP', '40'))
+# Token para POST /debug/profile (header X-Debug-Token); vacío: el endpoint no existe
+DIAG_TOKEN = os.getenv('DIAG_TOKEN', '')
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+LOOP_LAG = Histogram(
+    'weatherbot_event_loop_lag_seconds', 'Atraso del event loop respecto de un sleep periódico',
+    ['bot'], buckets=LAG_BUCKETS
+)
+SLOW_CALLBACKS = Counter(
+    'weatherbot_slow_callbacks_total', 'Veces que un callback retuvo el event loop más del umbral',
+    ['bot']
+)
+
+
+class LoopDiagnostics:
+    """Lag del event loop, callbacks lentos y profiling a pedido.
+
+    Una tarea duerme `interval` segundos y mide cuánto tarda de más en
+    despertar: ese atraso es el lag del loop. Un hilo vigía revisa que la
+    tarea despierte a tiempo; si el loop lleva más de `slow_callback`
+    segundos sin atenderla, toma el stack del hilo del loop en ese momento
+    (el código que lo está bloqueando) y lo registra una vez por bloqueo.
+
+    SIGUSR1 (o POST /debug/profile en el servidor de métricas, si hay
+    DIAG_TOKEN) prende y apaga cProfile sobre el hilo del loop; al apagarse
+    escribe en `directory` el .prof (para snakeviz / pstats) y un resumen en
+    texto.
+    """
+
+    def __init__(self, bot: str, interval: float = DIAG_LAG_INTERVAL,
+                 slow_callback: float = DIAG_SLOW_CALLBACK, directory: str = DIAG_DIR,
+                 profile_seconds: float = DIAG_PROFILE_SECONDS):
+        self.bot = bot
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.directory = directory
+        self.profile_seconds = profile_seconds
+        self.lag = LatencyWindow(1024)
+        self.lag_metric = LOOP_LAG.labels(bot)
+        self.slow_metric = SLOW_CALLBACKS.labels(bot)
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+        self.profiles = 0
+        self._deadline = None
+        self._reported = None
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._watchdog = None
+        self._stopping = threading.Event()
+        self._profiler = None
+        self._profile_timer = None
+        self._token = ''
+
+    def stats(self) -> dict:
+        return {
+            'lag_p50_ms': self.lag.percentile(50) * 1000,
+            'lag_p99_ms': self.lag.percentile(99) * 1000,
+            'lag_max_ms': self.max_lag * 1000,
+            'slow_callbacks': self.slow_callbacks,
+            'profiling': self._profiler is not None,
+            'profiles_written': self.profiles,
+        }
+
+    def start(self) -> None:
+        """Arrancar el monitor; llamar desde el loop a vigilar"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._monitor())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+        try:
+            self._loop.add_signal_handler(signal.SIGUSR1, self.toggle_profile)
+        except (NotImplementedError, AttributeError, RuntimeError):
+            # Windows o un loop fuera del hilo principal: queda el endpoint HTTP
+            pass
+        logger.info(
+            "Diagnóstico del loop activo (umbral %.0f ms, SIGUSR1 alterna el profiler)",
+            self.slow_callback * 1000
+        )
+
+    async def stop(self) -> None:
+        if self._profiler is not None:
+            await self.stop_profile()
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            self._loop.remove_signal_handler(signal.SIGUSR1)
+        except (NotImplementedError, AttributeError, RuntimeError):
+            pass
+
+    async def _monitor(self) -> None:
+        while True:
+            self._deadline = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._deadline)
+            self.lag.observe(lag)
+            self.lag_metric.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def _watch(self) -> None:
+        """Hilo vigía: detecta bloqueos del loop mientras ocurren"""
+        check = max(0.01, self.slow_callback / 2)
+        while not self._stopping.wait(check):
+            deadline = self._deadline
+            if deadline is None or deadline == self._reported:
+                continue
+            blocked = time.monotonic() - deadline
+            if blocked < self.slow_callback:
+                continue
+            self._reported = deadline
+            self.slow_callbacks += 1
+            self.slow_metric.inc()
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else '(sin stack)\n'
+            logger.warning(
+                "Event loop bloqueado hace %.0f ms; el hilo del loop está en:\n%s",
+                blocked * 1000, stack.rstrip()
+            )
+
+    def toggle_profile(self) -> None:
+        if self._profiler is None:
+            self.start_profile()
+        else:
+            asyncio.ensure_future(self.stop_profile())
+
+    def start_profile(self) -> bool:
+        """Prender cProfile en el hilo del loop; False si ya estaba prendido"""
+        if self._profiler is not None:
+            return False
+        # cProfile/pstats sólo se importan si alguien pide un perfil
+        import cProfile
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        if self.profile_seconds > 0:
+            self._profile_timer = self._loop.call_later(
+                self.profile_seconds, lambda: asyncio.ensure_future(self.stop_profile())
+            )
+        logger.info("Profiler prendido (se apaga solo en %.0f s)", self.profile_seconds)
+        return True
+
+    async def stop_profile(self):
+        """Apagar el profiler y escribir el volcado; devuelve la ruta del .prof"""
+        profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return None
+        profiler.disable()
+        if self._profile_timer is not None:
+            self._profile_timer.cancel()
+            self._profile_timer = None
+        path = os.path.join(self.directory, f"profile-{self.bot}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._dump, profiler, path)
+        except OSError as e:
+            logger.error("No se pudo escribir el volcado del profiler en %s: %s", path, e)
+            return None
+        self.profiles += 1
+        logger.info("Volcado del profiler escrito en %s", path)
+        return path
+
+    @staticmethod
+    def _dump(profiler, path: str) -> None:
+        import pstats
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        profiler.dump_stats(path)
+        with open(path[:-len('.prof')] + '.txt', 'w') as f:
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(DIAG_PROFILE_TOP)
+
+    def add_routes(self, app: web.Application, token: str = DIAG_TOKEN) -> None:
+        """Endpoints de diagnóstico en el servidor de métricas.
+
+        El puerto de métricas escucha en todas las interfaces: el profiler
+        (que escribe archivos en el disco) sólo se publica con un token.
+        """
+        app.router.add_get('/debug/loop', self.handle_loop)
+        if token:
+            self._token = token
+            app.router.add_post('/debug/profile', self.handle_profile)
+
+    async def handle_loop(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def handle_profile(self, request: web.Request) -> web.Response:
+        """Sin cuerpo alterna; ?action=start|stop fuerza un estado"""
+        if not hmac.compare_digest(request.headers.get('X-Debug-Token', ''), self._token):
+            logger.warning("POST /debug/profile rechazado: token inválido (%s)", request.remote)
+            return web.json_response({'error': 'token inválido'}, status=403)
+        action = request.query.get('action') or ('stop' if self._profiler is not None else 'start')
+        if action == 'start':
+            return web.json_response({'profiling': True, 'started': self.start_profile()})
+        if action == 'stop':
+            return web.json_response({'profiling': False, 'path': await self.stop_profile()})
+        return web.json_response({'error': 'action debe ser start o stop'}, status=400)
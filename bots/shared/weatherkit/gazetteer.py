@@ -0,0 +1,265 @@
+import os
+import re
+import logging
+import unicodedata
+from functools import lru_cache
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del gazetteer
+GAZETTEER_PATH = os.getenv(
+    'GAZETTEER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cities.txt')
+)
+GAZETTEER_MAX_EDITS = int(os.getenv('GAZETTEER_MAX_EDITS', '2'))
+# Resoluciones recientes que se guardan en el snapshot del cache
+GAZETTEER_REMEMBER = int(os.getenv('GAZETTEER_REMEMBER', '4096'))
+# Resoluciones memorizadas (los mismos textos se repiten mucho)
+GAZETTEER_MEMO_SIZE = int(os.getenv('GAZETTEER_MEMO_SIZE', '4096'))
+
+# Límites para descartar mensajes que no son ciudades
+MAX_QUERY_LENGTH = 60
+MAX_QUERY_WORDS = 6
+# Las claves muy cortas ("df", "ny") sólo se aceptan por coincidencia exacta
+MIN_FUZZY_LENGTH = 4
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+_URL = re.compile(r'https?://|www\.', re.IGNORECASE)
+# Separadores de listas de ciudades: siempre separan
+_LIST_SEPARATORS = re.compile(r'\s*[,;\n]+\s*')
+# " y " / " and ": sólo separan si la frase entera no es una ciudad conocida
+_WORD_SEPARATORS = re.compile(r'\s+(?:y|and)\s+', re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def fold(text: str) -> str:
+    """Quitar acentos, pasar a minúsculas y dejar sólo letras, dígitos y espacios"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', stripped).strip()
+
+
+def _deletes(word: str, max_edits: int) -> set:
+    """Todas las variantes de `word` con hasta `max_edits` letras borradas"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_edits):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Distancia de edición acotada (transponer dos letras cuenta 1); limit + 1 si se pasa"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class Resolution:
+    """Resultado de resolver un texto contra el gazetteer.
+
+    kind: 'exact' (nombre o alias), 'unknown' (no está en el índice; se
+    consulta tal como lo escribió el usuario y puede traer sugerencias
+    parecidas para mostrar si el backend no la encuentra) o 'invalid' (no
+    parece una ciudad). Un parecido nunca reemplaza al texto: con ~200
+    ciudades en el índice, "Malta" o "Leon" quedan a una letra de otra.
+    """
+
+    __slots__ = ('query', 'city', 'kind', 'suggestions')
+
+    def __init__(self, query: str, city, kind: str, suggestions=()):
+        self.query = query
+        self.city = city
+        self.kind = kind
+        self.suggestions = list(suggestions)
+
+    @property
+    def lookup(self) -> str:
+        """Nombre a consultar en el backend (canónico si lo conocemos)"""
+        return self.city or self.query
+
+    def __repr__(self):
+        return f"Resolution({self.query!r}, city={self.city!r}, kind={self.kind!r})"
+
+
+class Gazetteer:
+    """Índice local de ciudades y alias con búsqueda difusa.
+
+    Se construye perezosamente en el primer uso: un dict clave plegada ->
+    nombre canónico para coincidencias exactas, y un índice de borrados
+    (estilo SymSpell) para encontrar sugerencias a distancia <= max_edits
+    sin recorrer toda la lista.
+    """
+
+    def __init__(self, path: str = GAZETTEER_PATH, max_edits: int = GAZETTEER_MAX_EDITS):
+        self.path = path
+        self.max_edits = max_edits
+        self._exact = None
+        self._deletes = None
+        # Resultados de _compute (puro) por texto, con desalojo LRU
+        self._memo = OrderedDict()
+        # Las últimas calculadas (exportables para el snapshot) y las que
+        # vienen de un snapshot, que evitan cargar el índice para responderlas
+        self._recent = OrderedDict()
+        self._saved = {}
+
+    def _load(self) -> None:
+        exact = {}
+        deletes = {}
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                names = line.split('|')
+                canonical = names[0]
+                for name in names:
+                    key = fold(name)
+                    exact.setdefault(key, canonical)
+                    if len(key) >= MIN_FUZZY_LENGTH:
+                        for variant in _deletes(key, self.max_edits):
+                            deletes.setdefault(variant, set()).add(key)
+        self._exact = exact
+        self._deletes = deletes
+        logger.info("Gazetteer cargado: %d nombres y alias", len(exact))
+
+    def __len__(self) -> int:
+        if self._exact is None:
+            self._load()
+        return len(self._exact)
+
+    def __contains__(self, city: str) -> bool:
+        if self._exact is None:
+            self._load()
+        return fold(city) in self._exact
+
+    def canonical(self, city: str):
+        """Nombre canónico de una ciudad conocida (None si no está)"""
+        if self._exact is None:
+            self._load()
+        return self._exact.get(fold(city))
+
+    def version(self) -> str:
+        """Identifica el archivo de ciudades: una resolución guardada sólo vale con el mismo"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return ''
+        return f"{stat.st_size}-{int(stat.st_mtime)}"
+
+    def resolutions(self) -> list:
+        """(query, ciudad, kind, sugerencias) de las resoluciones recientes"""
+        return [
+            (resolution.query, resolution.city, resolution.kind, resolution.suggestions)
+            for resolution in self._recent.values()
+        ]
+
+    def restore(self, resolutions) -> None:
+        """Aceptar resoluciones de un snapshot (se usan la primera vez que se pide cada texto)"""
+        for query, city, kind, suggestions in resolutions:
+            # Los snapshots viejos pueden traer correcciones automáticas ('fuzzy')
+            if kind in ('exact', 'unknown'):
+                self._saved[query] = (city, kind, suggestions)
+
+    def resolve(self, text: str) -> Resolution:
+        """Canonicalizar un texto de usuario antes de consultar el backend"""
+        query = ' '.join(text.split())
+        resolution = self._memo.get(query)
+        if resolution is not None:
+            self._memo.move_to_end(query)
+        else:
+            saved = self._saved.pop(query, None) if self._saved else None
+            resolution = Resolution(query, *saved) if saved is not None else self._compute(query)
+            if GAZETTEER_MEMO_SIZE:
+                self._memo[query] = resolution
+                if len(self._memo) > GAZETTEER_MEMO_SIZE:
+                    self._memo.popitem(last=False)
+        if resolution.kind != 'invalid' and GAZETTEER_REMEMBER:
+            self._recent[query] = resolution
+            self._recent.move_to_end(query)
+            if len(self._recent) > GAZETTEER_REMEMBER:
+                self._recent.popitem(last=False)
+        return resolution
+
+    def _compute(self, query: str) -> Resolution:
+        key = fold(query)
+
+        if (not key or len(query) > MAX_QUERY_LENGTH or len(key.split()) > MAX_QUERY_WORDS
+                or not any(ch.isalpha() for ch in key) or _URL.search(query)):
+            return Resolution(query, None, 'invalid')
+
+        if self._exact is None:
+            self._load()
+
+        canonical = self._exact.get(key)
+        if canonical is not None:
+            return Resolution(query, canonical, 'exact')
+
+        # Los parecidos sólo se sugieren: puede ser otra ciudad real que no está en el índice
+        suggestions = []
+        for _, candidate in self.suggest(key):
+            name = self._exact[candidate]
+            if name not in suggestions:
+                suggestions.append(name)
+        return Resolution(query, None, 'unknown', suggestions[:3])
+
+    def split_cities(self, text: str) -> list:
+        """Separar un mensaje con varias ciudades ("Madrid, London y Paris").
+
+        Un texto que ya es una ciudad conocida no se parte ("Trinidad y
+        Tobago"), y un código de país de dos letras queda con su ciudad
+        ("Paris, FR"). Las repetidas se descartan conservando el orden.
+        """
+        if self.resolve(text).kind == 'exact':
+            return [text.strip()]
+
+        parts = []
+        for chunk in _LIST_SEPARATORS.split(text.strip()):
+            if not chunk:
+                continue
+            if parts and len(chunk) == 2 and chunk.isalpha():
+                parts[-1] = f"{parts[-1]}, {chunk}"
+            elif _WORD_SEPARATORS.search(chunk) and self.resolve(chunk).kind != 'exact':
+                parts.extend(part for part in _WORD_SEPARATORS.split(chunk) if part)
+            else:
+                parts.append(chunk)
+
+        unique = {}
+        for part in parts:
+            unique.setdefault(fold(part), part)
+        return list(unique.values())
+
+    def suggest(self, key: str) -> list:
+        """Claves a distancia <= max_edits de `key`, como (distancia, clave) ordenadas"""
+        if self._deletes is None:
+            self._load()
+        if len(key) < MIN_FUZZY_LENGTH:
+            return []
+
+        seen = set()
+        for variant in _deletes(key, self.max_edits):
+            seen.update(self._deletes.get(variant, ()))
+
+        scored = []
+        for candidate in seen:
+            distance = edit_distance(key, candidate, self.max_edits)
+            if distance <= self.max_edits:
+                scored.append((distance, candidate))
+        scored.sort()
+        return scored
@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+import logging
+import aiohttp
+
+from weatherkit.model import WeatherReport, ReportError, loads, dumps
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del pool de conexiones hacia la API de Symfony
+BACKEND_POOL_LIMIT = int(os.getenv('BACKEND_POOL_LIMIT', '100'))
+BACKEND_POOL_LIMIT_PER_HOST = int(os.getenv('BACKEND_POOL_LIMIT_PER_HOST', '32'))
+BACKEND_DNS_TTL = int(os.getenv('BACKEND_DNS_TTL', '300'))
+BACKEND_KEEPALIVE = float(os.getenv('BACKEND_KEEPALIVE', '30'))
+BACKEND_TIMEOUT_TOTAL = float(os.getenv('BACKEND_TIMEOUT_TOTAL', '10'))
+BACKEND_TIMEOUT_CONNECT = float(os.getenv('BACKEND_TIMEOUT_CONNECT', '3'))
+
+
+class BackendResponse:
+    """Respuesta ya leída de la API (la conexión vuelve al pool enseguida)"""
+
+    __slots__ = ('status', 'body', '_report')
+
+    def __init__(self, status: int, body, report: WeatherReport = None):
+        self.status = status
+        self.body = body
+        self._report = report
+
+    def json(self):
+        if self.body is None:
+            return self._report.to_dict()
+        return loads(self.body)
+
+    def safe_json(self, default=None):
+        """JSON del cuerpo o `default` si no es JSON válido (p. ej. un 500 en HTML)"""
+        try:
+            return self.json()
+        except ValueError:
+            return default
+
+    def report(self) -> WeatherReport:
+        """Reporte del clima validado; el cuerpo se decodifica una sola vez"""
+        if self._report is None:
+            self._report = WeatherReport.from_bytes(self.body)
+        return self._report
+
+    def compact(self) -> None:
+        """Quedarse sólo con el reporte y soltar el cuerpo crudo (para el cache)"""
+        if self.body is None:
+            return
+        try:
+            self.report()
+        except ReportError:
+            # Se deja el cuerpo: quien lo lea verá el mismo error
+            return
+        self.body = None
+
+
+class BackendClient:
+    """Cliente HTTP de larga vida con pool keep-alive hacia la API de Symfony"""
+
+    def __init__(self, limit: int = BACKEND_POOL_LIMIT,
+                 limit_per_host: int = BACKEND_POOL_LIMIT_PER_HOST,
+                 dns_ttl: int = BACKEND_DNS_TTL,
+                 keepalive: float = BACKEND_KEEPALIVE,
+                 timeout_total: float = BACKEND_TIMEOUT_TOTAL,
+                 timeout_connect: float = BACKEND_TIMEOUT_CONNECT,
+                 metrics=None):
+        self.metrics = metrics
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.timeout = aiohttp.ClientTimeout(total=timeout_total, connect=timeout_connect)
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("BackendClient no está iniciado")
+        return self._session
+
+    async def start(self) -> None:
+        """Crear el pool de conexiones (llamar una vez al arrancar el bot)"""
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers={'Content-Type': 'application/json'},
+        )
+        logger.info(
+            "Pool HTTP iniciado (limit=%d, por host=%d, dns_ttl=%ds)",
+            self.limit, self.limit_per_host, self.dns_ttl
+        )
+
+    async def warm_up(self, url: str) -> bool:
+        """Resolver DNS y dejar una conexión abierta en el pool antes del primer mensaje"""
+        try:
+            async with self.session.head(url, timeout=self.timeout) as response:
+                logger.info("Conexión con la API precalentada (%s: %d)", url, response.status)
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("No se pudo precalentar la conexión con %s: %s", url, e)
+            return False
+
+    async def close(self) -> None:
+        """Cerrar el pool de conexiones (llamar al apagar el bot)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Pool HTTP cerrado")
+        self._session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def post(self, url: str, payload: dict, timeout: float = None) -> BackendResponse:
+        """POST JSON a la API y devolver status + cuerpo completo"""
+        return await self._request('POST', url, timeout, data=dumps(payload))
+
+    async def get(self, url: str, timeout: float = None) -> BackendResponse:
+        """GET a la API y devolver status + cuerpo completo"""
+        return await self._request('GET', url, timeout)
+
+    async def _request(self, method: str, url: str, timeout: float = None, **kwargs) -> BackendResponse:
+        started = time.perf_counter()
+        if timeout:
+            # timeout=None desactivaría el de la sesión: sólo se pasa si hay uno propio
+            kwargs['timeout'] = aiohttp.ClientTimeout(
+                total=timeout, connect=min(timeout, BACKEND_TIMEOUT_CONNECT)
+            )
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                body = await response.read()
+        except asyncio.TimeoutError:
+            self._record('timeout', started)
+            raise
+        except aiohttp.ClientError:
+            self._record('error', started)
+            raise
+        self._record(response.status, started)
+        return BackendResponse(response.status, body)
+
+    def _record(self, status, started: float) -> None:
+        if self.metrics is not None:
+            self.metrics.backend_latency.observe(time.perf_counter() - started)
+            self.metrics.backend_result(status)
@@ -0,0 +1,171 @@
+import os
+import time
+import logging
+from contextvars import ContextVar
+from aiohttp import web
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Puerto del endpoint /metrics (0 lo desactiva)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BACKEND_STATUSES = ('200', '404', '500', 'other', 'timeout', 'error')
+
+BACKEND_LATENCY = Histogram(
+    'weatherbot_backend_request_seconds', 'Latencia de las llamadas a la API de Symfony',
+    ['bot'], buckets=LATENCY_BUCKETS
+)
+BACKEND_REQUESTS = Counter(
+    'weatherbot_backend_requests_total', 'Llamadas a la API de Symfony por resultado',
+    ['bot', 'status']
+)
+SEND_LATENCY = Histogram(
+    'weatherbot_provider_send_seconds', 'Latencia de envío al proveedor (Telegram / Green API)',
+    ['bot'], buckets=LATENCY_BUCKETS
+)
+REPLY_LATENCY = Histogram(
+    'weatherbot_message_to_reply_seconds', 'Tiempo desde que llega el mensaje hasta enviar la respuesta',
+    ['bot'], buckets=LATENCY_BUCKETS
+)
+QUEUE_DEPTH = Gauge('weatherbot_queue_depth', 'Elementos esperando en cada cola', ['bot', 'queue'])
+
+# Momento en que empezó a procesarse el mensaje actual (viaja con la tarea)
+message_started = ContextVar('message_started', default=None)
+
+
+def mark_message_start() -> None:
+    """Marcar el inicio del mensaje que procesa la tarea actual"""
+    message_started.set(time.perf_counter())
+
+
+class StatsCollector:
+    """Expone el dict de stats() de un componente como gauges al momento del scrape"""
+
+    def __init__(self, bot: str, name: str, stats):
+        self.bot = bot
+        self.name = name
+        self.stats = stats
+
+    def describe(self):
+        # Sin describe() el registry llamaría a collect() al registrar
+        return []
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            f'weatherbot_{self.name}', f'Estadísticas internas de {self.name}', labels=['bot', 'stat']
+        )
+        for key, value in self.stats().items():
+            family.add_metric([self.bot, key], float(value))
+        yield family
+
+
+class BotMetrics:
+    """Métricas de un bot con los hijos ya ligados a sus etiquetas.
+
+    En el camino caliente sólo se llama a observe()/inc() sobre objetos
+    creados al arrancar; las colas y los contadores internos se leen recién
+    cuando Prometheus hace el scrape.
+    """
+
+    def __init__(self, bot: str):
+        self.bot = bot
+        self.backend_latency = BACKEND_LATENCY.labels(bot)
+        self.backend_status = {status: BACKEND_REQUESTS.labels(bot, status) for status in BACKEND_STATUSES}
+        self.send_latency = SEND_LATENCY.labels(bot)
+        self.reply_latency = REPLY_LATENCY.labels(bot)
+        self._collectors = []
+
+    def backend_result(self, status) -> None:
+        counter = self.backend_status.get(str(status))
+        if counter is None:
+            counter = self.backend_status['other']
+        counter.inc()
+
+    def observe_reply(self) -> None:
+        """Registrar el tiempo mensaje -> respuesta del mensaje actual"""
+        started = message_started.get()
+        if started is not None:
+            self.reply_latency.observe(time.perf_counter() - started)
+
+    def track_queue(self, queue: str, depth) -> None:
+        """Publicar la profundidad de una cola (`depth` se llama al hacer scrape)"""
+        QUEUE_DEPTH.labels(self.bot, queue).set_function(depth)
+
+    def track_stats(self, name: str, stats) -> None:
+        """Publicar el dict de stats() de un componente"""
+        collector = StatsCollector(self.bot, name, stats)
+        REGISTRY.register(collector)
+        self._collectors.append(collector)
+
+    def close(self) -> None:
+        for collector in self._collectors:
+            REGISTRY.unregister(collector)
+        self._collectors = []
+
+
+class Readiness:
+    """Condiciones con nombre que deben cumplirse para recibir tráfico"""
+
+    def __init__(self):
+        self._checks = {}
+
+    def add(self, name: str, check) -> None:
+        """Registrar una condición evaluada en cada consulta (`check()` -> bool)"""
+        self._checks[name] = check
+
+    def set(self, name: str, ok: bool = True) -> None:
+        """Registrar o actualizar una condición fija"""
+        self._checks[name] = lambda: ok
+
+    def status(self) -> dict:
+        return {name: bool(check()) for name, check in self._checks.items()}
+
+
+class MetricsServer:
+    """Servidor HTTP con /metrics (Prometheus), /healthz y /readyz.
+
+    /healthz responde mientras el event loop atienda; /readyz devuelve 503
+    hasta que se cumplan todas las condiciones de `readiness` (proveedor
+    verificado, cache precalentado...), así el orquestador no enruta antes.
+    """
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.host = host
+        self.port = port
+        self.readiness = Readiness()
+        self.app = web.Application()
+        self.app.router.add_get('/metrics', self.handle_metrics)
+        self.app.router.add_get('/healthz', self.handle_health)
+        self.app.router.add_get('/readyz', self.handle_ready)
+        self._runner = None
+        self._started = time.monotonic()
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        response = web.Response(body=generate_latest(REGISTRY))
+        response.headers['Content-Type'] = CONTENT_TYPE_LATEST
+        return response
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'uptime': round(time.monotonic() - self._started, 3)})
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        checks = self.readiness.status()
+        ready = all(checks.values())
+        return web.json_response({'ready': ready, 'checks': checks}, status=200 if ready else 503)
+
+    async def start(self) -> None:
+        if not self.port:
+            return
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Métricas disponibles en http://%s:%d/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+
+# Backend de JSON: orjson si está instalado; WEATHER_JSON=json fuerza la librería estándar
+WEATHER_JSON = os.getenv('WEATHER_JSON', 'auto')
+
+orjson = None
+if WEATHER_JSON != 'json':
+    try:
+        import orjson
+    except ImportError:
+        pass
+
+if orjson is not None:
+    JSON_BACKEND = 'orjson'
+    loads = orjson.loads
+
+    def dumps(value) -> bytes:
+        """JSON compacto en UTF-8"""
+        return orjson.dumps(value)
+else:
+    JSON_BACKEND = 'json'
+    loads = json.loads
+
+    def dumps(value) -> bytes:
+        """JSON compacto en UTF-8"""
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+class ReportError(ValueError):
+    """La respuesta de la API no tiene la forma de un reporte del clima"""
+
+
+# Los decodificadores de JSON devuelven exactamente estos tipos; comparar el
+# tipo (y no isinstance) además deja afuera a bool, que no es una medición
+_NUMBER_TYPES = frozenset((int, float))
+_ID_TYPES = frozenset((int, str))
+
+
+class WeatherReport:
+    """Clima actual de una ciudad, espejo del WeatherReportDTO de la API de Symfony.
+
+    Se valida una sola vez al decodificar la respuesta y es lo que guarda el
+    cache y reciben los renderers: atributos fijos en lugar de un dict, los
+    números que no son números quedan en None (se muestran como 'N/A') y los
+    textos repetidos entre ciudades se internan.
+    """
+
+    __slots__ = ('id', 'city', 'country', 'temperature', 'feels_like', 'temp_min', 'temp_max',
+                 'humidity', 'pressure', 'visibility', 'wind_speed', 'wind_direction',
+                 'description', 'icon')
+
+    def __init__(self, city=None, country=None, temperature=None, feels_like=None,
+                 temp_min=None, temp_max=None, humidity=None, pressure=None, visibility=None,
+                 wind_speed=None, wind_direction=None, description=None, icon=None, id=None):
+        self.id = id
+        self.city = city
+        self.country = country
+        self.temperature = temperature
+        self.feels_like = feels_like
+        self.temp_min = temp_min
+        self.temp_max = temp_max
+        self.humidity = humidity
+        self.pressure = pressure
+        self.visibility = visibility
+        self.wind_speed = wind_speed
+        self.wind_direction = wind_direction
+        self.description = description
+        self.icon = icon
+
+    @classmethod
+    def from_dict(cls, data) -> 'WeatherReport':
+        """Validar un objeto ya decodificado; ReportError si no es un reporte"""
+        if not isinstance(data, dict):
+            raise ReportError(f"Se esperaba un objeto JSON y llegó {type(data).__name__}")
+        get = data.get
+        number = _NUMBER_TYPES
+        intern = sys.intern
+        # Desenrollado a propósito (corre una vez por respuesta del backend):
+        # sin llamadas por campo cuesta menos de la mitad
+        report = object.__new__(cls)
+        value = get('temperature')
+        if value is None:
+            # El DTO de la API la llama temp
+            value = get('temp')
+        report.temperature = value if type(value) in number else None
+        value = get('feels_like')
+        report.feels_like = value if type(value) in number else None
+        value = get('temp_min')
+        report.temp_min = value if type(value) in number else None
+        value = get('temp_max')
+        report.temp_max = value if type(value) in number else None
+        value = get('humidity')
+        report.humidity = value if type(value) in number else None
+        value = get('pressure')
+        report.pressure = value if type(value) in number else None
+        value = get('visibility')
+        report.visibility = value if type(value) in number else None
+        value = get('wind_speed')
+        report.wind_speed = value if type(value) in number else None
+        value = get('city')
+        report.city = value if type(value) is str and value else None
+        # Textos que se repiten entre ciudades: una sola copia en memoria
+        value = get('country')
+        report.country = intern(value) if type(value) is str and value else None
+        value = get('description')
+        report.description = intern(value) if type(value) is str and value else None
+        value = get('wind_direction')
+        report.wind_direction = intern(value) if type(value) is str and value else None
+        value = get('icon')
+        report.icon = intern(value) if type(value) is str and value else None
+        value = get('id')
+        report.id = value if type(value) in _ID_TYPES else None
+        if report.city is None and report.temperature is None:
+            raise ReportError("La respuesta no trae ciudad ni temperatura")
+        return report
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> 'WeatherReport':
+        """Decodificar y validar el cuerpo de la respuesta de la API"""
+        try:
+            data = loads(body)
+        except ValueError as e:
+            raise ReportError(f"La respuesta no es JSON válido: {e}") from None
+        return cls.from_dict(data)
+
+    def to_dict(self) -> dict:
+        """Campos presentes, con los nombres que usa la API hacia los bots"""
+        return {
+            name: value for name in self.__slots__
+            if (value := getattr(self, name)) is not None
+        }
+
+    def __repr__(self):
+        return f"WeatherReport({self.city!r}, {self.temperature!r}°C, {self.description!r})"
@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import functools
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno de los perfiles de usuario
+PROFILES_PATH = os.getenv('PROFILES_PATH', 'profiles.db')  # vacío: sólo en memoria
+PROFILES_MAX_USERS = int(os.getenv('PROFILES_MAX_USERS', '10000'))
+PROFILES_HISTORY = int(os.getenv('PROFILES_HISTORY', '5'))
+PROFILES_FLUSH_INTERVAL = float(os.getenv('PROFILES_FLUSH_INTERVAL', '5'))
+# Ciudades distintas que se cuentan para el ranking de popularidad
+PROFILES_MAX_CITIES = int(os.getenv('PROFILES_MAX_CITIES', '1000'))
+
+METRIC = 'metric'
+IMPERIAL = 'imperial'
+
+_UNITS = {
+    'c': METRIC, 'celsius': METRIC, 'metric': METRIC, 'metrico': METRIC, 'métrico': METRIC,
+    'f': IMPERIAL, 'fahrenheit': IMPERIAL, 'imperial': IMPERIAL,
+}
+
+
+def parse_units(text: str):
+    """'c', '°F', 'celsius', 'imperial'... -> METRIC / IMPERIAL (None si no se entiende)"""
+    return _UNITS.get(text.strip().lower().lstrip('°'))
+
+
+class UserProfile:
+    """Preferencias y últimas ciudades de un usuario (la más reciente primero)"""
+
+    __slots__ = ('user_id', 'city', 'units', 'history')
+
+    def __init__(self, user_id: str, city=None, units: str = METRIC, history: tuple = ()):
+        self.user_id = user_id
+        self.city = city
+        self.units = units
+        self.history = history
+
+    @property
+    def favorite(self):
+        """Ciudad por defecto o, si no eligió una, la última que consultó"""
+        return self.city or (self.history[0] if self.history else None)
+
+    def __repr__(self):
+        return f"UserProfile({self.user_id!r}, city={self.city!r}, units={self.units!r})"
+
+
+class ProfileStore:
+    """Perfiles y popularidad de ciudades en SQLite, con su propio hilo (como SubscriptionStore)"""
+
+    def __init__(self, path: str = PROFILES_PATH):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profiles')
+        self._db = None
+
+    async def call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS profiles ('
+                ' user_id TEXT PRIMARY KEY, city TEXT, units TEXT NOT NULL,'
+                ' history TEXT NOT NULL, updated REAL NOT NULL)'
+            )
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS city_stats (city TEXT PRIMARY KEY, hits INTEGER NOT NULL)'
+            )
+        return self._db
+
+    def load(self, user_id: str):
+        """(city, units, history JSON) o None si el usuario no tiene perfil"""
+        return self._connect().execute(
+            'SELECT city, units, history FROM profiles WHERE user_id = ?', (user_id,)
+        ).fetchone()
+
+    def popular(self, limit: int) -> list:
+        return self._connect().execute(
+            'SELECT city, hits FROM city_stats ORDER BY hits DESC LIMIT ?', (limit,)
+        ).fetchall()
+
+    def save(self, profiles: list, counts: list) -> None:
+        """Guardar perfiles (user_id, city, units, history, updated) y sumar consultas por ciudad"""
+        with self._connect() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO profiles (user_id, city, units, history, updated)'
+                ' VALUES (?, ?, ?, ?, ?)', profiles
+            )
+            db.executemany(
+                'INSERT INTO city_stats (city, hits) VALUES (?, ?)'
+                ' ON CONFLICT(city) DO UPDATE SET hits = hits + excluded.hits', counts
+            )
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class UserProfiles:
+    """Perfiles de los usuarios activos en memoria, con escritura diferida a SQLite.
+
+    Un LRU de a lo sumo `max_users` perfiles atiende los mensajes sin tocar
+    el disco: el perfil de un usuario activo está siempre en memoria y
+    consultarlo es O(1). Los que no están se leen de `store` (una vez
+    aunque lleguen varios mensajes juntos) y los cambios se escriben en
+    lote cada `flush_interval` segundos. También cuenta las consultas por
+    ciudad: el ranking (`popular`) alimenta el precalentamiento del cache.
+    Sin `store` todo queda en memoria.
+    """
+
+    def __init__(self, store: ProfileStore = None, max_users: int = PROFILES_MAX_USERS,
+                 history: int = PROFILES_HISTORY, flush_interval: float = PROFILES_FLUSH_INTERVAL,
+                 max_cities: int = PROFILES_MAX_CITIES):
+        self.store = store
+        self.max_users = max_users
+        self.history = history
+        self.flush_interval = flush_interval
+        self.max_cities = max_cities
+        self._profiles = OrderedDict()
+        self._loading = {}
+        # Cambios pendientes de escribir (sobreviven a que el LRU desaloje el perfil)
+        self._dirty = {}
+        self._counts = Counter()
+        self._pending_counts = Counter()
+        self._task = None
+        self.hits = 0
+        self.loads = 0
+        self.flushes = 0
+
+    def stats(self) -> dict:
+        return {
+            'users': len(self._profiles),
+            'hits': self.hits,
+            'loads': self.loads,
+            'dirty': len(self._dirty),
+            'cities': len(self._counts),
+            'flushes': self.flushes,
+        }
+
+    async def start(self) -> None:
+        """Traer el ranking guardado y empezar a escribir los cambios periódicamente"""
+        if self.store is None:
+            return
+        try:
+            rows = await self.store.call(self.store.popular, self.max_cities)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo leer la popularidad de ciudades: %s", e)
+            rows = []
+        for city, hits in rows:
+            self._counts[sys.intern(city)] += hits
+        if self.flush_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.store is not None:
+            await self.flush()
+            await self.store.call(self.store.close)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.shield(self.flush())
+
+    def peek(self, user_id):
+        """Perfil en memoria sin ir a disco (None si no está)"""
+        return self._profiles.get(str(user_id))
+
+    async def get(self, user_id) -> UserProfile:
+        """Perfil del usuario (vacío si nunca escribió)"""
+        key = str(user_id)
+        profile = self._profiles.get(key)
+        if profile is not None:
+            self.hits += 1
+            self._profiles.move_to_end(key)
+            return profile
+
+        profile = self._dirty.get(key)
+        if profile is None and self.store is not None:
+            future = self._loading.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self._load(key))
+                self._loading[key] = future
+                future.add_done_callback(lambda _: self._loading.pop(key, None))
+            profile = await asyncio.shield(future)
+            # Otro mensaje del mismo usuario pudo haberlo cargado mientras tanto
+            current = self._profiles.get(key)
+            if current is not None:
+                return current
+        if profile is None:
+            profile = UserProfile(key)
+        self._profiles[key] = profile
+        while len(self._profiles) > self.max_users:
+            self._profiles.popitem(last=False)
+        return profile
+
+    async def _load(self, key: str):
+        self.loads += 1
+        try:
+            row = await self.store.call(self.store.load, key)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo leer el perfil de %s: %s", key, e)
+            return None
+        if row is None:
+            return None
+        city, units, history = row
+        try:
+            history = json.loads(history)
+        except ValueError:
+            history = []
+        return UserProfile(
+            key, sys.intern(city) if city else None, units if units in (METRIC, IMPERIAL) else METRIC,
+            tuple(sys.intern(name) for name in history[:self.history] if isinstance(name, str))
+        )
+
+    def record(self, profile: UserProfile, city: str) -> None:
+        """Anotar una consulta: historial del usuario y popularidad de la ciudad"""
+        city = sys.intern(city)
+        if not profile.history or profile.history[0] != city:
+            profile.history = (city,) + tuple(
+                name for name in profile.history if name != city
+            )[:self.history - 1]
+            self._touch(profile)
+        self._counts[city] += 1
+        if self.store is not None:
+            self._pending_counts[city] += 1
+        if len(self._counts) > 2 * self.max_cities:
+            self._counts = Counter(dict(self._counts.most_common(self.max_cities)))
+
+    def set_city(self, profile: UserProfile, city) -> None:
+        profile.city = sys.intern(city) if city else None
+        self._touch(profile)
+
+    def set_units(self, profile: UserProfile, units: str) -> None:
+        profile.units = units
+        self._touch(profile)
+
+    def _touch(self, profile: UserProfile) -> None:
+        if self.store is not None:
+            self._dirty[profile.user_id] = profile
+
+    def popular(self, limit: int) -> list:
+        """Ciudades más consultadas, de la más a la menos"""
+        return [city for city, _ in self._counts.most_common(limit)]
+
+    async def flush(self) -> int:
+        """Escribir en SQLite los perfiles modificados y las consultas nuevas"""
+        if self.store is None or (not self._dirty and not self._pending_counts):
+            return 0
+        now = time.time()
+        profiles = [
+            (profile.user_id, profile.city, profile.units,
+             json.dumps(profile.history, ensure_ascii=False), now)
+            for profile in self._dirty.values()
+        ]
+        dirty, self._dirty = self._dirty, {}
+        counts, self._pending_counts = self._pending_counts, Counter()
+        try:
+            await self.store.call(self.store.save, profiles, list(counts.items()))
+        except sqlite3.Error as e:
+            logger.warning("No se pudieron guardar %d perfiles: %s", len(profiles), e)
+            # Se reintentan en la próxima escritura
+            for key, profile in dirty.items():
+                self._dirty.setdefault(key, profile)
+            self._pending_counts.update(counts)
+            return 0
+        self.flushes += 1
+        return len(profiles)
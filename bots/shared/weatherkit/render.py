@@ -0,0 +1,326 @@
+import re
+import time
+from functools import lru_cache
+
+# Palabras clave por emoji, en orden de prioridad (gana la primera categoría que aparece)
+EMOJI_KEYWORDS = (
+    ('☀️', ('sunny', 'clear', 'despejado', 'soleado')),
+    ('⛅', ('cloud', 'nublado', 'parcialmente')),
+    ('🌧️', ('rain', 'lluvia', 'llovizna')),
+    ('⛈️', ('storm', 'tormenta')),
+    ('❄️', ('snow', 'nieve')),
+    ('🌫️', ('fog', 'mist', 'niebla')),
+)
+DEFAULT_EMOJI = '🌤️'
+
+_KEYWORD_PRIORITY = {
+    keyword: priority
+    for priority, (_, keywords) in enumerate(EMOJI_KEYWORDS)
+    for keyword in keywords
+}
+# Una sola alternación compilada que recorre la descripción una vez. Es un
+# lookahead para probar en cada posición: un match normal consume letras y
+# se saltearía una palabra solapada ("mistorm" tiene mist y storm); en la
+# misma posición se prueba primero la de mayor prioridad
+_KEYWORD_RE = re.compile(
+    '(?=(%s))' % '|'.join(map(re.escape, sorted(_KEYWORD_PRIORITY, key=_KEYWORD_PRIORITY.get)))
+)
+
+# Caracteres con significado en el Markdown "legacy" de Telegram
+_TELEGRAM_MARKDOWN_RE = re.compile(r'([_*`\[])')
+
+
+@lru_cache(maxsize=1024)
+def weather_emoji(description: str) -> str:
+    """Emoji según la descripción del clima (memorizado por descripción)"""
+    best = None
+    for match in _KEYWORD_RE.finditer(description.lower()):
+        priority = _KEYWORD_PRIORITY[match.group(1)]
+        if best is None or priority < best:
+            best = priority
+            if best == 0:
+                break
+    return EMOJI_KEYWORDS[best][0] if best is not None else DEFAULT_EMOJI
+
+
+def escape_telegram_markdown(text: str) -> str:
+    """Escapar texto para parse_mode='Markdown' de Telegram"""
+    return _TELEGRAM_MARKDOWN_RE.sub(r'\\\1', text)
+
+
+# Campos de la plantilla, en el orden en que render() arma la tupla
+_FIELDS = ('emoji', 'city', 'country', 'temp', 'feels_like', 'description',
+           'humidity', 'pressure', 'wind_speed', 'footer')
+_SUMMARY_FIELDS = ('emoji', 'city', 'temp', 'description', 'note')
+_FORECAST_FIELDS = ('hour', 'emoji', 'temp', 'description')
+_FIELD_RE = re.compile(r'\{(\w+)\}')
+
+
+def _value(value):
+    """Medición o 'N/A' si el reporte no la trae"""
+    return 'N/A' if value is None else value
+
+
+def _fahrenheit(celsius):
+    return None if celsius is None else round(celsius * 9 / 5 + 32, 1)
+
+
+def _mph(speed):
+    return None if speed is None else round(speed * 2.23694, 1)
+
+
+def _compile_template(template: str, fields: tuple = _FIELDS) -> str:
+    """Pasar la plantilla {campo} a una de %s con los campos en orden fijo"""
+    order = []
+
+    def field(match):
+        order.append(match.group(1))
+        return '%s'
+
+    compiled = _FIELD_RE.sub(field, template.replace('%', '%%'))
+    if tuple(order) != fields:
+        raise ValueError(f"La plantilla debe usar los campos {fields} en ese orden")
+    return compiled
+
+
+class WeatherRenderer:
+    """Plantilla de respuesta del clima para una plataforma, armada una sola vez.
+
+    La plantilla se compila a formato %s al crearla y las partes que se
+    repiten entre mensajes (emoji + descripción, ciudad + país ya escapados)
+    se memorizan, así cada respuesta es una sola operación de formato.
+    `imperial` es la misma respuesta en °F y mph (el backend siempre
+    responde en métricas y la conversión se hace al renderizar).
+    """
+
+    def __init__(self, template: str, imperial: str, footer: str, stale_footer: str, escape=None):
+        self.template = _compile_template(template)
+        self.imperial_template = _compile_template(imperial)
+        self.escape = escape
+        self.footer = footer
+        self.stale_footer = stale_footer
+        self._describe = lru_cache(maxsize=1024)(self._describe_uncached)
+        self._place = lru_cache(maxsize=4096)(self._place_uncached)
+
+    def _describe_uncached(self, description) -> tuple:
+        description = str(description)
+        emoji = weather_emoji(description)
+        description = description.capitalize()
+        if self.escape is not None:
+            description = self.escape(description)
+        return emoji, description
+
+    def _place_uncached(self, city, country) -> tuple:
+        city = str(city)
+        country = str(country) if country else ''
+        if self.escape is not None:
+            city, country = self.escape(city), self.escape(country)
+        return city, f", {country}" if country else ''
+
+    def render(self, report, stale: bool = False, units: str = 'metric') -> str:
+        """Texto de un WeatherReport (weatherkit.model); units 'metric' o 'imperial'"""
+        emoji, description = self._describe(report.description or 'Sin descripción')
+        city, country = self._place(report.city or 'Ciudad desconocida', report.country)
+        if units == 'imperial':
+            template = self.imperial_template
+            temperature, feels_like = _fahrenheit(report.temperature), _fahrenheit(report.feels_like)
+            wind_speed = _mph(report.wind_speed)
+        else:
+            template = self.template
+            temperature, feels_like, wind_speed = report.temperature, report.feels_like, report.wind_speed
+        return template % (
+            emoji,
+            city,
+            country,
+            _value(temperature),
+            _value(feels_like),
+            description,
+            _value(report.humidity),
+            _value(report.pressure),
+            _value(wind_speed),
+            self.stale_footer if stale else self.footer,
+        )
+
+
+class SummaryRenderer:
+    """Respuesta combinada para un mensaje con varias ciudades (una línea por ciudad)"""
+
+    def __init__(self, header: str, line: str, imperial_line: str, missing: str, error: str,
+                 footer: str, stale_note: str, escape=None):
+        self.header = header
+        self.line = _compile_template(line, _SUMMARY_FIELDS)
+        self.imperial_line = _compile_template(imperial_line, _SUMMARY_FIELDS)
+        self.missing = missing
+        self.error = error
+        self.footer = footer
+        self.stale_note = stale_note
+        self.escape = escape
+
+    def _text(self, value) -> str:
+        value = str(value)
+        return self.escape(value) if self.escape is not None else value
+
+    def render(self, results: list, omitted: int = 0, units: str = 'metric') -> str:
+        """`results` son CityResult de weatherkit.batch, en el orden del mensaje"""
+        imperial = units == 'imperial'
+        line = self.imperial_line if imperial else self.line
+        lines = [self.header.format(count=len(results))]
+        for result in results:
+            if result.state in ('ok', 'stale'):
+                report = result.data
+                description = report.description or 'Sin descripción'
+                lines.append(line % (
+                    weather_emoji(description),
+                    self._text(report.city or result.resolution.lookup),
+                    _value(_fahrenheit(report.temperature) if imperial else report.temperature),
+                    self._text(description.capitalize()),
+                    self.stale_note if result.state == 'stale' else '',
+                ))
+            elif result.state == 'missing':
+                suggestions = result.resolution.suggestions
+                lines.append(self.missing.format(
+                    query=self._text(result.resolution.query),
+                    suggestion=f" (¿{self._text(', '.join(suggestions))}?)" if suggestions else '',
+                ))
+            else:
+                lines.append(self.error.format(query=self._text(result.resolution.query)))
+        if omitted:
+            lines.append(f"\n➕ {omitted} ciudad(es) más sin consultar (límite por mensaje)")
+        return '\n'.join(lines) + self.footer
+
+
+class ForecastRenderer:
+    """Pronóstico del día (respuesta de /api/weather/today) para las suscripciones"""
+
+    def __init__(self, header: str, line: str, footer: str, escape=None):
+        self.header = header
+        self.line = _compile_template(line, _FORECAST_FIELDS)
+        self.footer = footer
+        self.escape = escape
+
+    def _text(self, value) -> str:
+        value = str(value)
+        return self.escape(value) if self.escape is not None else value
+
+    def render(self, data):
+        """Texto del pronóstico o None si la respuesta no trae pronóstico"""
+        entries = data.get('list') if isinstance(data, dict) else None
+        if not entries:
+            return None
+        city = data.get('city') or {}
+        # Horas locales de la ciudad (OpenWeather da el offset en segundos)
+        offset = city.get('timezone') or 0
+
+        lines = []
+        temps = []
+        rain = 0.0
+        for entry in entries:
+            main = entry.get('main') or {}
+            weather = (entry.get('weather') or [{}])[0]
+            description = str(weather.get('description', ''))
+            temp = main.get('temp')
+            if isinstance(temp, (int, float)):
+                temps.append(temp)
+                temp = round(temp)
+            rain = max(rain, entry.get('pop') or 0)
+            lines.append(self.line % (
+                time.strftime('%H:%M', time.gmtime(entry.get('dt', 0) + offset)),
+                weather_emoji(description),
+                'N/A' if temp is None else temp,
+                self._text(description.capitalize()),
+            ))
+
+        country = city.get('country')
+        return self.header.format(
+            city=self._text(city.get('name', 'Tu ciudad')),
+            country=f", {self._text(country)}" if country else '',
+            low=round(min(temps)) if temps else 'N/A',
+            high=round(max(temps)) if temps else 'N/A',
+            rain=round(rain * 100),
+        ) + '\n'.join(lines) + self.footer
+
+
+# En Markdown legacy no se puede escapar dentro de una entidad: los valores
+# variables (ciudad, descripción) van siempre fuera de las negritas
+TELEGRAM = WeatherRenderer(
+    "{emoji} *Clima en* {city}{country}\n\n"
+    "🌡️ *Temperatura:* {temp}°C\n"
+    "🤗 *Sensación térmica:* {feels_like}°C\n"
+    "📝 *Descripción:* {description}\n"
+    "💧 *Humedad:* {humidity}%\n"
+    "🔽 *Presión:* {pressure} hPa\n"
+    "💨 *Viento:* {wind_speed} m/s\n\n"
+    "{footer}",
+    "{emoji} *Clima en* {city}{country}\n\n"
+    "🌡️ *Temperatura:* {temp}°F\n"
+    "🤗 *Sensación térmica:* {feels_like}°F\n"
+    "📝 *Descripción:* {description}\n"
+    "💧 *Humedad:* {humidity}%\n"
+    "🔽 *Presión:* {pressure} hPa\n"
+    "💨 *Viento:* {wind_speed} mph\n\n"
+    "{footer}",
+    footer="📅 _Actualizado ahora_",
+    stale_footer="📅 _Últimos datos disponibles (el servicio no responde)_",
+    escape=escape_telegram_markdown,
+)
+
+WHATSAPP = WeatherRenderer(
+    "{emoji} *Clima en {city}*{country}\n\n"
+    "🌡️ *Temperatura:* {temp}°C\n"
+    "🤗 *Sensación térmica:* {feels_like}°C\n"
+    "📝 *Descripción:* {description}\n"
+    "💧 *Humedad:* {humidity}%\n"
+    "🔽 *Presión:* {pressure} hPa\n"
+    "💨 *Viento:* {wind_speed} m/s\n\n"
+    "{footer}\n\n"
+    "💡 Envía el nombre de otra ciudad para más información",
+    "{emoji} *Clima en {city}*{country}\n\n"
+    "🌡️ *Temperatura:* {temp}°F\n"
+    "🤗 *Sensación térmica:* {feels_like}°F\n"
+    "📝 *Descripción:* {description}\n"
+    "💧 *Humedad:* {humidity}%\n"
+    "🔽 *Presión:* {pressure} hPa\n"
+    "💨 *Viento:* {wind_speed} mph\n\n"
+    "{footer}\n\n"
+    "💡 Envía el nombre de otra ciudad para más información",
+    footer="📅 _Actualizado ahora_",
+    stale_footer="📅 _Últimos datos disponibles (el servicio no responde)_",
+)
+
+TELEGRAM_SUMMARY = SummaryRenderer(
+    header="🌍 *Clima en {count} ciudades*\n",
+    line="{emoji} {city}: *{temp}°C*, {description}{note}",
+    imperial_line="{emoji} {city}: *{temp}°F*, {description}{note}",
+    missing="❌ {query}: no encontrada{suggestion}",
+    error="⚠️ {query}: servicio no disponible",
+    footer="\n\n📅 _Actualizado ahora_",
+    stale_note=" _(últimos datos disponibles)_",
+    escape=escape_telegram_markdown,
+)
+
+WHATSAPP_SUMMARY = SummaryRenderer(
+    header="🌍 *Clima en {count} ciudades*\n",
+    line="{emoji} *{city}:* {temp}°C, {description}{note}",
+    imperial_line="{emoji} *{city}:* {temp}°F, {description}{note}",
+    missing="❌ *{query}:* no encontrada{suggestion}",
+    error="⚠️ *{query}:* servicio no disponible",
+    footer="\n\n💡 Envía una ciudad sola para ver el detalle completo",
+    stale_note=" _(últimos datos disponibles)_",
+)
+
+TELEGRAM_FORECAST = ForecastRenderer(
+    header="📆 *Pronóstico de hoy:* {city}{country}\n\n"
+           "🌡️ *Mínima / máxima:* {low}°C / {high}°C\n"
+           "☔ *Probabilidad de lluvia:* {rain}%\n\n",
+    line="{hour} {emoji} {temp}°C {description}",
+    footer="\n\n🔕 /unsubscribe para dejar de recibirlo",
+    escape=escape_telegram_markdown,
+)
+
+WHATSAPP_FORECAST = ForecastRenderer(
+    header="📆 *Pronóstico de hoy: {city}*{country}\n\n"
+           "🌡️ *Mínima / máxima:* {low}°C / {high}°C\n"
+           "☔ *Probabilidad de lluvia:* {rain}%\n\n",
+    line="{hour} {emoji} {temp}°C {description}",
+    footer="\n\n🔕 Escribe *desuscribir* para dejar de recibirlo",
+)
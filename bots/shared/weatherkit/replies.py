@@ -0,0 +1,38 @@
+from weatherkit.model import ReportError
+
+
+def did_you_mean(resolution, emphasis: str = '') -> str:
+    """Aviso cuando la ciudad no está en el gazetteer pero se parece a una que sí.
+
+    `emphasis` envuelve las sugerencias ('*' para negrita en WhatsApp).
+    """
+    if resolution.kind != 'unknown' or not resolution.suggestions:
+        return ""
+    return f"\n\n¿O quisiste decir: {emphasis}{', '.join(resolution.suggestions)}{emphasis}?"
+
+
+async def reply_from_cache(cache, profiles, profile, city: str, send_report) -> bool:
+    """Responder con el dato vigente del cache sin pasar por gazetteer ni backend.
+
+    `send_report(report, units=...)` envía la respuesta en el formato de
+    cada bot. Devuelve False si no hay un 200 vigente para `city`.
+    """
+    cached = cache.peek(city, allow_stale=False)
+    if cached is None or cached.status != 200:
+        return False
+    try:
+        report = cached.report()
+    except ReportError:
+        return False
+    profiles.record(profile, city)
+    await send_report(report, units=profile.units)
+    return True
+
+
+async def reply_degraded(batcher, city: str, units: str, send_report, send_text, message: str) -> None:
+    """Responder con el último dato cacheado (aunque esté vencido) o, si no hay, con `message`"""
+    report = batcher.fallback_report(city)
+    if report is not None:
+        await send_report(report, stale=True, units=units)
+    else:
+        await send_text(message)
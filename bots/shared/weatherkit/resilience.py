@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+import logging
+
+from weatherkit.stats import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno de la capa de resiliencia
+BREAKER_FAILURES = int(os.getenv('BACKEND_BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('BACKEND_BREAKER_RESET', '30'))
+TIMEOUT_MIN = float(os.getenv('BACKEND_TIMEOUT_MIN', '1'))
+TIMEOUT_MAX = float(os.getenv('BACKEND_TIMEOUT_MAX', '10'))
+TIMEOUT_FACTOR = float(os.getenv('BACKEND_TIMEOUT_FACTOR', '3'))
+TIMEOUT_MIN_SAMPLES = int(os.getenv('BACKEND_TIMEOUT_MIN_SAMPLES', '20'))
+HEDGE_ENABLED = os.getenv('BACKEND_HEDGE', '1') == '1'
+HEDGE_PERCENTILE = float(os.getenv('BACKEND_HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_DELAY = float(os.getenv('BACKEND_HEDGE_MIN_DELAY', '0.05'))
+
+
+class CircuitOpenError(Exception):
+    """El circuito del endpoint está abierto: no se intenta el request"""
+
+
+class CircuitBreaker:
+    """Circuit breaker clásico: closed -> open -> half-open -> closed.
+
+    Tras `failure_threshold` fallas seguidas se abre y rechaza todo durante
+    `reset_timeout` segundos; después deja pasar un único request de prueba
+    que decide si vuelve a cerrarse o sigue abierto.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES,
+                 reset_timeout: float = BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("Circuito %s cerrado: el backend responde otra vez", self.name)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release(self) -> None:
+        """El request se canceló sin respuesta: no cuenta, pero libera la prueba de half-open"""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning("Circuito %s abierto tras %d fallas", self.name, self.failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class AdaptiveTimeout:
+    """Timeout derivado de la latencia observada (p99 * factor, acotado)"""
+
+    def __init__(self, default: float = TIMEOUT_MAX, minimum: float = TIMEOUT_MIN,
+                 maximum: float = TIMEOUT_MAX, factor: float = TIMEOUT_FACTOR):
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.window = LatencyWindow()
+
+    def observe(self, seconds: float) -> None:
+        self.window.observe(seconds)
+
+    def current(self) -> float:
+        if len(self.window) < TIMEOUT_MIN_SAMPLES:
+            return self.default
+        return max(self.minimum, min(self.maximum, self.window.percentile(99) * self.factor))
+
+    def hedge_delay(self) -> float:
+        """Cuánto esperar antes de lanzar el request de cobertura"""
+        if len(self.window) < TIMEOUT_MIN_SAMPLES:
+            return self.default
+        return max(HEDGE_MIN_DELAY, self.window.percentile(HEDGE_PERCENTILE))
+
+
+class ResilientBackend:
+    """Envuelve a BackendClient con circuit breaker y timeouts adaptativos por endpoint.
+
+    Con `hedge=True` (sólo para consultas idempotentes) si la respuesta
+    tarda más que el p95 observado se lanza un segundo request y se usa el
+    primero que responda.
+    """
+
+    def __init__(self, client, hedge: bool = HEDGE_ENABLED):
+        self.client = client
+        self.hedge = hedge
+        self.breakers = {}
+        self.timeouts = {}
+        self.short_circuited = 0
+        self.timed_out = 0
+        self.hedged = 0
+
+    def _endpoint(self, url: str):
+        breaker = self.breakers.get(url)
+        if breaker is None:
+            breaker = self.breakers[url] = CircuitBreaker(url)
+            self.timeouts[url] = AdaptiveTimeout()
+        return breaker, self.timeouts[url]
+
+    def stats(self) -> dict:
+        return {
+            'open_circuits': sum(b.state != CircuitBreaker.CLOSED for b in self.breakers.values()),
+            'short_circuited': self.short_circuited,
+            'timed_out': self.timed_out,
+            'hedged': self.hedged,
+        }
+
+    async def post(self, url: str, payload: dict, hedge: bool = False):
+        return await self._call(url, lambda timeout: self.client.post(url, payload, timeout=timeout), hedge)
+
+    async def get(self, url: str, hedge: bool = False, endpoint: str = None):
+        """GET con breaker y timeout de `endpoint` (p. ej. la ruta sin la ciudad)
+
+        Sin `endpoint` cada URL tiene su propio circuito; para rutas con
+        parámetros conviene agruparlas todas en uno.
+        """
+        return await self._call(
+            endpoint or url, lambda timeout: self.client.get(url, timeout=timeout), hedge
+        )
+
+    async def _call(self, endpoint: str, request, hedge: bool):
+        """Ejecutar `request(timeout)` con el breaker y el timeout adaptativo de `endpoint`"""
+        breaker, timeout = self._endpoint(endpoint)
+        if not breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpenError(endpoint)
+
+        started = time.perf_counter()
+        try:
+            if hedge and self.hedge:
+                response = await self._hedged(request, timeout)
+            else:
+                response = await request(timeout.current())
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            # Un request de cobertura que perdió o un handler que se apaga no
+            # dicen nada del backend
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        if response.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+            timeout.observe(time.perf_counter() - started)
+        return response
+
+    async def _hedged(self, request, timeout: AdaptiveTimeout):
+        deadline = timeout.current()
+        tasks = {asyncio.ensure_future(request(deadline))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=timeout.hedge_delay())
+            if not done:
+                self.hedged += 1
+                tasks.add(asyncio.ensure_future(request(deadline)))
+
+            failed = []
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    failed.append(task)
+            # Fallaron todos: propagar el primer error
+            return failed[0].result()
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,238 @@
+import os
+import mmap
+import time
+import asyncio
+import logging
+
+from weatherkit.http import BackendResponse
+from weatherkit.model import WeatherReport, ReportError, loads, dumps
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del snapshot en disco del cache
+CACHE_SNAPSHOT_PATH = os.getenv('CACHE_SNAPSHOT_PATH', 'cache.snapshot')
+CACHE_SNAPSHOT_INTERVAL = float(os.getenv('CACHE_SNAPSHOT_INTERVAL', '60'))  # 0: sólo al apagar
+
+_MAGIC = b'WKSNAP'
+_VERSION = b'1'
+
+
+class CacheSnapshot:
+    """Snapshot en disco del cache de clima y de las resoluciones del gazetteer.
+
+    Formato (una línea por registro, campos separados por tab; las claves
+    normalizadas no pueden contener tabs ni saltos de línea):
+
+        WKSNAP  1  <escrito, epoch>  <versión del gazetteer>
+        R  <texto>  <JSON [ciudad, kind, sugerencias]>
+        C  <clave>  <fresh_until, epoch>  <stale_until, epoch>  <status>  <JSON del reporte>
+
+    Los vencimientos se guardan en tiempo de reloj y se vuelven a pasar a
+    monotonic al cargar, así cada entrada conserva el TTL que le quedaba.
+    Al arrancar el archivo se mapea en memoria y sólo se indexan las
+    claves vigentes; cada entrada se decodifica recién cuando el cache la
+    pide (`take`). La escritura corre en un hilo y es atómica (archivo
+    temporal + rename), e incluye las entradas heredadas que todavía no se
+    usaron.
+    """
+
+    def __init__(self, cache, gazetteer=None, path: str = CACHE_SNAPSHOT_PATH,
+                 interval: float = CACHE_SNAPSHOT_INTERVAL):
+        self.cache = cache
+        self.gazetteer = gazetteer
+        self.path = path
+        self.interval = interval
+        self._map = None
+        self._index = {}
+        self._task = None
+        self._lock = asyncio.Lock()
+        self.loaded = 0
+        self.saves = 0
+        self.last_save_ms = 0.0
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._index),
+            'loaded': self.loaded,
+            'saves': self.saves,
+            'last_save_ms': self.last_save_ms,
+        }
+
+    async def start(self) -> None:
+        """Indexar el snapshot anterior (en un hilo) y empezar a guardar periódicamente"""
+        if not self.path:
+            return
+        version = self.gazetteer.version() if self.gazetteer is not None else ''
+        started = time.perf_counter()
+        try:
+            opened = await asyncio.to_thread(self._open, version)
+        except (OSError, ValueError) as e:
+            logger.warning("Snapshot del cache ilegible (%s): %s", self.path, e)
+            opened = None
+        if opened is not None:
+            self._map, self._index, resolutions = opened
+            self.loaded = len(self._index)
+            self.cache.backing = self
+            if self.gazetteer is not None:
+                self.gazetteer.restore(resolutions)
+            logger.info(
+                "Snapshot del cache: %d entradas vigentes y %d resoluciones en %.0f ms",
+                len(self._index), len(resolutions), (time.perf_counter() - started) * 1000
+            )
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Detener el guardado periódico y escribir el snapshot final"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.path:
+            await self.save()
+        self._close()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            # Si stop() cancela a mitad de una escritura, ésta termina y el
+            # guardado final espera el lock en lugar de pisar el temporal
+            await asyncio.shield(self.save())
+
+    def _open(self, version: str):
+        """(mmap, clave -> (inicio, fin, stale_until), resoluciones) o None si no hay snapshot"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        end = data.find(b'\n')
+        header = data[:end].split(b'\t')
+        if header[:2] != [_MAGIC, _VERSION]:
+            data.close()
+            raise ValueError("no es un snapshot de weatherkit o es de otra versión")
+        same_gazetteer = len(header) > 3 and header[3].decode() == version
+
+        now = time.time()
+        index = {}
+        resolutions = []
+        start = end + 1
+        size = len(data)
+        while start < size:
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            kind = data[start:start + 2]
+            if kind == b'C\t':
+                # Sólo la cabecera de la línea: el reporte se decodifica en take()
+                _, key, _, stale_until, _ = data[start:end].split(b'\t', 4)
+                stale_until = float(stale_until)
+                if stale_until > now:
+                    index[key.decode()] = (start, end, stale_until)
+            elif kind == b'R\t' and same_gazetteer:
+                _, query, resolution = data[start:end].split(b'\t', 2)
+                city, resolution_kind, suggestions = loads(resolution)
+                resolutions.append((query.decode(), city, resolution_kind, suggestions))
+            start = end + 1
+
+        if not index:
+            data.close()
+            data = None
+        return data, index, resolutions
+
+    def take(self, key: str):
+        """(valor, fresh_until, stale_until) en reloj monotonic para el cache, o None"""
+        span = self._index.pop(key, None)
+        if span is None:
+            return None
+        start, end, stale_until = span
+        now = time.time()
+        if stale_until <= now:
+            return None
+        _, _, fresh_until, _, status, payload = self._map[start:end].split(b'\t', 5)
+        status = int(status)
+        if status == 200:
+            try:
+                value = BackendResponse(200, None, WeatherReport.from_bytes(payload))
+            except ReportError:
+                return None
+        else:
+            value = BackendResponse(status, b'')
+        offset = time.monotonic() - now
+        return value, float(fresh_until) + offset, stale_until + offset
+
+    def discard(self, key: str) -> None:
+        """Olvidar la versión guardada de `key` (el cache ya tiene una más nueva)"""
+        if self._index:
+            self._index.pop(key, None)
+
+    async def save(self) -> int:
+        """Escribir el snapshot fuera del event loop; devuelve cuántas entradas guardó"""
+        async with self._lock:
+            started = time.perf_counter()
+            now = time.time()
+            entries = self.cache.entries()
+            # Las heredadas vencidas ya no se copian
+            self._index = {key: span for key, span in self._index.items() if span[2] > now}
+            pending = list(self._index.items())
+            resolutions = self.gazetteer.resolutions() if self.gazetteer is not None else []
+            version = self.gazetteer.version() if self.gazetteer is not None else ''
+            try:
+                count = await asyncio.to_thread(
+                    self._write, entries, pending, resolutions, version, now - time.monotonic()
+                )
+            except OSError as e:
+                logger.warning("No se pudo guardar el snapshot del cache en %s: %s", self.path, e)
+                return 0
+            if not self._index:
+                self._close()
+            self.saves += 1
+            self.last_save_ms = (time.perf_counter() - started) * 1000
+            logger.debug("Snapshot del cache: %d entradas en %.1f ms", count, self.last_save_ms)
+            return count
+
+    def _write(self, entries: list, pending: list, resolutions: list, version: str,
+               offset: float) -> int:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        count = 0
+        written = set()
+        with open(tmp, 'wb') as f:
+            f.write(b'%s\t%s\t%.3f\t%s\n' % (_MAGIC, _VERSION, time.time(), version.encode()))
+            for query, city, kind, suggestions in resolutions:
+                f.write(b'R\t%s\t%s\n' % (query.encode(), dumps([city, kind, suggestions])))
+            for key, value, fresh_until, stale_until in entries:
+                if value.status == 200:
+                    try:
+                        payload = dumps(value.report().to_dict())
+                    except ReportError:
+                        continue
+                else:
+                    payload = b'null'
+                f.write(b'C\t%s\t%.3f\t%.3f\t%d\t%s\n' % (
+                    key.encode(), fresh_until + offset, stale_until + offset, value.status, payload
+                ))
+                written.add(key)
+                count += 1
+            for key, (start, end, _) in pending:
+                if key not in written:
+                    f.write(self._map[start:end + 1])
+                    count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        return count
+
+    def _close(self) -> None:
+        self._index = {}
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self.cache.backing is self:
+            self.cache.backing = None
@@ -0,0 +1,27 @@
+import math
+from collections import deque
+
+
+class LatencyWindow:
+    """Ventana circular con las últimas `size` latencias (en segundos)"""
+
+    __slots__ = ('samples', 'count')
+
+    def __init__(self, size: int = 512):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, pct: float) -> float:
+        """Percentil por rango más cercano sobre la ventana (0 si está vacía)"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self.samples)
@@ -0,0 +1,315 @@
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import logging
+import functools
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+from weatherkit.cache import WeatherCache
+from weatherkit.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno de las suscripciones diarias
+SUBSCRIPTIONS_PATH = os.getenv('SUBSCRIPTIONS_PATH', 'subscriptions.db')
+API_FORECAST_ENDPOINT = os.getenv('API_FORECAST_ENDPOINT', '/api/weather/today/{city}')
+# Zona horaria (IANA) en la que el usuario escribe la hora
+SUBSCRIPTION_TZ = os.getenv('SUBSCRIPTION_TZ', 'America/Argentina/Buenos_Aires')
+SUBSCRIPTION_MAX_PER_CHAT = int(os.getenv('SUBSCRIPTION_MAX_PER_CHAT', '5'))
+SUBSCRIPTION_SEND_RATE = float(os.getenv('SUBSCRIPTION_SEND_RATE', '25'))
+SUBSCRIPTION_FETCH_CONCURRENCY = int(os.getenv('SUBSCRIPTION_FETCH_CONCURRENCY', '8'))
+# Si el loop estuvo parado más que esto (suspensión, salto de reloj) no se
+# recuperan los minutos perdidos
+SUBSCRIPTION_MAX_CATCH_UP = int(os.getenv('SUBSCRIPTION_MAX_CATCH_UP', '10'))
+
+MINUTES_PER_DAY = 24 * 60
+
+_TIME = re.compile(r'^([01]?\d|2[0-3])[:.h]([0-5]\d)$')
+
+
+def parse_time(text: str):
+    """Minuto del día de un "HH:MM" (también "7.30" o "7h30"); None si no es una hora"""
+    match = _TIME.match(text.strip().lower())
+    if match is None:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def format_time(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def split_subscription(args: list):
+    """Separar "<ciudad...> <HH:MM>" en (ciudad, minuto); minuto None si falta la hora"""
+    if len(args) >= 2:
+        minute = parse_time(args[-1])
+        if minute is not None:
+            return ' '.join(args[:-1]), minute
+    return ' '.join(args), None
+
+
+class ForecastSource:
+    """Pronóstico del día de una ciudad desde la API de Symfony (GET, con cache)"""
+
+    def __init__(self, backend, base_url: str, endpoint: str = API_FORECAST_ENDPOINT, cache=None):
+        self.backend = backend
+        self.base_url = base_url
+        self.endpoint = endpoint
+        # Los pronósticos no son reportes del clima actual: se guardan tal cual llegan
+        self.cache = cache if cache is not None else WeatherCache(compact=None)
+
+    async def __call__(self, city: str):
+        """JSON del pronóstico o None si el backend no lo tiene"""
+        url = f"{self.base_url}{self.endpoint.format(city=quote(city))}"
+        # Todas las ciudades comparten el circuito y el timeout de la ruta
+        response = await self.cache.get_or_load(
+            city, lambda: self.backend.get(url, hedge=True, endpoint=self.endpoint)
+        )
+        return response.safe_json() if response.status == 200 else None
+
+
+class SubscriptionStore:
+    """Suscripciones en SQLite (chat, ciudad) -> minuto del día.
+
+    sqlite3 es bloqueante: todas las operaciones corren en un único hilo
+    propio, que además serializa el acceso a la conexión.
+    """
+
+    def __init__(self, path: str = SUBSCRIPTIONS_PATH):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='subscriptions')
+        self._db = None
+
+    async def call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS subscriptions ('
+                ' chat_id NOT NULL, city TEXT NOT NULL, minute INTEGER NOT NULL,'
+                ' PRIMARY KEY (chat_id, city))'
+            )
+        return self._db
+
+    def load(self) -> list:
+        return self._connect().execute('SELECT chat_id, city, minute FROM subscriptions').fetchall()
+
+    def save(self, chat_id, city: str, minute: int) -> None:
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO subscriptions (chat_id, city, minute) VALUES (?, ?, ?)',
+                (chat_id, city, minute)
+            )
+
+    def delete(self, chat_id, cities: list) -> None:
+        with self._connect() as db:
+            db.executemany(
+                'DELETE FROM subscriptions WHERE chat_id = ? AND city = ?',
+                [(chat_id, city) for city in cities]
+            )
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class DailyTimerWheel:
+    """Rueda de tiempo de un día con una ranura por minuto.
+
+    Cada ranura agrupa los chats por ciudad, así que en cada tick se
+    consulta una vez por ciudad sin importar cuántos suscriptores tenga.
+    Alta, baja y tick son O(1) respecto del total de suscripciones.
+    """
+
+    def __init__(self):
+        self.slots = [{} for _ in range(MINUTES_PER_DAY)]
+        self.by_chat = {}
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, chat_id, city: str, minute: int) -> None:
+        self.remove(chat_id, city)
+        self.slots[minute].setdefault(city, set()).add(chat_id)
+        self.by_chat.setdefault(chat_id, {})[city] = minute
+        self.count += 1
+
+    def remove(self, chat_id, city: str) -> bool:
+        cities = self.by_chat.get(chat_id)
+        if not cities or city not in cities:
+            return False
+        minute = cities.pop(city)
+        if not cities:
+            del self.by_chat[chat_id]
+        chats = self.slots[minute][city]
+        chats.discard(chat_id)
+        if not chats:
+            del self.slots[minute][city]
+        self.count -= 1
+        return True
+
+    def of_chat(self, chat_id) -> dict:
+        """Ciudades de un chat -> minuto del día"""
+        return dict(self.by_chat.get(chat_id, {}))
+
+    def due(self, minute: int) -> list:
+        """(ciudad, chats) de la ranura `minute` (copias: se pueden modificar mientras se envía)"""
+        return [(city, list(chats)) for city, chats in self.slots[minute].items()]
+
+
+class SubscriptionScheduler:
+    """Envía cada día el pronóstico a los chats suscriptos a la hora pedida.
+
+    `fetch(city)` trae el pronóstico (una vez por ciudad y tick), `render`
+    lo convierte en texto y `send(chat_id, text)` lo entrega; los envíos
+    pasan por un token bucket para no superar el límite del proveedor.
+    Con varios procesos, `owns(chat_id)` limita cada uno a sus chats.
+    """
+
+    def __init__(self, store: SubscriptionStore, fetch, render, send,
+                 tz: str = SUBSCRIPTION_TZ,
+                 send_rate: float = SUBSCRIPTION_SEND_RATE,
+                 concurrency: int = SUBSCRIPTION_FETCH_CONCURRENCY, owns=None):
+        self.store = store
+        self.fetch = fetch
+        self.render = render
+        self.send = send
+        self.owns = owns
+        self.tz = ZoneInfo(tz)
+        self.bucket = TokenBucket(send_rate, send_rate)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.wheel = DailyTimerWheel()
+        self._task = None
+        self._ticks = set()
+        self.delivered = 0
+        self.failed = 0
+
+    def stats(self) -> dict:
+        return {
+            'subscriptions': len(self.wheel),
+            'chats': len(self.wheel.by_chat),
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'ticks_running': len(self._ticks),
+        }
+
+    def minute_now(self) -> int:
+        """Minuto del día actual en la zona horaria de las suscripciones (con horario de verano)"""
+        now = datetime.now(self.tz)
+        return now.hour * 60 + now.minute
+
+    async def start(self) -> None:
+        """Cargar las suscripciones guardadas y arrancar el reloj"""
+        await self.reload()
+        logger.info("Suscripciones cargadas: %d", len(self.wheel))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def reload(self) -> None:
+        """Reconstruir la rueda desde el store (p. ej. al cambiar qué chats son propios)"""
+        wheel = DailyTimerWheel()
+        for chat_id, city, minute in await self.store.call(self.store.load):
+            if self.owns is None or self.owns(chat_id):
+                wheel.add(chat_id, city, minute)
+        self.wheel = wheel
+
+    async def stop(self) -> None:
+        for task in [self._task, *self._ticks]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*[t for t in [self._task, *self._ticks] if t is not None],
+                             return_exceptions=True)
+        self._task = None
+        await self.store.call(self.store.close)
+        self.store.executor.shutdown(wait=False)
+
+    def subscriptions(self, chat_id) -> dict:
+        return self.wheel.of_chat(chat_id)
+
+    async def subscribe(self, chat_id, city: str, minute: int) -> bool:
+        """Alta o cambio de hora; False si el chat ya llegó al máximo de ciudades"""
+        current = self.wheel.of_chat(chat_id)
+        if city not in current and len(current) >= SUBSCRIPTION_MAX_PER_CHAT:
+            return False
+        await self.store.call(self.store.save, chat_id, city, minute)
+        self.wheel.add(chat_id, city, minute)
+        return True
+
+    async def unsubscribe(self, chat_id, city: str = None) -> list:
+        """Baja de una ciudad (o de todas sin `city`); devuelve las ciudades dadas de baja"""
+        current = self.wheel.of_chat(chat_id)
+        if city is not None:
+            current = {name: minute for name, minute in current.items() if name.casefold() == city.casefold()}
+        cities = list(current)
+        if cities:
+            await self.store.call(self.store.delete, chat_id, cities)
+            for name in cities:
+                self.wheel.remove(chat_id, name)
+        return cities
+
+    async def _run(self) -> None:
+        last = self.minute_now()
+        while True:
+            # Dormir hasta el comienzo del minuto siguiente (los husos difieren en minutos enteros)
+            await asyncio.sleep(60 - time.time() % 60)
+            current = self.minute_now()
+            elapsed = (current - last) % MINUTES_PER_DAY
+            if elapsed > SUBSCRIPTION_MAX_CATCH_UP:
+                logger.warning("El reloj saltó %d minutos: no se recuperan los envíos perdidos", elapsed)
+                last = (current - 1) % MINUTES_PER_DAY
+            while last != current:
+                last = (last + 1) % MINUTES_PER_DAY
+                self._spawn(self._tick(last))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._ticks.add(task)
+        task.add_done_callback(self._ticks.discard)
+
+    async def _tick(self, minute: int) -> None:
+        due = self.wheel.due(minute)
+        if self.owns is not None:
+            # Entre un cambio de dueños y la recarga, no enviar lo que ya no es propio
+            due = [(city, [c for c in chats if self.owns(c)]) for city, chats in due]
+            due = [(city, chats) for city, chats in due if chats]
+        if due:
+            logger.info(
+                "Suscripciones de las %s: %d ciudades, %d chats",
+                format_time(minute), len(due), sum(len(chats) for _, chats in due)
+            )
+            await asyncio.gather(*(self._deliver_city(city, chats) for city, chats in due))
+
+    async def _deliver_city(self, city: str, chats: list) -> None:
+        try:
+            async with self.semaphore:
+                forecast = await self.fetch(city)
+            text = self.render(forecast) if forecast is not None else None
+        except Exception as e:
+            logger.error("No se pudo obtener el pronóstico de '%s': %s", city, e)
+            text = None
+        if text is None:
+            self.failed += len(chats)
+            return
+
+        for chat_id in chats:
+            await self.bucket.acquire()
+            try:
+                # Un send que devuelve False (p. ej. cola de WhatsApp caída) cuenta como falla
+                if await self.send(chat_id, text) is False:
+                    self.failed += 1
+                else:
+                    self.delivered += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("No se pudo enviar el pronóstico a %s: %s", chat_id, e)
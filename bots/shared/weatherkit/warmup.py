@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import asyncio
+import logging
+
+from weatherkit.batch import resolve_many, MULTI_CITY_MAX
+from weatherkit.cache import WeatherCache
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del precalentamiento al arrancar
+WARMUP_SNAPSHOT_PATH = os.getenv('WARMUP_SNAPSHOT_PATH', 'warmup.json')
+WARMUP_TOP_N = int(os.getenv('WARMUP_TOP_N', '20'))  # 0 lo desactiva
+# Pasado este tiempo el bot se declara listo aunque el precalentamiento no terminó
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', '10'))
+
+
+def read_hot_cities(path: str = WARMUP_SNAPSHOT_PATH, limit: int = WARMUP_TOP_N) -> list:
+    """Ciudades más consultadas según el snapshot ([] si no hay o está roto)"""
+    if not limit or not path:
+        return []
+    try:
+        with open(path, encoding='utf-8') as f:
+            cities = json.load(f).get('cities', [])
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning("Snapshot de precalentamiento ilegible (%s): %s", path, e)
+        return []
+    return [city for city in cities if isinstance(city, str)][:limit]
+
+
+def merge_hot_cities(*sources: list, limit: int = WARMUP_TOP_N) -> list:
+    """Unir rankings de ciudades (el primero manda) sin repetir la misma clave del cache"""
+    cities = {}
+    for source in sources:
+        for city in source:
+            cities.setdefault(WeatherCache.normalize(city), city)
+    return list(cities.values())[:limit]
+
+
+def write_hot_cities(cities: list, path: str = WARMUP_SNAPSHOT_PATH) -> None:
+    """Guardar el snapshot de forma atómica (archivo temporal + rename)"""
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'written': time.time(), 'cities': cities}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+async def prewarm_cache(batcher, gazetteer, cities: list, payload: dict,
+                        timeout: float = WARMUP_TIMEOUT) -> int:
+    """Cargar en el cache las `cities` (de a lotes); devuelve cuántas quedaron cargadas"""
+    if not cities:
+        return 0
+    started = time.perf_counter()
+    loaded = 0
+
+    async def load_all():
+        nonlocal loaded
+        resolutions, _ = resolve_many(gazetteer, cities, limit=len(cities))
+        lookups = [resolution.lookup for resolution in resolutions]
+        for i in range(0, len(lookups), MULTI_CITY_MAX):
+            responses = await batcher.fetch_many(lookups[i:i + MULTI_CITY_MAX], payload)
+            loaded += sum(1 for response in responses if getattr(response, 'status', None) == 200)
+
+    try:
+        await asyncio.wait_for(load_all(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Precalentamiento incompleto tras %.0fs", timeout)
+    except Exception as e:
+        logger.warning("Precalentamiento interrumpido: %s", e)
+    logger.info(
+        "Cache precalentado: %d/%d ciudades en %.0f ms",
+        loaded, len(cities), (time.perf_counter() - started) * 1000
+    )
+    return loaded
+
+
+async def boot_warm_up(backend, cache_snapshot, batcher, gazetteer, base_url: str, platform: str) -> int:
+    """Gazetteer (en un hilo), snapshot del cache, conexión con la API y ciudades más consultadas"""
+    cities = read_hot_cities()
+    await asyncio.gather(
+        asyncio.to_thread(len, gazetteer),
+        cache_snapshot.start(),
+        backend.warm_up(base_url) if not cities else asyncio.sleep(0),
+    )
+    # Las ciudades que trajo el snapshot ya están vigentes y no van al backend
+    return await prewarm_cache(
+        batcher, gazetteer, cities,
+        {'user_id': 'warmup', 'username': 'warmup', 'platform': platform}
+    )
+
+
+async def save_hot_cities(profiles, cache, path: str = WARMUP_SNAPSHOT_PATH,
+                          limit: int = WARMUP_TOP_N) -> None:
+    """Guardar al apagar las ciudades a precalentar en el próximo arranque (sin `path` no guarda)"""
+    if not path or not limit:
+        return
+    try:
+        # Las más consultadas según los perfiles y, detrás, las más recientes del cache
+        cities = merge_hot_cities(profiles.popular(limit), cache.hot_keys(limit), limit=limit)
+        await asyncio.to_thread(write_hot_cities, cities, path)
+    except OSError as e:
+        logger.warning("No se pudo guardar el snapshot de precalentamiento: %s", e)
@@ -0,0 +1,139 @@
+import os
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from weatherkit.ratelimit import BucketMap
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del procesamiento concurrente
+TELEGRAM_MAX_IN_FLIGHT = int(os.getenv('TELEGRAM_MAX_IN_FLIGHT', '32'))
+TELEGRAM_MAX_PENDING = int(os.getenv('TELEGRAM_MAX_PENDING', '256'))
+TELEGRAM_USER_MAX_PENDING = int(os.getenv('TELEGRAM_USER_MAX_PENDING', '5'))
+TELEGRAM_USER_RATE = float(os.getenv('TELEGRAM_USER_RATE', '1'))
+TELEGRAM_USER_BURST = float(os.getenv('TELEGRAM_USER_BURST', '5'))
+
+# El semáforo propio de BaseUpdateProcessor bloquearía en vez de descartar;
+# lo dejamos holgado y aplicamos los límites reales en do_process_update
+_ADMISSION_LIMIT = 1_000_000
+
+BUSY_MESSAGE = (
+    "⏳ Estoy recibiendo muchas consultas en este momento.\n"
+    "Por favor, intenta nuevamente en unos segundos."
+)
+
+
+class _UserSlot:
+    __slots__ = ('lock', 'pending')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Procesa updates en paralelo manteniendo el orden dentro de cada usuario.
+
+    - Hasta `max_in_flight` updates se ejecutan a la vez.
+    - Los updates de un mismo usuario se ejecutan de a uno y en orden.
+    - Si hay más de `max_pending` esperando se descarta el update con un
+      aviso (load shedding) en vez de dejar crecer la cola.
+    - Cada usuario tiene un token bucket y un máximo de updates en espera;
+      lo que excede se descarta en silencio (protección contra flood).
+    """
+
+    def __init__(self, max_in_flight: int = TELEGRAM_MAX_IN_FLIGHT,
+                 max_pending: int = TELEGRAM_MAX_PENDING,
+                 user_max_pending: int = TELEGRAM_USER_MAX_PENDING,
+                 user_rate: float = TELEGRAM_USER_RATE,
+                 user_burst: float = TELEGRAM_USER_BURST):
+        super().__init__(_ADMISSION_LIMIT)
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self.user_max_pending = user_max_pending
+        self.user_buckets = BucketMap(user_rate, user_burst)
+        self._slots = None
+        self._users = {}
+        self.in_flight = 0
+        self.pending = 0
+        self.shed = 0
+        self.flooded = 0
+
+    async def initialize(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+
+    async def shutdown(self) -> None:
+        self._users.clear()
+
+    def stats(self) -> dict:
+        """Gauges y contadores del procesador"""
+        return {
+            'in_flight': self.in_flight,
+            'queue_depth': self.pending,
+            'users_waiting': len(self._users),
+            'shed': self.shed,
+            'flooded': self.flooded,
+        }
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            await self._run(coroutine)
+            return
+
+        slot = self._users.get(user.id)
+        if slot is not None and slot.pending >= self.user_max_pending:
+            self._drop_flood(user.id, coroutine)
+            return
+        if not self.user_buckets.get(user.id).try_acquire():
+            self._drop_flood(user.id, coroutine)
+            return
+        if self.pending >= self.max_pending:
+            self.shed += 1
+            coroutine.close()
+            logger.warning("Sobrecarga: se descarta update de %s (%d en espera)", user.id, self.pending)
+            await self._reply_busy(update)
+            return
+
+        if slot is None:
+            slot = self._users[user.id] = _UserSlot()
+        slot.pending += 1
+        self.pending += 1
+        waiting = True
+        try:
+            async with slot.lock, self._slots:
+                self.pending -= 1
+                waiting = False
+                await self._execute(coroutine)
+        finally:
+            if waiting:
+                self.pending -= 1
+                coroutine.close()
+            slot.pending -= 1
+            if slot.pending == 0 and self._users.get(user.id) is slot:
+                del self._users[user.id]
+
+    async def _run(self, coroutine) -> None:
+        async with self._slots:
+            await self._execute(coroutine)
+
+    async def _execute(self, coroutine) -> None:
+        self.in_flight += 1
+        try:
+            await coroutine
+        finally:
+            self.in_flight -= 1
+
+    def _drop_flood(self, user_id, coroutine) -> None:
+        self.flooded += 1
+        coroutine.close()
+        logger.info("Flood de %s: update descartado", user_id)
+
+    async def _reply_busy(self, update: Update) -> None:
+        try:
+            if update.effective_message is not None:
+                await update.effective_message.reply_text(BUSY_MESSAGE)
+        except Exception as e:
+            logger.debug("No se pudo avisar sobrecarga a %s: %s", update.effective_user.id, e)
@@ -1,62 +1,297 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import time
+import signal
+import secrets
 import asyncio
+import functools
 import aiohttp
 import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 
-# Configuración de logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# En local (fuera de Docker) el paquete compartido vive en ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+
+from weatherkit.http import BackendClient
+from weatherkit.cache import WeatherCache
+from weatherkit.model import WeatherReport, ReportError
+from weatherkit.gazetteer import Gazetteer
+from weatherkit.batch import WeatherBatcher, resolve_many, API_BATCH_ENDPOINT
+from weatherkit.subscriptions import (
+    SubscriptionScheduler, SubscriptionStore, ForecastSource, split_subscription, format_time
 )
+from weatherkit.resilience import ResilientBackend, CircuitOpenError
+from weatherkit import render
+from weatherkit.metrics import BotMetrics, MetricsServer, mark_message_start
+from weatherkit.diagnostics import LoopDiagnostics
+from weatherkit.snapshot import CacheSnapshot
+from weatherkit.profiles import UserProfiles, ProfileStore, PROFILES_PATH, parse_units, IMPERIAL
+from weatherkit.warmup import boot_warm_up, save_hot_cities, WARMUP_SNAPSHOT_PATH
+from weatherkit.replies import did_you_mean, reply_from_cache, reply_degraded
+from concurrency import PerUserUpdateProcessor
+
 logger = logging.getLogger(__name__)
 
 # Variables de entorno
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://web:8000')
 API_ENDPOINT = os.getenv('API_TELEGRAM_ENDPOINT', '/api/weather/telegram')
+TELEGRAM_MODE = os.getenv('TELEGRAM_MODE', 'polling')  # polling | webhook
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+TELEGRAM_WEBHOOK_HOST = os.getenv('TELEGRAM_WEBHOOK_HOST', '0.0.0.0')
+TELEGRAM_WEBHOOK_PORT = int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8443'))
+TELEGRAM_WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram/webhook')
+# Bot API propia o stub (por defecto la de Telegram)
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL', 'https://api.telegram.org/bot')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+# Sólo manejamos mensajes de texto y comandos
+ALLOWED_UPDATES = [Update.MESSAGE]
+
+
+def configure_logging():
+    """Configuración de logging (al ejecutar, no al importar el módulo)"""
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=LOG_LEVEL
+    )
+
 
 class TelegramWeatherBot:
     def __init__(self):
         self.api_url = f"{API_BASE_URL}{API_ENDPOINT}"
+        self.metrics = BotMetrics('telegram')
+        self.backend = BackendClient(metrics=self.metrics)
+        self.resilient = ResilientBackend(self.backend)
+        self.cache = WeatherCache()
+        self.gazetteer = Gazetteer()
+        self.batcher = WeatherBatcher(
+            self.cache, self.resilient, self.api_url, f"{API_BASE_URL}{API_BATCH_ENDPOINT}"
+        )
+        self.metrics.track_stats('cache', self.cache.stats)
+        # Cache y resoluciones de antes del último reinicio (se guardan cada tanto)
+        self.cache_snapshot = CacheSnapshot(self.cache, self.gazetteer)
+        self.metrics.track_stats('snapshot', self.cache_snapshot.stats)
+        # Ciudad por defecto, unidades y últimas consultas de cada usuario
+        self.profiles = UserProfiles(ProfileStore() if PROFILES_PATH else None)
+        self.metrics.track_stats('profiles', self.profiles.stats)
+        self.metrics.track_stats('backend', self.resilient.stats)
+        self.scheduler = SubscriptionScheduler(
+            SubscriptionStore(), ForecastSource(self.resilient, API_BASE_URL),
+            render.TELEGRAM_FORECAST.render, self.send_to_chat
+        )
+        self.application = None
+        # Dónde guardar las ciudades más consultadas al apagar (None: no guardar)
+        self.snapshot_path = WARMUP_SNAPSHOT_PATH
+        self.metrics.track_stats('batch', self.batcher.stats)
+        self.metrics.track_stats('subscriptions', self.scheduler.stats)
+
+    async def on_startup(self, application: Application) -> None:
+        """Abrir el pool hacia la API y arrancar suscripciones y precalentamiento en paralelo"""
+        self.application = application
+        await self.backend.start()
+        await asyncio.gather(
+            self.scheduler.start(), self.profiles.start(),
+            boot_warm_up(self.backend, self.cache_snapshot, self.batcher, self.gazetteer,
+                         API_BASE_URL, 'telegram'),
+        )
+
+    async def on_shutdown(self, application: Application) -> None:
+        """Detener las suscripciones, cerrar el pool y guardar el snapshot del cache y las ciudades más consultadas"""
+        await self.scheduler.stop()
+        await self.backend.close()
+        await self.cache_snapshot.stop()
+        await self.profiles.stop()
+        await save_hot_cities(self.profiles, self.cache, self.snapshot_path)
+
+    async def reply(self, update: Update, text: str, **kwargs) -> None:
+        """Responder al mensaje midiendo latencia de envío y mensaje -> respuesta"""
+        started = time.perf_counter()
+        await update.message.reply_text(text, **kwargs)
+        self.metrics.send_latency.observe(time.perf_counter() - started)
+        self.metrics.observe_reply()
+
+    async def send_to_chat(self, chat_id, text: str) -> None:
+        """Enviar un mensaje sin update de origen (pronósticos programados)"""
+        started = time.perf_counter()
+        await self.application.bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown')
+        self.metrics.send_latency.observe(time.perf_counter() - started)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Comando /start"""
-        await update.message.reply_text(
+        await self.reply(
+            update,
             "¡Hola! 🌤️ Soy tu bot del clima.\n\n"
             "Envíame el nombre de una ciudad y te diré el clima actual.\n"
             "Ejemplo: 'Buenos Aires' o 'Madrid'\n\n"
             "Comandos disponibles:\n"
             "/start - Mostrar este mensaje\n"
+            "/subscribe <ciudad> <HH:MM> - Pronóstico diario\n"
+            "/unsubscribe [ciudad] - Dejar de recibirlo\n"
+            "/me [ciudad] - Tu perfil y ciudad por defecto\n"
+            "/unidades c|f - Celsius o Fahrenheit\n"
+            "? - El clima de tu ciudad de siempre\n"
             "/help - Ayuda"
         )
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Comando /help"""
-        await update.message.reply_text(
+        await self.reply(
+            update,
             "🌤️ **Bot del Clima - Ayuda**\n\n"
             "Simplemente escribe el nombre de una ciudad para obtener el clima:\n\n"
             "📍 Ejemplos:\n"
             "• Buenos Aires\n"
             "• Madrid\n"
             "• New York\n"
-            "• London\n\n"
+            "• London\n"
+            "• Madrid, London, Paris (varias a la vez)\n\n"
             "📊 La respuesta incluirá:\n"
             "• Temperatura actual\n"
             "• Descripción del clima\n"
             "• Humedad\n"
             "• Presión atmosférica\n\n"
+            "📬 Pronóstico diario:\n"
+            "/subscribe Madrid 07:30 - Todos los días a esa hora\n"
+            "/unsubscribe - Dejar de recibirlo\n\n"
+            "👤 Tu perfil:\n"
+            "/me Madrid - Elegir tu ciudad por defecto\n"
+            "/unidades f - Ver el clima en °F y mph\n"
+            "? - Repetir el clima de tu ciudad\n\n"
             "/start - Volver al inicio"
         )
 
+    async def subscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Comando /subscribe <ciudad> <HH:MM>"""
+        chat_id = update.effective_chat.id
+        city, minute = split_subscription(context.args or [])
+        if not city or minute is None:
+            current = self.scheduler.subscriptions(chat_id)
+            listing = ''.join(
+                f"• {name} - {format_time(at)}\n" for name, at in sorted(current.items())
+            )
+            await self.reply(
+                update,
+                "📬 Uso: /subscribe <ciudad> <HH:MM>\n"
+                "Ejemplo: /subscribe Madrid 07:30"
+                + (f"\n\nTus suscripciones:\n{listing}" if listing else "")
+            )
+            return
+
+        resolution = self.gazetteer.resolve(city)
+        if resolution.kind == 'invalid':
+            await self.reply(update, f"🤔 '{city}' no parece el nombre de una ciudad.")
+            return
+
+        if not await self.scheduler.subscribe(chat_id, resolution.lookup, minute):
+            await self.reply(
+                update,
+                "⚠️ Llegaste al máximo de ciudades suscriptas.\n"
+                "Usa /unsubscribe <ciudad> para liberar una."
+            )
+            return
+
+        await self.reply(
+            update,
+            f"✅ Todos los días a las {format_time(minute)} te enviaré el pronóstico de {resolution.lookup}.\n"
+            "Usa /unsubscribe para dejar de recibirlo."
+            + did_you_mean(resolution)
+        )
+
+    async def unsubscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Comando /unsubscribe [ciudad]"""
+        city = ' '.join(context.args or [])
+        lookup = self.gazetteer.resolve(city).lookup if city else None
+        removed = await self.scheduler.unsubscribe(update.effective_chat.id, lookup)
+        if removed:
+            await self.reply(update, f"🔕 Listo, ya no recibirás el pronóstico de {', '.join(removed)}.")
+        else:
+            await self.reply(update, "No tenías suscripciones activas con ese nombre.")
+
+    async def me(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Comando /me [ciudad]: ver el perfil o elegir la ciudad por defecto"""
+        profile = await self.profiles.get(update.effective_user.id)
+        city = ' '.join(context.args or [])
+        if city:
+            resolution = self.gazetteer.resolve(city)
+            if resolution.kind == 'invalid':
+                await self.reply(update, f"🤔 '{city}' no parece el nombre de una ciudad.")
+                return
+            self.profiles.set_city(profile, resolution.lookup)
+            await self.reply(
+                update,
+                f"📍 Listo: {resolution.lookup} es tu ciudad. Envía ? para ver su clima."
+                + did_you_mean(resolution)
+            )
+            return
+
+        if profile.city:
+            city = profile.city
+        elif profile.favorite:
+            city = f"{profile.favorite} (la última que consultaste)"
+        else:
+            city = "sin elegir"
+        await self.reply(
+            update,
+            "👤 Tu perfil\n\n"
+            f"📍 Ciudad: {city}\n"
+            f"🌡️ Unidades: {'°F, mph' if profile.units == IMPERIAL else '°C, m/s'}\n"
+            f"🕘 Últimas consultas: {', '.join(profile.history) or 'ninguna'}\n\n"
+            "/me <ciudad> cambia tu ciudad · /unidades c|f las unidades"
+        )
+
+    async def units(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Comando /unidades c|f"""
+        units = parse_units(' '.join(context.args or []))
+        if units is None:
+            await self.reply(update, "🌡️ Uso: /unidades c (Celsius) o /unidades f (Fahrenheit)")
+            return
+        self.profiles.set_units(await self.profiles.get(update.effective_user.id), units)
+        await self.reply(
+            update, "✅ Te mostraré el clima en " + ("°F y mph." if units == IMPERIAL else "°C y m/s.")
+        )
+
     async def handle_weather_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Manejar solicitudes de clima"""
+        mark_message_start()
         city = update.message.text.strip()
         user_id = update.effective_user.id
         username = update.effective_user.username or update.effective_user.first_name
+        profile = await self.profiles.get(user_id)
+
+        # "?" repite la ciudad de siempre: si está vigente en cache, respuesta inmediata
+        if city == '?':
+            city = profile.favorite
+            if city is None:
+                await self.reply(
+                    update,
+                    "🤔 Todavía no consultaste ninguna ciudad.\n"
+                    "Envíame una (ej: 'Buenos Aires') o elígela con /me <ciudad>"
+                )
+                return
+            if await reply_from_cache(self.cache, self.profiles, profile, city,
+                                      functools.partial(self.send_weather_response, update)):
+                return
+
+        # Varias ciudades en un mismo mensaje ("Madrid, London y Paris")
+        cities = self.gazetteer.split_cities(city)
+        if len(cities) > 1:
+            await self.handle_multi_city(update, context, cities, profile)
+            return
+
+        # Canonicalizar la ciudad localmente (alias, acentos, errores de tipeo)
+        resolution = self.gazetteer.resolve(city)
+        if resolution.kind == 'invalid':
+            await self.reply(
+                update,
+                "🤔 Eso no parece el nombre de una ciudad.\n"
+                "Ejemplo: 'Buenos Aires' o 'Madrid'"
+            )
+            return
 
         # Enviar mensaje de "escribiendo..."
         await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
@@ -64,7 +299,7 @@ class TelegramWeatherBot:
         try:
             # Preparar datos para enviar a TU API
             payload = {
-                'city': city,
+                'city': resolution.lookup,
                 'user_id': user_id,
                 'username': username,
                 'platform': 'telegram',
@@ -72,94 +307,122 @@ class TelegramWeatherBot:
             }
 
             # Hacer petición a TU API de Symfony (no a OpenWeather)
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.api_url, json=payload, headers={'Content-Type': 'application/json'}) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        await self.send_weather_response(update, data)
-                    elif response.status == 404:
-                        await update.message.reply_text(
-                            f"❌ No pude encontrar información del clima para '{city}'.\n"
-                            "Por favor, verifica que el nombre de la ciudad sea correcto."
-                        )
-                    elif response.status == 500:
-                        error_data = await response.json()
-                        error_msg = error_data.get('message', 'Error interno del servidor')
-                        await update.message.reply_text(
-                            f"⚠️ Error del servidor: {error_msg}\n"
-                            "Por favor, intenta nuevamente en unos momentos."
-                        )
-                    else:
-                        await update.message.reply_text(
-                            "❌ Ocurrió un error inesperado. Por favor, intenta nuevamente."
-                        )
-
-        except aiohttp.ClientError as e:
-            logger.error(f"Error de conexión: {e}")
-            await update.message.reply_text(
-                "❌ Error de conexión con el servidor.\n"
+            # Pedidos por la misma ciudad comparten cache y request en vuelo;
+            # la consulta es idempotente, así que admite un request de cobertura
+            response = await self.cache.get_or_load(
+                payload['city'], lambda: self.resilient.post(self.api_url, payload, hedge=True)
+            )
+            if response.status == 200:
+                report = response.report()
+                self.profiles.record(profile, resolution.lookup)
+                await self.send_weather_response(update, report, units=profile.units)
+            elif response.status == 404:
+                suggestion = (
+                    f"\n¿Quisiste decir: {', '.join(resolution.suggestions)}?"
+                    if resolution.suggestions else ""
+                )
+                await self.reply(
+                    update,
+                    f"❌ No pude encontrar información del clima para '{city}'.\n"
+                    "Por favor, verifica que el nombre de la ciudad sea correcto."
+                    f"{suggestion}"
+                )
+            elif response.status == 500:
+                # Un 500 puede venir en HTML: no asumir que es JSON
+                error_data = response.safe_json({})
+                error_msg = (error_data.get('message') if isinstance(error_data, dict) else None) \
+                    or 'Error interno del servidor'
+                await self.reply(
+                    update,
+                    f"⚠️ Error del servidor: {error_msg}\n"
+                    "Por favor, intenta nuevamente en unos momentos."
+                )
+            else:
+                await self.reply(
+                    update,
+                    "❌ Ocurrió un error inesperado. Por favor, intenta nuevamente."
+                )
+
+        except (CircuitOpenError, asyncio.TimeoutError, aiohttp.ClientError, ReportError) as e:
+            logger.warning("Backend no disponible (%s): %s", type(e).__name__, e)
+            await reply_degraded(
+                self.batcher, resolution.lookup, profile.units,
+                functools.partial(self.send_weather_response, update), functools.partial(self.reply, update),
+                "❌ El servicio del clima no está disponible en este momento.\n"
                 "Por favor, intenta nuevamente más tarde."
             )
         except Exception as e:
-            logger.error(f"Error inesperado: {e}")
-            await update.message.reply_text(
+            logger.error("Error inesperado: %s", e)
+            await self.reply(
+                update,
                 "❌ Ocurrió un error inesperado.\n"
                 "Por favor, intenta nuevamente."
             )
 
-    async def send_weather_response(self, update: Update, data: dict) -> None:
-        """Enviar respuesta formateada del clima"""
+    async def handle_multi_city(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                cities: list, profile) -> None:
+        """Consultar varias ciudades a la vez y responder con un único mensaje"""
+        resolutions, omitted = resolve_many(self.gazetteer, cities)
+        if not resolutions:
+            await self.reply(
+                update,
+                "🤔 Eso no parece el nombre de una ciudad.\n"
+                "Ejemplo: 'Buenos Aires' o 'Madrid'"
+            )
+            return
+
+        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
+
         try:
-            city = data.get('city', 'Ciudad desconocida')
-            country = data.get('country', '')
-            temp = data.get('temperature', 'N/A')
-            feels_like = data.get('feels_like', 'N/A')
-            description = data.get('description', 'Sin descripción')
-            humidity = data.get('humidity', 'N/A')
-            pressure = data.get('pressure', 'N/A')
-            wind_speed = data.get('wind_speed', 'N/A')
-
-            # Determinar emoji según el clima
-            weather_emoji = self.get_weather_emoji(description)
-
-            message = (
-                f"{weather_emoji} **Clima en {city}**"
-                f"{f', {country}' if country else ''}\n\n"
-                f"🌡️ **Temperatura:** {temp}°C\n"
-                f"🤗 **Sensación térmica:** {feels_like}°C\n"
-                f"📝 **Descripción:** {description.capitalize()}\n"
-                f"💧 **Humedad:** {humidity}%\n"
-                f"🔽 **Presión:** {pressure} hPa\n"
-                f"💨 **Viento:** {wind_speed} m/s\n\n"
-                f"📅 *Actualizado ahora*"
+            payload = {
+                'user_id': update.effective_user.id,
+                'username': update.effective_user.username or update.effective_user.first_name,
+                'platform': 'telegram',
+                'chat_id': update.effective_chat.id
+            }
+            # Un solo round-trip (endpoint batch) o consultas en paralelo acotadas;
+            # cada ciudad falla por separado sin arrastrar al resto
+            results = await self.batcher.lookup_many(resolutions, payload)
+            for result in results:
+                if result.state == 'ok':
+                    self.profiles.record(profile, result.resolution.lookup)
+            await self.reply(
+                update, render.TELEGRAM_SUMMARY.render(results, omitted, profile.units), parse_mode='Markdown'
             )
+        except Exception as e:
+            logger.error("Error inesperado en consulta múltiple: %s", e)
+            await self.reply(
+                update,
+                "❌ Ocurrió un error inesperado.\n"
+                "Por favor, intenta nuevamente."
+            )
+
+    async def send_weather_response(self, update: Update, report: WeatherReport, stale: bool = False,
+                                    units: str = 'metric') -> None:
+        """Enviar respuesta formateada del clima"""
+        try:
+            # Plantilla precompilada con Markdown escapado
+            message = render.TELEGRAM.render(report, stale, units)
 
-            await update.message.reply_text(message, parse_mode='Markdown')
+            await self.reply(update, message, parse_mode='Markdown')
 
         except Exception as e:
-            logger.error(f"Error al formatear respuesta: {e}")
-            await update.message.reply_text(
+            logger.error("Error al formatear respuesta: %s", e)
+            await self.reply(
+                update,
                 "✅ Información del clima recibida, pero hubo un error al formatearla."
             )
 
-    def get_weather_emoji(self, description: str) -> str:
-        """Obtener emoji apropiado según la descripción del clima"""
-        description_lower = description.lower()
-
-        if any(word in description_lower for word in ['sunny', 'clear', 'despejado']):
-            return '☀️'
-        elif any(word in description_lower for word in ['cloud', 'nublado', 'parcialmente']):
-            return '⛅'
-        elif any(word in description_lower for word in ['rain', 'lluvia', 'llovizna']):
-            return '🌧️'
-        elif any(word in description_lower for word in ['storm', 'tormenta']):
-            return '⛈️'
-        elif any(word in description_lower for word in ['snow', 'nieve']):
-            return '❄️'
-        elif any(word in description_lower for word in ['fog', 'mist', 'niebla']):
-            return '🌫️'
-        else:
-            return '🌤️'
+    def register_handlers(self, application: Application) -> None:
+        """Registrar comandos, mensajes de texto y el error handler"""
+        application.add_handler(CommandHandler("start", self.start))
+        application.add_handler(CommandHandler("help", self.help_command))
+        application.add_handler(CommandHandler(["subscribe", "suscribir"], self.subscribe))
+        application.add_handler(CommandHandler(["unsubscribe", "desuscribir"], self.unsubscribe))
+        application.add_handler(CommandHandler(["me", "yo"], self.me))
+        application.add_handler(CommandHandler(["unidades", "units"], self.units))
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_weather_request))
+        application.add_error_handler(self.error_handler)
 
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Manejar errores globales"""
@@ -174,20 +437,98 @@ async def main():
     # Crear instancia del bot
     bot = TelegramWeatherBot()
 
-    # Crear aplicación
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # Updates en paralelo con orden por usuario y descarte ante sobrecarga
+    processor = PerUserUpdateProcessor()
+    bot.metrics.track_queue('updates', lambda: processor.pending)
+    bot.metrics.track_stats('updates', processor.stats)
+
+    # Crear aplicación (en modo webhook no hace falta el Updater de long polling)
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
+        .concurrent_updates(processor)
+    )
+    if TELEGRAM_MODE == 'webhook':
+        builder = builder.updater(None)
+    application = builder.build()
+
+    bot.register_handlers(application)
+
+    # Detener el bot limpiamente con SIGINT/SIGTERM
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
 
-    # Agregar handlers
-    application.add_handler(CommandHandler("start", bot.start))
-    application.add_handler(CommandHandler("help", bot.help_command))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_weather_request))
+    metrics_server = MetricsServer()
+    # Lag del loop, callbacks lentos y profiler a pedido (SIGUSR1)
+    diagnostics = LoopDiagnostics('telegram')
+    diagnostics.add_routes(metrics_server.app)
+    bot.metrics.track_stats('loop', diagnostics.stats)
+    # /healthz responde desde el primer momento; /readyz recién con todo caliente
+    readiness = metrics_server.readiness
+    readiness.set('telegram', False)
+    readiness.set('warmup', False)
 
-    # Agregar error handler
-    application.add_error_handler(bot.error_handler)
+    diagnostics.start()
+    await metrics_server.start()
 
-    # Iniciar bot
-    logger.info("🤖 Bot de Telegram iniciado...")
-    await application.run_polling(allowed_updates=Update.ALL_TYPES)
+    async def initialize():
+        await application.initialize()
+        readiness.set('telegram')
+
+    async def startup():
+        await bot.on_startup(application)
+        readiness.set('warmup')
+
+    try:
+        # getMe contra Telegram en paralelo con el pool, el scheduler y el precalentamiento
+        await asyncio.gather(initialize(), startup())
+        await application.start()
+
+        server = None
+        if TELEGRAM_MODE == 'webhook':
+            # aiohttp.web y el servidor del webhook sólo hacen falta en este modo
+            from webhook import WebhookServer
+            secret = TELEGRAM_WEBHOOK_SECRET
+            if not secret:
+                secret = secrets.token_urlsafe(32)
+                logger.warning(
+                    "TELEGRAM_WEBHOOK_SECRET vacío: se generó uno al azar para esta ejecución "
+                    "(defínelo para poder postear updates a mano)"
+                )
+            server = WebhookServer(
+                application, secret,
+                TELEGRAM_WEBHOOK_HOST, TELEGRAM_WEBHOOK_PORT, TELEGRAM_WEBHOOK_PATH
+            )
+            await server.start()
+            # Sin URL pública (pruebas locales) no registramos el webhook en Telegram
+            if TELEGRAM_WEBHOOK_URL:
+                await application.bot.set_webhook(
+                    url=TELEGRAM_WEBHOOK_URL,
+                    allowed_updates=ALLOWED_UPDATES,
+                    secret_token=secret,
+                )
+        else:
+            await application.updater.start_polling(allowed_updates=ALLOWED_UPDATES)
+
+        # Iniciar bot
+        logger.info("🤖 Bot de Telegram iniciado (modo %s)...", TELEGRAM_MODE)
+        try:
+            await stop_event.wait()
+        finally:
+            if server is not None:
+                await server.stop()
+            else:
+                await application.updater.stop()
+            await application.stop()
+    finally:
+        await bot.on_shutdown(application)
+        await application.shutdown()
+        await metrics_server.stop()
+        await diagnostics.stop()
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    configure_logging()
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Servidor HTTP para recibir updates de Telegram por webhook.
+
+Para probarlo en local sin Telegram alcanza con postear un update grabado:
+
+    curl -X POST http://localhost:8443/telegram/webhook \\
+         -H 'Content-Type: application/json' \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $TELEGRAM_WEBHOOK_SECRET" \\
+         --data @samples/update_text.json
+"""
+
+import hmac
+import logging
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """Recibe updates por HTTP, valida el secret y los encola en la Application"""
+
+    def __init__(self, application: Application, secret: str, host: str, port: int, path: str):
+        if not secret:
+            # Sin secret cualquiera que llegue al puerto podría inyectar updates
+            raise ValueError("El webhook necesita un secret token")
+        self.application = application
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.path = path
+        self._runner = None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret):
+            logger.warning("Webhook rechazado: secret token inválido (%s)", request.remote)
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.warning("Webhook rechazado: update inválido: %s", e)
+            return web.Response(status=400)
+
+        # Responder enseguida; la Application procesa el update en segundo plano
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Webhook escuchando en http://%s:%d%s", self.host, self.port, self.path)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
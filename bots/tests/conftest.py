@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Los tests corren desde bots/: el paquete compartido y los módulos del bot de WhatsApp
+BOTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BOTS_DIR, 'shared'))
+sys.path.insert(0, os.path.join(BOTS_DIR, 'whatsapp'))
+# Al final: el directorio del bot no debe tapar al paquete telegram (python-telegram-bot)
+sys.path.append(os.path.join(BOTS_DIR, 'telegram'))
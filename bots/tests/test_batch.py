@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from weatherkit.batch import WeatherBatcher, resolve_many
+from weatherkit.cache import WeatherCache
+from weatherkit.gazetteer import Gazetteer
+from weatherkit.http import BackendResponse
+from weatherkit.model import WeatherReport
+from weatherkit.resilience import CircuitOpenError
+
+URL = 'http://api/api/weather/telegram'
+BATCH_URL = 'http://api/api/weather/batch'
+
+
+class FakeBackend:
+    """Backend con un endpoint por ciudad sano y un batch configurable"""
+
+    def __init__(self, batch=None, missing=()):
+        self.batch = batch
+        self.missing = set(missing)
+        self.calls = []
+
+    async def post(self, url, payload, hedge=False):
+        self.calls.append((url, hedge))
+        if url == BATCH_URL:
+            if isinstance(self.batch, BaseException):
+                raise self.batch
+            return self.batch
+        if payload['city'] in self.missing:
+            return BackendResponse(404, b'{}')
+        return BackendResponse(200, None, WeatherReport(city=payload['city'], temperature=20))
+
+
+def lookup(backend, cities, cache=None):
+    batcher = WeatherBatcher(cache or WeatherCache(), backend, URL, BATCH_URL)
+    gazetteer = Gazetteer()
+    resolutions, _ = resolve_many(gazetteer, cities)
+    results = asyncio.run(batcher.lookup_many(resolutions, {'platform': 'telegram'}))
+    return batcher, [result.state for result in results]
+
+
+@pytest.mark.parametrize('error', [
+    asyncio.TimeoutError(), ConnectionError('caído'), CircuitOpenError(BATCH_URL),
+])
+def test_batch_failure_falls_back_to_single_lookups(error):
+    backend = FakeBackend(batch=error)
+    batcher, states = lookup(backend, ['Madrid', 'London', 'Paris'])
+    assert states == ['ok', 'ok', 'ok']
+    assert [url for url, _ in backend.calls].count(URL) == 3
+    assert batcher.batch_fallbacks == 1
+
+
+def test_batch_is_not_hedged_but_single_lookups_are():
+    backend = FakeBackend(batch=asyncio.TimeoutError())
+    lookup(backend, ['Madrid', 'Paris'])
+    assert (BATCH_URL, False) in backend.calls
+    assert (URL, True) in backend.calls
+
+
+def test_each_city_of_the_batch_is_isolated():
+    backend = FakeBackend(batch=BackendResponse(200, rb'''{"results": [
+        {"city": "Madrid", "status": 200, "data": {"city": "Madrid", "temp": 25}},
+        {"city": "Londres", "status": 404},
+        {"city": "Par\u00eds", "status": 200, "data": "roto"},
+        {"city": "Roma", "status": 413}
+    ]}'''))
+    batcher, states = lookup(backend, ['Madrid', 'London', 'Paris', 'Rome'])
+    assert states == ['ok', 'missing', 'error', 'ok']
+    # Sólo la que quedó fuera del tope del lote se pide por separado
+    assert [url for url, _ in backend.calls] == [BATCH_URL, URL]
+    assert batcher.batches == 1
+
+
+def test_unsupported_batch_endpoint_is_skipped_for_a_while():
+    backend = FakeBackend(batch=BackendResponse(404, b''), missing={'Atlantis'})
+    batcher, states = lookup(backend, ['Madrid', 'Atlantis'])
+    assert states == ['ok', 'missing']
+    assert batcher.stats()['batch_enabled'] == 0
+
+    backend.calls.clear()
+    asyncio.run(batcher.fetch_many(['Lima', 'Quito'], {}))
+    assert BATCH_URL not in [url for url, _ in backend.calls]
+
+
+def test_stale_value_is_served_when_a_city_fails():
+    cache = WeatherCache(stale_ttl=0)
+    cache.set('madrid', BackendResponse(200, None, WeatherReport(city='Madrid', temperature=5)))
+    cache._entries['madrid'].fresh_until = cache._entries['madrid'].stale_until = 0
+
+    class DownBackend:
+        async def post(self, url, payload, hedge=False):
+            raise ConnectionError('caído')
+
+    _, states = lookup(DownBackend(), ['Madrid', 'Paris'], cache)
+    assert states == ['stale', 'error']
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from weatherkit.cache import WeatherCache
+from weatherkit.http import BackendResponse
+from weatherkit.model import WeatherReport
+
+
+def ok(city):
+    return BackendResponse(200, None, WeatherReport(city=city, temperature=20.0))
+
+
+def test_concurrent_requests_share_one_load():
+    cache = WeatherCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ok('Madrid')
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_load(' madrid', loader) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert cache.coalesced == 4
+    assert all(result is results[0] for result in results)
+    assert cache.peek('Madrid') is results[0]
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    cache = WeatherCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ok('Madrid')
+
+    async def scenario():
+        leader = asyncio.create_task(cache.get_or_load('Madrid', loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load('Madrid', loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    result = asyncio.run(scenario())
+    assert result.report().city == 'Madrid'
+    assert len(calls) == 1
+    assert cache.coalesced == 1
+    assert cache.peek('Madrid') is result
+
+
+def test_loader_error_reaches_everyone_and_is_not_cached():
+    cache = WeatherCache()
+
+    async def loader():
+        await asyncio.sleep(0)
+        raise ConnectionError('caído')
+
+    async def scenario():
+        return await asyncio.gather(
+            *(cache.get_or_load('Madrid', loader) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert not cache._inflight
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize('status, cached', [(200, True), (404, True), (500, False), (429, False)])
+def test_only_200_and_404_are_cached(status, cached):
+    cache = WeatherCache()
+    cache.set('x', BackendResponse(status, b'{"city": "x", "temp": 1}'))
+    assert (cache.peek('x') is not None) == cached
+
+
+def test_lru_evicts_least_recently_used():
+    cache = WeatherCache(max_entries=2)
+    cache.set('a', ok('a'))
+    cache.set('b', ok('b'))
+    asyncio.run(cache.get_or_load('a', None))
+    cache.set('c', ok('c'))
+    assert cache.peek('b') is None
+    assert cache.peek('a') is not None
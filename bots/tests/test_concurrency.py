@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+
+from concurrency import PerUserUpdateProcessor
+
+
+def update(update_id, user_id):
+    user = User(user_id, f"user{user_id}", is_bot=False)
+    chat = Chat(user_id, Chat.PRIVATE)
+    message = Message(update_id, datetime.now(timezone.utc), chat, from_user=user, text='Madrid')
+    return Update(update_id, message=message)
+
+
+class Handlers:
+    """Corrutinas de handler que esperan a que el test las libere"""
+
+    def __init__(self):
+        self.started = []
+        self.finished = []
+        self.release = asyncio.Event()
+
+    async def handle(self, update_id, user_id):
+        self.started.append((user_id, update_id))
+        await self.release.wait()
+        self.finished.append((user_id, update_id))
+
+
+def processor(**kwargs):
+    options = dict(max_in_flight=8, max_pending=100, user_max_pending=100, user_rate=1000, user_burst=1000)
+    options.update(kwargs)
+    processor = PerUserUpdateProcessor(**options)
+    busy = []
+
+    async def reply_busy(update):
+        busy.append(update.update_id)
+
+    processor._reply_busy = reply_busy
+    return processor, busy
+
+
+def submit(processor, handlers, items):
+    return [
+        asyncio.create_task(processor.do_process_update(update(i, user), handlers.handle(i, user)))
+        for i, user in items
+    ]
+
+
+def test_one_update_per_user_at_a_time_in_order():
+    async def scenario():
+        proc, _ = processor()
+        await proc.initialize()
+        handlers = Handlers()
+        tasks = submit(proc, handlers, [(1, 10), (2, 10), (3, 20), (4, 10)])
+        await asyncio.sleep(0.01)
+        # Usuarios distintos en paralelo; del mismo usuario sólo el primero
+        assert handlers.started == [(10, 1), (20, 3)]
+        assert proc.stats()['queue_depth'] == 2
+        handlers.release.set()
+        await asyncio.gather(*tasks)
+        return handlers, proc
+
+    handlers, proc = asyncio.run(scenario())
+    assert [u for user, u in handlers.finished if user == 10] == [1, 2, 4]
+    assert proc.stats() == {'in_flight': 0, 'queue_depth': 0, 'users_waiting': 0, 'shed': 0, 'flooded': 0}
+
+
+def test_overload_sheds_with_a_busy_reply():
+    async def scenario():
+        proc, busy = processor(max_in_flight=1, max_pending=2)
+        await proc.initialize()
+        handlers = Handlers()
+        tasks = submit(proc, handlers, [(i, 100 + i) for i in range(1, 6)])
+        await asyncio.sleep(0.01)
+        handlers.release.set()
+        await asyncio.gather(*tasks)
+        return handlers, proc, busy
+
+    handlers, proc, busy = asyncio.run(scenario())
+    # 1 en ejecución, 2 en espera y el resto descartado con aviso
+    assert len(handlers.finished) == 3
+    assert busy == [4, 5]
+    assert proc.shed == 2
+
+
+def test_flooding_user_is_dropped_silently():
+    async def scenario():
+        proc, busy = processor(user_max_pending=2, user_burst=2, user_rate=0.001)
+        await proc.initialize()
+        handlers = Handlers()
+        # Tope de dos en espera por usuario: el tercero y el cuarto se descartan
+        tasks = submit(proc, handlers, [(i, 10) for i in range(1, 5)])
+        await asyncio.sleep(0.01)
+        handlers.release.set()
+        await asyncio.gather(*tasks)
+        # Sin tokens: también se descarta aunque no tenga nada en espera
+        await proc.do_process_update(update(5, 10), handlers.handle(5, 10))
+        await proc.do_process_update(update(6, 20), handlers.handle(6, 20))
+        return handlers, proc, busy
+
+    handlers, proc, busy = asyncio.run(scenario())
+    assert handlers.finished == [(10, 1), (10, 2), (20, 6)]
+    assert proc.flooded == 3
+    assert busy == []
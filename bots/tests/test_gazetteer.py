@@ -0,0 +1,68 @@
+import pytest
+
+from weatherkit.gazetteer import Gazetteer, edit_distance
+
+
+@pytest.fixture
+def gazetteer():
+    return Gazetteer()
+
+
+def test_exact_names_and_aliases(gazetteer):
+    assert gazetteer.resolve('caba').city == 'Buenos Aires'
+    assert gazetteer.resolve('  cordoba ').city == 'Córdoba'
+    assert gazetteer.resolve('Cordoba').kind == 'exact'
+
+
+@pytest.mark.parametrize('text, suggestion', [
+    ('Malta', 'Salta'),
+    ('Leon', 'Lyon'),
+    ('Rosarito', 'Rosario'),
+    ('Cordova', 'Córdoba'),
+])
+def test_near_misses_are_only_suggested(gazetteer, text, suggestion):
+    # Son ciudades reales fuera del índice: se consultan tal como se escribieron
+    resolution = gazetteer.resolve(text)
+    assert resolution.kind == 'unknown'
+    assert resolution.city is None
+    assert resolution.lookup == text
+    assert suggestion in resolution.suggestions
+
+
+def test_typo_is_sent_as_typed_with_suggestion(gazetteer):
+    resolution = gazetteer.resolve('Buenos Aries')
+    assert resolution.lookup == 'Buenos Aries'
+    assert resolution.suggestions[0] == 'Buenos Aires'
+
+
+@pytest.mark.parametrize('text', ['', '1234', 'https://example.com', 'a b c d e f g'])
+def test_invalid_texts(gazetteer, text):
+    assert gazetteer.resolve(text).kind == 'invalid'
+
+
+def test_memo_keeps_recent_bookkeeping(gazetteer):
+    gazetteer.resolve('Madrid')
+    gazetteer.resolve('Paris')
+    # Un acierto del memo también cuenta como resolución reciente
+    gazetteer.resolve('Madrid')
+    assert [query for query, *_ in gazetteer.resolutions()] == ['Paris', 'Madrid']
+
+
+def test_restore_skips_old_fuzzy_resolutions(gazetteer):
+    gazetteer.restore([
+        ('Malta', 'Salta', 'fuzzy', []),
+        ('bsas', 'Buenos Aires', 'exact', []),
+    ])
+    assert gazetteer.resolve('Malta').lookup == 'Malta'
+    assert gazetteer.resolve('bsas').city == 'Buenos Aires'
+
+
+def test_split_cities(gazetteer):
+    assert gazetteer.split_cities('Madrid, London y Paris') == ['Madrid', 'London', 'Paris']
+    assert gazetteer.split_cities('Paris, FR') == ['Paris, FR']
+    assert gazetteer.split_cities('Madrid, madrid') == ['Madrid']
+
+
+def test_edit_distance_counts_transpositions_once():
+    assert edit_distance('madird', 'madrid', 2) == 1
+    assert edit_distance('abc', 'xyz', 1) == 2
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from weatherkit.http import BackendClient, BackendResponse
+
+
+async def weather(request):
+    payload = await request.json()
+    if payload['city'] == 'Atlantis':
+        return web.json_response({'error': 'Ciudad no encontrada'}, status=404)
+    return web.json_response({'city': payload['city'], 'temp': 20})
+
+
+def test_requests_share_the_pool():
+    async def scenario():
+        app = web.Application()
+        app.router.add_post('/api/weather', weather)
+        async with TestServer(app) as server:
+            url = str(server.make_url('/api/weather'))
+            async with BackendClient(limit_per_host=2) as client:
+                session = client.session
+                responses = await asyncio.gather(
+                    *(client.post(url, {'city': city}) for city in ('Madrid', 'Paris', 'Atlantis'))
+                )
+                assert client.session is session
+        return responses
+
+    madrid, paris, atlantis = asyncio.run(scenario())
+    assert madrid.status == 200
+    assert madrid.report().city == 'Madrid'
+    assert paris.json() == {'city': 'Paris', 'temp': 20}
+    assert atlantis.status == 404
+
+
+def test_client_must_be_started():
+    with pytest.raises(RuntimeError):
+        BackendClient().session
+
+
+def test_compact_keeps_only_the_report():
+    response = BackendResponse(200, b'{"city": "Madrid", "temp": 21}')
+    response.compact()
+    assert response.body is None
+    assert response.json() == {'city': 'Madrid', 'temperature': 21}
+
+    broken = BackendResponse(200, b'<html>')
+    broken.compact()
+    assert broken.body == b'<html>'
+    assert broken.safe_json() is None
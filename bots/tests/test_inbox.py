@@ -0,0 +1,84 @@
+import asyncio
+
+from inbox import INBOX_MAX_ATTEMPTS, DurableInbox, idempotency_key
+
+
+def notification(receipt_id, message_id=None, chat_id='1@c.us'):
+    body = {'senderData': {'chatId': chat_id}}
+    if message_id is not None:
+        body['idMessage'] = message_id
+    return {'receiptId': receipt_id, 'body': body}
+
+
+def test_idempotency_key_prefers_the_message_id():
+    assert idempotency_key(notification(1, 'ABC')) == 'message:ABC'
+    assert idempotency_key(notification(1)) == 'receipt:1'
+
+
+def test_redelivered_notifications_are_ignored(tmp_path):
+    async def scenario():
+        inbox = DurableInbox(str(tmp_path / 'inbox.db'))
+        first = await inbox.put(notification(1, 'ABC'))
+        # Green API reentrega el mismo mensaje con otro receiptId
+        again = await inbox.put(notification(2, 'ABC'))
+        other = await inbox.put(notification(3, 'DEF'))
+        await inbox.close()
+        return first, again, other
+
+    first, again, other = asyncio.run(scenario())
+    assert first is not None
+    assert again is None
+    assert other is not None and other != first
+
+
+def test_pending_are_replayed_after_a_restart(tmp_path):
+    path = str(tmp_path / 'inbox.db')
+
+    async def scenario():
+        inbox = DurableInbox(path)
+        done = await inbox.put(notification(1, 'A'))
+        await inbox.put(notification(2, 'B'))
+        await inbox.put(notification(3, 'C'))
+        await inbox.complete(done)
+        await inbox.close()
+
+        restarted = DurableInbox(path)
+        pending = await restarted.pending()
+        await restarted.close()
+        return pending
+
+    pending = asyncio.run(scenario())
+    assert [n['body']['idMessage'] for _, n in pending] == ['B', 'C']
+
+
+def test_poison_notifications_are_dropped_after_max_attempts(tmp_path):
+    path = str(tmp_path / 'inbox.db')
+
+    async def scenario():
+        inbox = DurableInbox(path)
+        await inbox.put(notification(1, 'A'))
+        await inbox.close()
+
+        replays = []
+        for _ in range(INBOX_MAX_ATTEMPTS + 1):
+            # Cada arranque la vuelve a intentar y el proceso "se cae" sin completarla
+            inbox = DurableInbox(path)
+            replays.append(len(await inbox.pending()))
+            await inbox.close()
+        return replays
+
+    assert asyncio.run(scenario()) == [1] * INBOX_MAX_ATTEMPTS + [0]
+
+
+def test_concurrent_writes_share_commits(tmp_path):
+    async def scenario():
+        inbox = DurableInbox(str(tmp_path / 'inbox.db'))
+        ids = await asyncio.gather(*(inbox.put(notification(i, f"M{i}")) for i in range(50)))
+        stats = inbox.stats()
+        await inbox.close()
+        return ids, stats
+
+    ids, stats = asyncio.run(scenario())
+    assert len(set(ids)) == 50
+    assert stats['stored'] == 50
+    assert stats['commits'] < 50
@@ -0,0 +1,44 @@
+import pytest
+
+from weatherkit.model import ReportError, WeatherReport
+
+
+def test_valid_report():
+    report = WeatherReport.from_dict({
+        'id': 3117735, 'city': 'Madrid', 'country': 'ES', 'temperature': 21.5,
+        'feels_like': 20, 'humidity': 40, 'wind_speed': 3.2, 'wind_direction': 'N',
+        'description': 'despejado', 'icon': '01d',
+    })
+    assert report.city == 'Madrid'
+    assert report.temperature == 21.5
+    assert report.feels_like == 20
+    assert report.pressure is None
+
+
+def test_temp_alias():
+    assert WeatherReport.from_dict({'temp': 12}).temperature == 12
+    assert WeatherReport.from_dict({'temperature': 5, 'temp': 12}).temperature == 5
+
+
+@pytest.mark.parametrize('value', ['21', True, [21], {'value': 21}, None])
+def test_non_numbers_become_none(value):
+    report = WeatherReport.from_dict({'city': 'Madrid', 'temperature': 1, 'humidity': value})
+    assert report.humidity is None
+
+
+@pytest.mark.parametrize('data', [None, [], 'Madrid', 42, {}, {'city': ''}, {'temperature': True},
+                                  {'city': 7, 'temperature': 'caliente'}])
+def test_invalid_payloads_raise(data):
+    with pytest.raises(ReportError):
+        WeatherReport.from_dict(data)
+
+
+def test_report_error_is_a_value_error():
+    assert issubclass(ReportError, ValueError)
+
+
+def test_bytes_round_trip():
+    report = WeatherReport.from_bytes(b'{"city": "Paris", "temp": 18, "id": "abc", "extra": 1}')
+    assert report.to_dict() == {'city': 'Paris', 'temperature': 18, 'id': 'abc'}
+    with pytest.raises(ReportError):
+        WeatherReport.from_bytes(b'no es json')
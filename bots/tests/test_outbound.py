@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from weatherkit.ratelimit import TokenBucket, BucketMap
+import outbound as module
+from outbound import OutboundDispatcher
+
+
+class Recorder:
+    """Envío síncrono (como el SDK) que registra el orden y puede fallar con un código"""
+
+    def __init__(self, codes=None):
+        self.sent = []
+        self.codes = dict(codes or {})
+        self._lock = threading.Lock()
+
+    def __call__(self, chat_id, message):
+        with self._lock:
+            self.sent.append((chat_id, message))
+            code = self.codes.pop(message, 200)
+        return SimpleNamespace(code=code, data={}, error=None)
+
+
+def dispatcher(send, workers=1, chat_rate=50, chat_burst=1):
+    outbound = OutboundDispatcher(send, workers=workers, queue_size=100)
+    outbound.account_bucket = TokenBucket(1000, 1000)
+    outbound.chat_buckets = BucketMap(chat_rate, chat_burst)
+    return outbound
+
+
+def run(outbound, messages):
+    async def scenario():
+        outbound.start()
+        for chat_id, message in messages:
+            await outbound.send(chat_id, message)
+        await outbound.stop(timeout=5)
+
+    asyncio.run(scenario())
+
+
+def test_throttled_chat_does_not_stall_the_others():
+    send = Recorder()
+    outbound = dispatcher(send)
+    run(outbound, [('A', 'a1'), ('A', 'a2'), ('A', 'a3'), ('B', 'b1'), ('C', 'c1')])
+
+    # A se queda sin tokens tras a1: b1 y c1 (mismo worker) salen antes que a2
+    assert send.sent[:3] == [('A', 'a1'), ('B', 'b1'), ('C', 'c1')]
+    assert [m for chat, m in send.sent if chat == 'A'] == ['a1', 'a2', 'a3']
+    assert outbound.throttled == 1
+    assert outbound.stats()['throttled_chats'] == 0
+
+
+def test_messages_arriving_while_parked_keep_their_place():
+    send = Recorder()
+    outbound = dispatcher(send, workers=2)
+
+    async def scenario():
+        outbound.start()
+        await outbound.send('A', 'a1')
+        await outbound.send('A', 'a2')
+        await asyncio.sleep(0)
+        # El chat ya está apartado: lo nuevo va detrás de lo apartado
+        for i in range(3, 7):
+            await outbound.send('A', f"a{i}")
+            await asyncio.sleep(0.005)
+        await outbound.stop(timeout=5)
+
+    asyncio.run(scenario())
+    assert [m for _, m in send.sent] == [f"a{i}" for i in range(1, 7)]
+    assert outbound.sent == 6
+
+
+def test_retries_keep_the_chat_order(monkeypatch):
+    monkeypatch.setattr(module, 'SEND_BACKOFF_BASE', 0.001)
+    send = Recorder({'a1': 429})
+    outbound = dispatcher(send, chat_burst=10)
+    run(outbound, [('A', 'a1'), ('A', 'a2')])
+
+    assert send.sent == [('A', 'a1'), ('A', 'a1'), ('A', 'a2')]
+    assert outbound.retried == 1
+    assert outbound.failed == 0
+
+
+def test_client_errors_are_not_retried():
+    send = Recorder({'a1': 400})
+    outbound = dispatcher(send, chat_burst=10)
+    run(outbound, [('A', 'a1'), ('A', 'a2')])
+    assert send.sent == [('A', 'a1'), ('A', 'a2')]
+    assert outbound.failed == 1
+    assert outbound.sent == 1
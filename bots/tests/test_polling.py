@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from inbox import DurableInbox
+from polling import NotificationPoller
+
+
+def notification(receipt_id, chat_id, seq):
+    return {
+        'receiptId': receipt_id,
+        'body': {
+            'idMessage': f"{chat_id}-{seq}",
+            'senderData': {'chatId': chat_id},
+            'seq': seq,
+        },
+    }
+
+
+class FakeGreenAPI:
+    """receiveNotification entrega la lista de a una; deleteNotification registra el ack"""
+
+    def __init__(self, notifications):
+        self._pending = list(notifications)
+        self._lock = threading.Lock()
+        self.acked = []
+        self.receiving = SimpleNamespace(
+            receiveNotification=self.receive, deleteNotification=self.delete
+        )
+
+    def receive(self):
+        with self._lock:
+            data = self._pending.pop(0) if self._pending else None
+        return SimpleNamespace(data=data)
+
+    def delete(self, receipt_id):
+        with self._lock:
+            self.acked.append(receipt_id)
+
+
+def run_poller(tmp_path, notifications, expected, inbox_setup=None, workers=4):
+    handled = []
+
+    async def scenario():
+        inbox = DurableInbox(str(tmp_path / 'inbox.db'))
+        if inbox_setup is not None:
+            await inbox_setup(inbox)
+        done = asyncio.Event()
+
+        async def handler(item):
+            body = item['body']
+            # Los mensajes tardan distinto: sin ruteo por chat se adelantarían
+            await asyncio.sleep(0.002 * (3 - body['seq'] % 3))
+            handled.append((body['senderData']['chatId'], body['seq']))
+            if len(handled) >= expected:
+                done.set()
+
+        greenapi = FakeGreenAPI(notifications)
+        poller = NotificationPoller(greenapi, handler, inbox, workers=workers, queue_size=8, threads=2)
+        task = asyncio.create_task(poller.run())
+        await asyncio.wait_for(done.wait(), 5)
+        # Dar tiempo a que se marque la última como procesada
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        pending = await inbox.pending()
+        await inbox.close()
+        return greenapi, poller, pending
+
+    greenapi, poller, pending = asyncio.run(scenario())
+    return handled, greenapi, poller, pending
+
+
+def test_messages_of_a_chat_are_handled_in_order(tmp_path):
+    chats = [f"{i}@c.us" for i in range(6)]
+    notifications = [
+        notification(receipt, chats[receipt % len(chats)], receipt // len(chats))
+        for receipt in range(60)
+    ]
+    handled, greenapi, poller, pending = run_poller(tmp_path, notifications, expected=60)
+
+    assert len(handled) == 60
+    for chat in chats:
+        assert [seq for chat_id, seq in handled if chat_id == chat] == list(range(10))
+    assert sorted(greenapi.acked) == list(range(60))
+    assert poller.stats()['received'] == 60
+    assert pending == []
+
+
+def test_same_chat_always_lands_in_the_same_queue():
+    poller = NotificationPoller(None, None, None, workers=8, threads=1)
+
+    async def scenario():
+        for seq in range(5):
+            await poller._enqueue(seq, notification(seq, '42@c.us', seq))
+        return [queue.qsize() for queue in poller.queues]
+
+    sizes = asyncio.run(scenario())
+    poller.executor.shutdown()
+    assert sorted(sizes) == [0] * 7 + [5]
+
+
+def test_duplicates_are_acked_but_not_handled(tmp_path):
+    first = notification(1, '1@c.us', 0)
+    again = notification(2, '1@c.us', 0)
+    nxt = notification(3, '1@c.us', 1)
+    handled, greenapi, poller, _ = run_poller(tmp_path, [first, again, nxt], expected=2)
+
+    assert handled == [('1@c.us', 0), ('1@c.us', 1)]
+    assert sorted(greenapi.acked) == [1, 2, 3]
+    assert poller.duplicates == 1
+
+
+def test_pending_notifications_are_replayed_first(tmp_path):
+    async def leftover(inbox):
+        await inbox.put(notification(1, '1@c.us', 0))
+
+    handled, _, poller, pending = run_poller(
+        tmp_path, [notification(2, '1@c.us', 1)], expected=2, inbox_setup=leftover
+    )
+    assert handled == [('1@c.us', 0), ('1@c.us', 1)]
+    assert poller.replayed == 1
+    assert pending == []
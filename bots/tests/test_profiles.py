@@ -0,0 +1,110 @@
+import asyncio
+
+from weatherkit.cache import WeatherCache
+from weatherkit.http import BackendResponse
+from weatherkit.model import WeatherReport
+from weatherkit.replies import reply_from_cache
+from weatherkit.profiles import IMPERIAL, METRIC, ProfileStore, UserProfiles, parse_units
+
+
+def test_history_and_favorite():
+    profiles = UserProfiles(history=3)
+
+    async def scenario():
+        return await profiles.get(1)
+
+    profile = asyncio.run(scenario())
+    assert profile.favorite is None
+    for city in ('Madrid', 'Paris', 'Lima', 'Madrid', 'Quito'):
+        profiles.record(profile, city)
+    assert profile.history == ('Quito', 'Madrid', 'Lima')
+    # "?" usa la última consultada hasta que elija una ciudad
+    assert profile.favorite == 'Quito'
+    profiles.set_city(profile, 'Lima')
+    assert profile.favorite == 'Lima'
+    assert profiles.popular(2) == ['Madrid', 'Paris']
+
+
+def test_lru_keeps_only_the_active_users():
+    profiles = UserProfiles(max_users=2)
+
+    async def scenario():
+        first = await profiles.get(1)
+        await profiles.get(2)
+        await profiles.get(1)
+        await profiles.get(3)
+        return first
+
+    first = asyncio.run(scenario())
+    assert profiles.peek(1) is first
+    assert profiles.peek(2) is None
+    assert profiles.peek('3') is not None
+    assert profiles.hits == 1
+
+
+def test_changes_are_flushed_and_reloaded(tmp_path):
+    path = str(tmp_path / 'profiles.db')
+
+    async def scenario():
+        profiles = UserProfiles(ProfileStore(path), max_users=1, flush_interval=0)
+        await profiles.start()
+        profile = await profiles.get(1)
+        profiles.set_units(profile, IMPERIAL)
+        profiles.record(profile, 'Madrid')
+        profiles.record(profile, 'Madrid')
+        # El perfil sale del LRU pero su cambio sigue pendiente de escribir
+        await profiles.get(2)
+        assert profiles.peek(1) is None
+        assert (await profiles.get(1)) is profile
+        await profiles.stop()
+
+        restarted = UserProfiles(ProfileStore(path), flush_interval=0)
+        await restarted.start()
+        loaded = await restarted.get(1)
+        popular = restarted.popular(5)
+        await restarted.stop()
+        return loaded, popular
+
+    loaded, popular = asyncio.run(scenario())
+    assert loaded.units == IMPERIAL
+    assert loaded.history == ('Madrid',)
+    assert loaded.favorite == 'Madrid'
+    assert popular == ['Madrid']
+
+
+def test_concurrent_gets_load_once(tmp_path):
+    async def scenario():
+        profiles = UserProfiles(ProfileStore(str(tmp_path / 'profiles.db')), flush_interval=0)
+        results = await asyncio.gather(*(profiles.get(7) for _ in range(5)))
+        await profiles.stop()
+        return profiles, results
+
+    profiles, results = asyncio.run(scenario())
+    assert profiles.loads == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_question_mark_answers_the_favorite_from_cache():
+    profiles = UserProfiles()
+    cache = WeatherCache()
+    cache.set('lima', BackendResponse(200, None, WeatherReport(city='Lima', temperature=18)))
+    sent = []
+
+    async def send_report(report, units):
+        sent.append((report.city, units))
+
+    async def scenario():
+        profile = await profiles.get(1)
+        profiles.record(profile, 'Lima')
+        profiles.set_units(profile, IMPERIAL)
+        return await reply_from_cache(cache, profiles, profile, profile.favorite, send_report)
+
+    assert asyncio.run(scenario())
+    assert sent == [('Lima', IMPERIAL)]
+    assert profiles.popular(1) == ['Lima']
+
+
+def test_parse_units():
+    assert parse_units('°F') == IMPERIAL
+    assert parse_units(' Celsius ') == METRIC
+    assert parse_units('kelvin') is None
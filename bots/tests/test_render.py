@@ -0,0 +1,63 @@
+import itertools
+
+import pytest
+
+from weatherkit import render
+from weatherkit.model import WeatherReport
+from weatherkit.render import DEFAULT_EMOJI, EMOJI_KEYWORDS, escape_telegram_markdown, weather_emoji
+
+KEYWORDS = [keyword for _, keywords in EMOJI_KEYWORDS for keyword in keywords]
+
+
+def legacy_emoji(description):
+    """La cadena de any() que tenían los bots antes de las plantillas compartidas"""
+    description = description.lower()
+    for emoji, keywords in EMOJI_KEYWORDS:
+        if any(keyword in description for keyword in keywords):
+            return emoji
+    return DEFAULT_EMOJI
+
+
+@pytest.mark.parametrize('description, emoji', [
+    ('Cielo despejado', '☀️'),
+    ('Parcialmente nublado', '⛅'),
+    ('thunderstorm with light rain', '🌧️'),
+    ('Tormenta eléctrica', '⛈️'),
+    ('Lluvia y nieve', '🌧️'),
+    ('Heavy SNOW', '❄️'),
+    ('mist', '🌫️'),
+    ('overcast', DEFAULT_EMOJI),
+    ('', DEFAULT_EMOJI),
+])
+def test_weather_emoji(description, emoji):
+    assert weather_emoji(description) == emoji
+
+
+def test_weather_emoji_keeps_the_legacy_priority():
+    # Todas las combinaciones de dos palabras, también solapadas ("mistorm")
+    cases = []
+    for first, second in itertools.product(KEYWORDS, repeat=2):
+        cases.append(f"{first} {second}")
+        for overlap in range(1, min(len(first), len(second))):
+            if first[-overlap:] == second[:overlap]:
+                cases.append(first + second[overlap:])
+    for description in cases:
+        assert weather_emoji(description) == legacy_emoji(description), description
+
+
+@pytest.mark.parametrize('text, escaped', [
+    ('Buenos Aires', 'Buenos Aires'),
+    ('São_Paulo', 'São\\_Paulo'),
+    ('*bold* `code` [link]', '\\*bold\\* \\`code\\` \\[link]'),
+])
+def test_escape_telegram_markdown(text, escaped):
+    assert escape_telegram_markdown(text) == escaped
+
+
+def test_telegram_reply_escapes_values_but_not_the_template():
+    report = WeatherReport(city='Saint_Denis', country='FR', temperature=12.5, description='lluvia')
+    message = render.TELEGRAM.render(report)
+    assert 'Saint\\_Denis' in message
+    assert '🌧️' in message
+    assert message.count('*') % 2 == 0
+    assert 'N/A' in message
@@ -0,0 +1,59 @@
+import asyncio
+
+from weatherkit.cache import WeatherCache
+from weatherkit.gazetteer import Resolution
+from weatherkit.http import BackendResponse
+from weatherkit.model import WeatherReport
+from weatherkit.profiles import UserProfiles
+from weatherkit.replies import did_you_mean, reply_degraded, reply_from_cache
+
+
+class Sent:
+    def __init__(self):
+        self.items = []
+
+    async def report(self, report, stale=False, units='metric'):
+        self.items.append(('report', report.city, stale, units))
+
+    async def text(self, text):
+        self.items.append(('text', text))
+
+
+def test_did_you_mean():
+    assert did_you_mean(Resolution('Malta', None, 'unknown', ['Salta'])) == "\n\n¿O quisiste decir: Salta?"
+    assert did_you_mean(Resolution('Leon', None, 'unknown', ['Lyon']), '*').endswith('*Lyon*?')
+    assert did_you_mean(Resolution('bsas', 'Buenos Aires', 'exact')) == ""
+    assert did_you_mean(Resolution('Xyzzy', None, 'unknown')) == ""
+
+
+def test_reply_from_cache_only_with_fresh_200():
+    cache = WeatherCache()
+    profiles = UserProfiles()
+    sent = Sent()
+
+    async def scenario():
+        profile = await profiles.get(1)
+        assert not await reply_from_cache(cache, profiles, profile, 'Madrid', sent.report)
+        cache.set('madrid', BackendResponse(200, None, WeatherReport(city='Madrid', temperature=20)))
+        assert await reply_from_cache(cache, profiles, profile, 'Madrid', sent.report)
+        return profile
+
+    profile = asyncio.run(scenario())
+    assert sent.items == [('report', 'Madrid', False, 'metric')]
+    assert profile.favorite == 'Madrid'
+
+
+class FakeBatcher:
+    def __init__(self, report=None):
+        self.report = report
+
+    def fallback_report(self, city):
+        return self.report
+
+
+def test_reply_degraded_prefers_the_stale_report():
+    sent = Sent()
+    report = WeatherReport(city='Madrid', temperature=20)
+    asyncio.run(reply_degraded(FakeBatcher(report), 'Madrid', 'imperial', sent.report, sent.text, 'caído'))
+    asyncio.run(reply_degraded(FakeBatcher(), 'Madrid', 'metric', sent.report, sent.text, 'caído'))
+    assert sent.items == [('report', 'Madrid', True, 'imperial'), ('text', 'caído')]
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from weatherkit.http import BackendResponse
+from weatherkit.resilience import CircuitBreaker, CircuitOpenError, ResilientBackend
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_released_probe_can_be_retried():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+class SlowClient:
+    """Cliente que no responde nunca (hasta que lo cancelan)"""
+
+    async def post(self, url, payload, timeout=None):
+        await asyncio.sleep(3600)
+
+
+class FailingClient:
+    def __init__(self, status=None):
+        self.status = status
+
+    async def post(self, url, payload, timeout=None):
+        if self.status is None:
+            raise ConnectionError('caído')
+        return BackendResponse(self.status, b'{}')
+
+
+def test_cancelled_requests_do_not_open_the_circuit():
+    backend = ResilientBackend(SlowClient(), hedge=False)
+
+    async def scenario():
+        for _ in range(10):
+            task = asyncio.create_task(backend.post('http://api/weather', {}))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(scenario())
+    breaker = backend.breakers['http://api/weather']
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_cancelled_probe_releases_half_open():
+    backend = ResilientBackend(SlowClient(), hedge=False)
+
+    async def scenario():
+        breaker = backend._endpoint('http://api/weather')[0]
+        breaker.failure_threshold = 1
+        breaker.reset_timeout = 0
+        breaker.record_failure()
+        task = asyncio.create_task(backend.post('http://api/weather', {}))
+        await asyncio.sleep(0)
+        assert breaker._probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return breaker
+
+    breaker = asyncio.run(scenario())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_errors_and_5xx_count_as_failures():
+    async def scenario(client):
+        backend = ResilientBackend(client, hedge=False)
+        backend._endpoint('http://api/weather')[0].failure_threshold = 2
+        for _ in range(2):
+            try:
+                await backend.post('http://api/weather', {})
+            except ConnectionError:
+                pass
+        with pytest.raises(CircuitOpenError):
+            await backend.post('http://api/weather', {})
+        return backend
+
+    assert asyncio.run(scenario(FailingClient())).short_circuited == 1
+    assert asyncio.run(scenario(FailingClient(503))).short_circuited == 1
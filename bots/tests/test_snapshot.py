@@ -0,0 +1,82 @@
+import asyncio
+
+from weatherkit.cache import WeatherCache
+from weatherkit.gazetteer import Gazetteer
+from weatherkit.http import BackendResponse
+from weatherkit.model import WeatherReport
+from weatherkit.snapshot import CacheSnapshot
+
+
+def test_cache_and_resolutions_round_trip(tmp_path):
+    path = str(tmp_path / 'cache.snapshot')
+
+    async def scenario():
+        cache = WeatherCache()
+        gazetteer = Gazetteer()
+        cache.set('madrid', BackendResponse(200, None, WeatherReport(
+            city='Madrid', country='ES', temperature=21.5, humidity=40, description='despejado'
+        )))
+        cache.set('atlantis', BackendResponse(404, b'{}'))
+        gazetteer.resolve('caba')
+        gazetteer.resolve('Malta')
+        saved = await CacheSnapshot(cache, gazetteer, path, interval=0).save()
+
+        restored_cache = WeatherCache()
+        restored_gazetteer = Gazetteer()
+        snapshot = CacheSnapshot(restored_cache, restored_gazetteer, path, interval=0)
+        await snapshot.start()
+        loaded = snapshot.loaded
+        madrid = restored_cache.peek('Madrid')
+        atlantis = restored_cache.peek('atlantis')
+        await snapshot.stop()
+        return saved, loaded, madrid, atlantis, restored_gazetteer
+
+    saved, loaded, madrid, atlantis, gazetteer = asyncio.run(scenario())
+    assert saved == 2
+    assert loaded == 2
+    assert madrid.status == 200
+    assert madrid.report().to_dict() == {
+        'city': 'Madrid', 'country': 'ES', 'temperature': 21.5, 'humidity': 40,
+        'description': 'despejado',
+    }
+    assert atlantis.status == 404
+    # Las resoluciones guardadas se usan sin cargar el índice de ciudades
+    assert gazetteer.resolve('caba').city == 'Buenos Aires'
+    assert gazetteer.resolve('Malta').suggestions[0] == 'Salta'
+    assert gazetteer._exact is None
+
+
+def test_newer_value_replaces_the_snapshot(tmp_path):
+    path = str(tmp_path / 'cache.snapshot')
+
+    async def scenario():
+        cache = WeatherCache()
+        cache.set('madrid', BackendResponse(200, None, WeatherReport(city='Madrid', temperature=10)))
+        await CacheSnapshot(cache, path=path, interval=0).save()
+
+        restored = WeatherCache()
+        snapshot = CacheSnapshot(restored, path=path, interval=0)
+        await snapshot.start()
+        restored.set('madrid', BackendResponse(200, None, WeatherReport(city='Madrid', temperature=30)))
+        await snapshot.stop()
+
+        again = WeatherCache()
+        await CacheSnapshot(again, path=path, interval=0).start()
+        return again.peek('madrid')
+
+    assert asyncio.run(scenario()).report().temperature == 30
+
+
+def test_missing_or_corrupt_snapshot_is_ignored(tmp_path):
+    path = tmp_path / 'cache.snapshot'
+
+    async def scenario():
+        cache = WeatherCache()
+        await CacheSnapshot(cache, path=str(path), interval=0).start()
+        path.write_bytes(b'basura\n')
+        await CacheSnapshot(cache, path=str(path), interval=0).start()
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache.backing is None
+    assert len(cache) == 0
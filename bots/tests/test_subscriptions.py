@@ -0,0 +1,104 @@
+import asyncio
+
+from weatherkit.subscriptions import (
+    DailyTimerWheel, SubscriptionScheduler, SubscriptionStore, format_time, parse_time,
+)
+
+
+def test_wheel_groups_chats_by_city():
+    wheel = DailyTimerWheel()
+    wheel.add(1, 'Madrid', 480)
+    wheel.add(2, 'Madrid', 480)
+    wheel.add(2, 'Paris', 480)
+    wheel.add(3, 'Madrid', 481)
+
+    due = dict(wheel.due(480))
+    assert sorted(due['Madrid']) == [1, 2]
+    assert due['Paris'] == [2]
+    assert wheel.due(481) == [('Madrid', [3])]
+    assert wheel.due(479) == []
+    assert len(wheel) == 4
+
+
+def test_wheel_moves_and_removes():
+    wheel = DailyTimerWheel()
+    wheel.add(1, 'Madrid', 480)
+    wheel.add(1, 'Madrid', 1200)
+    assert wheel.due(480) == []
+    assert wheel.due(1200) == [('Madrid', [1])]
+    assert wheel.of_chat(1) == {'Madrid': 1200}
+
+    assert wheel.remove(1, 'Madrid')
+    assert not wheel.remove(1, 'Madrid')
+    assert wheel.due(1200) == []
+    assert wheel.of_chat(1) == {}
+    assert len(wheel) == 0
+
+
+def test_parse_and_format_time():
+    assert parse_time('07:05') == 425
+    assert parse_time('24:00') is None
+    assert format_time(425) == '07:05'
+
+
+def test_tick_fetches_once_per_city(tmp_path):
+    fetched = []
+    sent = []
+
+    async def fetch(city):
+        fetched.append(city)
+        return city
+
+    async def send(chat_id, text):
+        sent.append((chat_id, text))
+
+    async def scenario():
+        store = SubscriptionStore(str(tmp_path / 'subscriptions.db'))
+        scheduler = SubscriptionScheduler(store, fetch, lambda forecast: f"pronóstico {forecast}",
+                                          send, tz='Europe/Madrid', send_rate=1000)
+        for chat_id in (1, 2, 3):
+            await scheduler.subscribe(chat_id, 'Madrid', 480)
+        await scheduler.subscribe(4, 'Paris', 480)
+        await scheduler.subscribe(5, 'Paris', 481)
+        await scheduler._tick(480)
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert sorted(fetched) == ['Madrid', 'Paris']
+    assert sorted(sent) == [
+        (1, 'pronóstico Madrid'), (2, 'pronóstico Madrid'),
+        (3, 'pronóstico Madrid'), (4, 'pronóstico Paris'),
+    ]
+    assert stats['delivered'] == 4
+    assert stats['failed'] == 0
+
+
+def test_subscriptions_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'subscriptions.db')
+
+    async def noop(*args):
+        return None
+
+    async def scenario():
+        scheduler = SubscriptionScheduler(SubscriptionStore(path), noop, str, noop)
+        await scheduler.subscribe(1, 'Madrid', 480)
+        await scheduler.subscribe(2, 'Paris', 600)
+        await scheduler.unsubscribe(2)
+        await scheduler.stop()
+
+        restarted = SubscriptionScheduler(SubscriptionStore(path), noop, str, noop)
+        await restarted.reload()
+        wheel = restarted.wheel
+        await restarted.stop()
+        return wheel
+
+    wheel = asyncio.run(scenario())
+    assert wheel.due(480) == [('Madrid', [1])]
+    assert len(wheel) == 1
+
+
+def test_minute_now_uses_the_configured_zone():
+    scheduler = SubscriptionScheduler(None, None, None, None, tz='America/Argentina/Buenos_Aires')
+    assert 0 <= scheduler.minute_now() < 24 * 60
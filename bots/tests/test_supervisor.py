@@ -0,0 +1,52 @@
+from supervisor import HashRing
+
+KEYS = [f"{i}@c.us" for i in range(5000)]
+
+
+def owners(ring):
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().owner('1@c.us') is None
+
+
+def test_owner_is_deterministic():
+    first = owners(HashRing(['a', 'b', 'c']))
+    assert owners(HashRing(['c', 'b', 'a'])) == first
+    assert set(first.values()) == {'a', 'b', 'c'}
+
+
+def test_scale_up_only_moves_keys_to_the_new_node():
+    ring = HashRing(['a', 'b', 'c'])
+    before = owners(ring)
+    ring.add('d')
+    after = owners(ring)
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 'd' for key in moved)
+    # Se mueve ~1/4 de las claves; con 64 réplicas la dispersión es chica
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_scale_down_only_moves_keys_of_the_removed_node():
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    before = owners(ring)
+    ring.remove('b')
+    after = owners(ring)
+
+    for key in KEYS:
+        if before[key] != 'b':
+            assert after[key] == before[key]
+        else:
+            assert after[key] in {'a', 'c', 'd'}
+
+
+def test_add_and_remove_are_idempotent():
+    ring = HashRing(['a', 'b'])
+    before = owners(ring)
+    ring.add('a')
+    ring.remove('z')
+    ring.add('c')
+    ring.remove('c')
+    assert owners(ring) == before
@@ -0,0 +1,98 @@
+import asyncio
+
+import weatherkit.warmup as warmup
+from weatherkit.cache import WeatherCache
+from weatherkit.gazetteer import Resolution
+from weatherkit.http import BackendResponse
+from weatherkit.model import WeatherReport
+from weatherkit.warmup import boot_warm_up, merge_hot_cities, read_hot_cities, save_hot_cities
+
+
+class FakeProfiles:
+    def __init__(self, popular):
+        self._popular = popular
+
+    def popular(self, limit):
+        return self._popular[:limit]
+
+
+def ok(city):
+    return BackendResponse(200, None, WeatherReport(city=city, temperature=20))
+
+
+def test_merge_keeps_the_first_ranking_first():
+    assert merge_hot_cities(['Madrid', 'Paris'], ['paris', 'lima'], limit=3) == ['Madrid', 'Paris', 'lima']
+
+
+def test_hot_cities_round_trip(tmp_path):
+    path = str(tmp_path / 'state' / 'warmup.json')
+    cache = WeatherCache()
+    cache.set('lima', ok('Lima'))
+    cache.set('atlantis', BackendResponse(404, b'{}'))
+
+    asyncio.run(save_hot_cities(FakeProfiles(['Madrid']), cache, path, limit=5))
+    assert read_hot_cities(path, limit=5) == ['Madrid', 'lima']
+
+
+def test_save_is_skipped_without_a_path(tmp_path):
+    asyncio.run(save_hot_cities(FakeProfiles(['Madrid']), WeatherCache(), None))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path):
+    path = tmp_path / 'warmup.json'
+    path.write_text('{roto')
+    assert read_hot_cities(str(path)) == []
+
+
+class FakeBackend:
+    def __init__(self):
+        self.warmed = []
+
+    async def warm_up(self, url):
+        self.warmed.append(url)
+        return True
+
+
+class FakeSnapshot:
+    started = False
+
+    async def start(self):
+        self.started = True
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.fetched = []
+
+    async def fetch_many(self, cities, payload):
+        self.fetched.extend(cities)
+        return [ok(city) for city in cities]
+
+
+class FakeGazetteer:
+    def __len__(self):
+        return 0
+
+    def resolve(self, text):
+        return Resolution(text, text, 'exact')
+
+
+def test_boot_without_hot_cities_only_opens_the_connection(monkeypatch):
+    monkeypatch.setattr(warmup, 'read_hot_cities', lambda: [])
+    backend, snapshot, batcher = FakeBackend(), FakeSnapshot(), FakeBatcher()
+    loaded = asyncio.run(boot_warm_up(backend, snapshot, batcher, FakeGazetteer(), 'http://api', 'telegram'))
+    assert loaded == 0
+    assert snapshot.started
+    assert backend.warmed == ['http://api']
+    assert batcher.fetched == []
+
+
+def test_boot_prewarms_the_hot_cities(monkeypatch):
+    monkeypatch.setattr(warmup, 'read_hot_cities', lambda: ['Madrid', 'Lima'])
+    backend, batcher = FakeBackend(), FakeBatcher()
+    loaded = asyncio.run(boot_warm_up(backend, FakeSnapshot(), batcher, FakeGazetteer(), 'http://api', 'whatsapp'))
+    assert loaded == 2
+    assert batcher.fetched == ['Madrid', 'Lima']
+    # Los requests del precalentamiento ya abren la conexión
+    assert backend.warmed == []
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno de la bandeja de entrada persistente
+WHATSAPP_SESSION_PATH = os.getenv('WHATSAPP_SESSION_PATH', 'session')
+INBOX_PATH = os.getenv('WHATSAPP_INBOX_PATH', os.path.join(WHATSAPP_SESSION_PATH, 'inbox.db'))
+# Intentos (arranques que la encontraron pendiente) antes de descartar una notificación
+INBOX_MAX_ATTEMPTS = int(os.getenv('WHATSAPP_INBOX_MAX_ATTEMPTS', '3'))
+# Cuánto recordar las ya procesadas para descartar reentregas de Green API
+INBOX_RETENTION = float(os.getenv('WHATSAPP_INBOX_RETENTION', '86400'))
+INBOX_PRUNE_INTERVAL = float(os.getenv('WHATSAPP_INBOX_PRUNE_INTERVAL', '600'))
+
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS inbox ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+    ' key TEXT NOT NULL UNIQUE,'
+    ' receipt_id INTEGER,'
+    ' body TEXT NOT NULL,'
+    ' state INTEGER NOT NULL DEFAULT 0,'
+    ' attempts INTEGER NOT NULL DEFAULT 0,'
+    ' received REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS inbox_state ON inbox (state, id)',
+)
+
+
+def idempotency_key(notification: dict) -> str:
+    """Clave de una notificación: idMessage si lo trae, si no el receiptId"""
+    body = notification.get('body') or {}
+    message_id = body.get('idMessage')
+    if message_id:
+        return f"message:{message_id}"
+    return f"receipt:{notification.get('receiptId')}"
+
+
+class DurableInbox:
+    """Bandeja de entrada en SQLite (WAL) con commit agrupado.
+
+    Cada notificación se guarda antes de confirmarla a Green API y se marca
+    como procesada al terminar; lo que quedó pendiente tras una caída se
+    vuelve a procesar al arrancar (at-least-once). La clave única
+    (idMessage / receiptId) descarta las reentregas.
+
+    Las escrituras que llegan mientras hay un commit en curso se juntan en
+    la transacción siguiente, así el costo de fsync se reparte entre todas.
+    Con synchronous=NORMAL lo confirmado sobrevive a una caída del proceso
+    (no necesariamente a un corte de luz).
+    """
+
+    def __init__(self, path: str = INBOX_PATH):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inbox')
+        self._db = None
+        self._ops = []
+        self._flushing = None
+        self._last_prune = 0.0
+        self.stored = 0
+        self.completed = 0
+        self.commits = 0
+
+    def stats(self) -> dict:
+        return {
+            'stored': self.stored,
+            'completed': self.completed,
+            'commits': self.commits,
+            'pending_writes': len(self._ops),
+        }
+
+    def _connect(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+        return self._db
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def put(self, notification: dict):
+        """Guardar la notificación; devuelve su id o None si ya la teníamos"""
+        rowcount, row_id = await self._write(
+            'INSERT OR IGNORE INTO inbox (key, receipt_id, body, received) VALUES (?, ?, ?, ?)',
+            (idempotency_key(notification), notification.get('receiptId'),
+             json.dumps(notification), time.time())
+        )
+        if not rowcount:
+            return None
+        self.stored += 1
+        return row_id
+
+    async def complete(self, row_id: int) -> None:
+        """Marcar una notificación como procesada"""
+        await self._write('UPDATE inbox SET state = ? WHERE id = ?', (DONE, row_id))
+        self.completed += 1
+
+    async def pending(self) -> list:
+        """(id, notificación) pendientes de una ejecución anterior, en orden de llegada"""
+        return await self._call(self._replay)
+
+    def _replay(self) -> list:
+        db = self._connect()
+        with db:
+            db.execute('UPDATE inbox SET attempts = attempts + 1 WHERE state = ?', (PENDING,))
+            failed = db.execute(
+                'UPDATE inbox SET state = ? WHERE state = ? AND attempts > ?',
+                (FAILED, PENDING, INBOX_MAX_ATTEMPTS)
+            ).rowcount
+        if failed:
+            logger.error("Se descartan %d notificaciones que fallaron %d veces", failed, INBOX_MAX_ATTEMPTS)
+        rows = db.execute('SELECT id, body FROM inbox WHERE state = ? ORDER BY id', (PENDING,)).fetchall()
+        return [(row_id, json.loads(body)) for row_id, body in rows]
+
+    async def _write(self, sql: str, params: tuple):
+        future = asyncio.get_running_loop().create_future()
+        self._ops.append((sql, params, future))
+        if self._flushing is None:
+            self._flushing = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        try:
+            while self._ops:
+                ops, self._ops = self._ops, []
+                prune = time.monotonic() - self._last_prune >= INBOX_PRUNE_INTERVAL
+                if prune:
+                    self._last_prune = time.monotonic()
+                try:
+                    results = await self._call(self._apply, [(sql, params) for sql, params, _ in ops], prune)
+                except Exception as e:
+                    for _, _, future in ops:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.commits += 1
+                for (_, _, future), result in zip(ops, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._flushing = None
+
+    def _apply(self, ops: list, prune: bool) -> list:
+        """Aplicar un grupo de escrituras en una sola transacción"""
+        db = self._connect()
+        results = []
+        with db:
+            for sql, params in ops:
+                cursor = db.execute(sql, params)
+                results.append((cursor.rowcount, cursor.lastrowid))
+            if prune:
+                db.execute(
+                    'DELETE FROM inbox WHERE state != ? AND received < ?',
+                    (PENDING, time.time() - INBOX_RETENTION)
+                )
+        return results
+
+    async def close(self) -> None:
+        if self._flushing is not None:
+            await asyncio.shield(self._flushing)
+        await self._call(self._close)
+        self.executor.shutdown(wait=False)
+
+    def _close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,17 +1,38 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import signal
 import asyncio
 import aiohttp
 import logging
-import json
-from whatsapp_api_client_python import API
-
-# Configuración de logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+import functools
+from collections import OrderedDict
+
+# En local (fuera de Docker) el paquete compartido vive en ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+
+from weatherkit.http import BackendClient
+from weatherkit.cache import WeatherCache
+from weatherkit.model import WeatherReport, ReportError
+from weatherkit.gazetteer import Gazetteer
+from weatherkit.batch import WeatherBatcher, resolve_many, API_BATCH_ENDPOINT
+from weatherkit.subscriptions import (
+    SubscriptionScheduler, SubscriptionStore, ForecastSource, split_subscription, format_time
 )
+from weatherkit.resilience import ResilientBackend, CircuitOpenError
+from weatherkit import render
+from weatherkit.metrics import BotMetrics, MetricsServer, mark_message_start
+from weatherkit.diagnostics import LoopDiagnostics
+from weatherkit.snapshot import CacheSnapshot, CACHE_SNAPSHOT_PATH
+from weatherkit.profiles import UserProfiles, ProfileStore, PROFILES_PATH, parse_units, IMPERIAL
+from weatherkit.warmup import boot_warm_up, save_hot_cities, WARMUP_SNAPSHOT_PATH
+from weatherkit.replies import did_you_mean, reply_from_cache, reply_degraded
+from polling import NotificationPoller
+from inbox import DurableInbox
+from outbound import OutboundDispatcher
+from supervisor import Supervisor, WorkerLink, HashRing, WHATSAPP_WORKERS, WORKER_NAME, worker_command
+
 logger = logging.getLogger(__name__)
 
 # Variables de entorno
@@ -19,46 +40,157 @@ API_BASE_URL = os.getenv('API_BASE_URL', 'https://api.tudominio.com')  # Tu API
 API_ENDPOINT = os.getenv('API_WHATSAPP_ENDPOINT', '/api/weather/whatsapp')
 GREEN_API_INSTANCE_ID = os.getenv('GREEN_API_INSTANCE_ID')
 GREEN_API_TOKEN = os.getenv('GREEN_API_TOKEN')
+GREEN_API_HOST = os.getenv('GREEN_API_HOST', 'https://api.green-api.com')
+# Varias instancias en un mismo despliegue: "id:token,id:token" (reemplaza a las dos anteriores)
+GREEN_API_INSTANCES = [
+    tuple(item.strip().split(':', 1)) for item in os.getenv('GREEN_API_INSTANCES', '').split(',') if ':' in item
+] or ([(GREEN_API_INSTANCE_ID, GREEN_API_TOKEN)] if GREEN_API_INSTANCE_ID and GREEN_API_TOKEN else [])
+
+# Chats recientes de los que se recuerda por qué instancia escribieron
+CHAT_INSTANCES_MAX = int(os.getenv('WHATSAPP_CHAT_INSTANCES_MAX', '10000'))
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+# Palabras clave de las suscripciones diarias
+SUBSCRIBE_KEYWORDS = ('suscribir', 'subscribe', '/subscribe')
+UNSUBSCRIBE_KEYWORDS = ('desuscribir', 'unsubscribe', '/unsubscribe')
+PROFILE_KEYWORDS = ('yo', 'perfil', '/me')
+UNITS_KEYWORDS = ('unidades', 'units', '/unidades', '/units')
+
+
+def configure_logging():
+    """Configuración de logging (al ejecutar, no al importar el módulo)"""
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=LOG_LEVEL
+    )
+
+
+def connect_instance(instance_id: str, token: str):
+    """Cliente de Green API y estado de la instancia (bloqueante: correr en un hilo)"""
+    # El SDK arrastra requests: se importa recién al conectar, fuera del event loop
+    from whatsapp_api_client_python import API
+    greenapi = API.GreenApi(instance_id, token, host=GREEN_API_HOST)
+    return greenapi, greenapi.account.getStateInstance().data
+
 
 class WhatsAppWeatherBot:
     def __init__(self):
         self.api_url = f"{API_BASE_URL}{API_ENDPOINT}"
         self.greenapi = None
-        logger.info(f"Bot configurado para usar: {self.api_url}")
+        self.outbound = None
+        # Con varias instancias: un cliente y un dispatcher por instancia, y
+        # cada chat se responde por la instancia en la que escribió
+        self.greenapis = {}
+        self.outbounds = {}
+        # LRU acotado: un chat olvidado se responde por la instancia principal
+        self.chat_instances = OrderedDict()
+        self.metrics = BotMetrics('whatsapp')
+        self.backend = BackendClient(metrics=self.metrics)
+        self.resilient = ResilientBackend(self.backend)
+        self.cache = WeatherCache()
+        self.gazetteer = Gazetteer()
+        self.batcher = WeatherBatcher(
+            self.cache, self.resilient, self.api_url, f"{API_BASE_URL}{API_BATCH_ENDPOINT}"
+        )
+        self.metrics.track_stats('cache', self.cache.stats)
+        # Cache y resoluciones de antes del último reinicio (se guardan cada tanto)
+        self.cache_snapshot = CacheSnapshot(self.cache, self.gazetteer)
+        self.metrics.track_stats('snapshot', self.cache_snapshot.stats)
+        # Perfiles por número de teléfono (los workers comparten el SQLite)
+        self.profiles = UserProfiles(ProfileStore() if PROFILES_PATH else None)
+        self.metrics.track_stats('profiles', self.profiles.stats)
+        self.metrics.track_stats('backend', self.resilient.stats)
+        self.scheduler = SubscriptionScheduler(
+            SubscriptionStore(), ForecastSource(self.resilient, API_BASE_URL),
+            render.WHATSAPP_FORECAST.render, self.send_message
+        )
+        self.metrics.track_stats('batch', self.batcher.stats)
+        self.metrics.track_stats('subscriptions', self.scheduler.stats)
+        for instance_id, _ in GREEN_API_INSTANCES:
+            # El cliente de la instancia recién existe tras initialize_api()
+            outbound = OutboundDispatcher(functools.partial(self._send_via, instance_id), metrics=self.metrics)
+            suffix = f'_{instance_id}' if len(GREEN_API_INSTANCES) > 1 else ''
+            self.metrics.track_queue(f'outbound{suffix}', lambda outbound=outbound: outbound.queue_depth)
+            self.metrics.track_stats(f'outbound{suffix}', outbound.stats)
+            self.outbounds[instance_id] = outbound
+        self.outbound = next(iter(self.outbounds.values()), None)
+        # Dónde guardar las ciudades más consultadas al apagar (None: no guardar)
+        self.snapshot_path = WARMUP_SNAPSHOT_PATH
+        logger.info("Bot configurado para usar: %s", self.api_url)
+
+    def _send_via(self, instance_id: str, chat_id: str, message: str):
+        return self.greenapis[instance_id].sending.sendMessage(chat_id, message)
 
     async def initialize_api(self):
         """Inicializar conexión con WhatsApp mediante Green API"""
         try:
-            if not GREEN_API_INSTANCE_ID or not GREEN_API_TOKEN:
-                logger.error("GREEN_API_INSTANCE_ID y GREEN_API_TOKEN deben estar configurados")
+            if not GREEN_API_INSTANCES:
+                logger.error("GREEN_API_INSTANCE_ID y GREEN_API_TOKEN (o GREEN_API_INSTANCES) deben estar configurados")
                 return False
 
             logger.info("Inicializando conexión con Green API...")
 
-            # Inicializar Green API
-            self.greenapi = API.GreenApi(GREEN_API_INSTANCE_ID, GREEN_API_TOKEN)
-
-            # Verificar estado de la cuenta
-            result = self.greenapi.account.getStateInstance()
-            logger.info(f"Estado de la instancia: {result.data}")
-
-            if result.data.get('stateInstance') == 'authorized':
-                logger.info("✅ Conexión con WhatsApp establecida y autorizada")
-                return True
-            else:
-                logger.warning("⚠️ Instancia no autorizada. Necesitas escanear el código QR")
-                return False
+            # Verificar el estado de todas las instancias a la vez, cada una en un hilo
+            connected = await asyncio.gather(*(
+                asyncio.to_thread(connect_instance, instance_id, token)
+                for instance_id, token in GREEN_API_INSTANCES
+            ))
+            for (instance_id, _), (greenapi, state) in zip(GREEN_API_INSTANCES, connected):
+                self.greenapis[instance_id] = greenapi
+                logger.info("Estado de la instancia %s: %s", instance_id, state)
+
+                if (state or {}).get('stateInstance') != 'authorized':
+                    logger.warning("⚠️ Instancia %s no autorizada. Necesitas escanear el código QR", instance_id)
+                    return False
+
+            # La primera instancia atiende los envíos sin instancia conocida
+            self.greenapi = next(iter(self.greenapis.values()))
+            logger.info("✅ Conexión con WhatsApp establecida y autorizada")
+            return True
 
         except Exception as e:
-            logger.error(f"❌ Error al inicializar Green API: {e}")
+            logger.error("❌ Error al inicializar Green API: %s", e)
             return False
 
     async def process_weather_request(self, chat_id: str, phone_number: str, city: str):
         """Procesar solicitud de clima enviándola a TU API"""
+        profile = await self.profiles.get(phone_number)
+
+        # "?" repite la ciudad de siempre: si está vigente en cache, respuesta inmediata
+        if city.strip() == '?':
+            city = profile.favorite
+            if city is None:
+                await self.send_message(
+                    chat_id,
+                    "🤔 Todavía no consultaste ninguna ciudad.\n\n"
+                    "Escribe una (ej: *Buenos Aires*) o elígela con *yo <ciudad>*"
+                )
+                return
+            if await reply_from_cache(self.cache, self.profiles, profile, city,
+                                      functools.partial(self.send_weather_response, chat_id)):
+                return
+
+        # Varias ciudades en un mismo mensaje ("Madrid, London y Paris")
+        cities = self.gazetteer.split_cities(city)
+        if len(cities) > 1:
+            await self.process_multi_city(chat_id, phone_number, cities, profile)
+            return
+
         try:
+            # Canonicalizar la ciudad localmente (alias, acentos, errores de tipeo)
+            resolution = self.gazetteer.resolve(city)
+            if resolution.kind == 'invalid':
+                await self.send_message(
+                    chat_id,
+                    "🤔 Eso no parece el nombre de una ciudad.\n\n"
+                    "Ejemplo: *Buenos Aires* o *Madrid*"
+                )
+                return
+
             # Preparar datos para TU API
             payload = {
-                'city': city.strip(),
+                'city': resolution.lookup,
                 'user_id': phone_number,
                 'username': phone_number,
                 'platform': 'whatsapp',
@@ -66,104 +198,233 @@ class WhatsAppWeatherBot:
                 'chat_id': chat_id
             }
 
-            logger.info(f"Enviando solicitud a tu API: {self.api_url}")
-            logger.info(f"Datos: {payload}")
+            logger.debug("Enviando solicitud a tu API: %s %s", self.api_url, payload)
 
             # Hacer petición a TU API de Symfony (no directamente a OpenWeather)
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    json=payload,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-
-                    logger.info(f"Respuesta de tu API: Status {response.status}")
-
-                    if response.status == 200:
-                        data = await response.json()
-                        await self.send_weather_response(chat_id, data)
-
-                    elif response.status == 404:
-                        await self.send_message(
-                            chat_id,
-                            f"❌ No pude encontrar información del clima para '{city}'.\n\n"
-                            "Por favor, verifica que el nombre de la ciudad sea correcto.\n\n"
-                            "Ejemplo: *Buenos Aires* o *Madrid*"
-                        )
-
-                    elif response.status == 500:
-                        error_data = await response.json()
-                        error_msg = error_data.get('message', 'Error interno del servidor')
-                        await self.send_message(
-                            chat_id,
-                            f"⚠️ *Error del servidor:* {error_msg}\n\n"
-                            "Por favor, intenta nuevamente en unos momentos."
-                        )
-
-                    else:
-                        await self.send_message(
-                            chat_id,
-                            "❌ Ocurrió un error inesperado.\n\n"
-                            "Por favor, intenta nuevamente."
-                        )
+            # Pedidos por la misma ciudad comparten cache y request en vuelo;
+            # la consulta es idempotente, así que admite un request de cobertura
+            response = await self.cache.get_or_load(
+                payload['city'], lambda: self.resilient.post(self.api_url, payload, hedge=True)
+            )
+
+            logger.debug("Respuesta de tu API: Status %s", response.status)
+
+            if response.status == 200:
+                report = response.report()
+                self.profiles.record(profile, resolution.lookup)
+                await self.send_weather_response(chat_id, report, units=profile.units)
+
+            elif response.status == 404:
+                suggestion = (
+                    f"¿Quisiste decir: *{', '.join(resolution.suggestions)}*?"
+                    if resolution.suggestions else "Ejemplo: *Buenos Aires* o *Madrid*"
+                )
+                await self.send_message(
+                    chat_id,
+                    f"❌ No pude encontrar información del clima para '{city.strip()}'.\n\n"
+                    "Por favor, verifica que el nombre de la ciudad sea correcto.\n\n"
+                    f"{suggestion}"
+                )
+
+            elif response.status == 500:
+                # Un 500 puede venir en HTML: no asumir que es JSON
+                error_data = response.safe_json({})
+                error_msg = (error_data.get('message') if isinstance(error_data, dict) else None) \
+                    or 'Error interno del servidor'
+                await self.send_message(
+                    chat_id,
+                    f"⚠️ *Error del servidor:* {error_msg}\n\n"
+                    "Por favor, intenta nuevamente en unos momentos."
+                )
+
+            else:
+                await self.send_message(
+                    chat_id,
+                    "❌ Ocurrió un error inesperado.\n\n"
+                    "Por favor, intenta nuevamente."
+                )
+
+        except CircuitOpenError:
+            logger.warning("Circuito abierto para %s: respuesta degradada", self.api_url)
+            await self.send_degraded(
+                chat_id, resolution.lookup, profile.units,
+                "❌ El servicio del clima no está disponible en este momento.\n\n"
+                "Por favor, intenta nuevamente más tarde."
+            )
 
         except asyncio.TimeoutError:
             logger.error("Timeout al conectar con tu API")
-            await self.send_message(
-                chat_id,
+            await self.send_degraded(
+                chat_id, resolution.lookup, profile.units,
                 "⏰ *Timeout* - La consulta tardó demasiado.\n\n"
                 "Por favor, intenta nuevamente."
             )
 
         except aiohttp.ClientError as e:
-            logger.error(f"Error de conexión con tu API: {e}")
-            await self.send_message(
-                chat_id,
+            logger.error("Error de conexión con tu API: %s", e)
+            await self.send_degraded(
+                chat_id, resolution.lookup, profile.units,
                 "❌ *Error de conexión* con el servidor de clima.\n\n"
                 "Por favor, verifica tu conexión e intenta nuevamente."
             )
 
+        except ReportError as e:
+            logger.error("Respuesta inválida de tu API: %s", e)
+            await self.send_degraded(
+                chat_id, resolution.lookup, profile.units,
+                "⚠️ El servidor de clima respondió datos inválidos.\n\n"
+                "Por favor, intenta nuevamente en unos momentos."
+            )
+
         except Exception as e:
-            logger.error(f"Error inesperado: {e}")
+            logger.error("Error inesperado: %s", e)
             await self.send_message(
                 chat_id,
                 "❌ Ocurrió un error inesperado.\n\n"
                 "Por favor, intenta nuevamente."
             )
 
-    async def send_weather_response(self, chat_id: str, data: dict):
-        """Enviar respuesta formateada del clima basada en la respuesta de TU API"""
+    async def process_multi_city(self, chat_id: str, phone_number: str, cities: list, profile):
+        """Consultar varias ciudades a la vez y responder con un único mensaje"""
+        resolutions, omitted = resolve_many(self.gazetteer, cities)
+        if not resolutions:
+            await self.send_message(
+                chat_id,
+                "🤔 Eso no parece el nombre de una ciudad.\n\n"
+                "Ejemplo: *Buenos Aires* o *Madrid*"
+            )
+            return
+
         try:
-            city = data.get('city', 'Ciudad desconocida')
-            country = data.get('country', '')
-            temp = data.get('temperature', 'N/A')
-            feels_like = data.get('feels_like', 'N/A')
-            description = data.get('description', 'Sin descripción')
-            humidity = data.get('humidity', 'N/A')
-            pressure = data.get('pressure', 'N/A')
-            wind_speed = data.get('wind_speed', 'N/A')
-
-            # Determinar emoji según el clima
-            weather_emoji = self.get_weather_emoji(description)
-
-            message = (
-                f"{weather_emoji} *Clima en {city}*"
-                f"{f', {country}' if country else ''}\n\n"
-                f"🌡️ *Temperatura:* {temp}°C\n"
-                f"🤗 *Sensación térmica:* {feels_like}°C\n"
-                f"📝 *Descripción:* {description.capitalize()}\n"
-                f"💧 *Humedad:* {humidity}%\n"
-                f"🔽 *Presión:* {pressure} hPa\n"
-                f"💨 *Viento:* {wind_speed} m/s\n\n"
-                f"📅 _Actualizado ahora_\n\n"
-                f"💡 Envía el nombre de otra ciudad para más información"
+            payload = {
+                'user_id': phone_number,
+                'username': phone_number,
+                'platform': 'whatsapp',
+                'phone_number': phone_number,
+                'chat_id': chat_id
+            }
+            # Un solo round-trip (endpoint batch) o consultas en paralelo acotadas;
+            # cada ciudad falla por separado sin arrastrar al resto
+            results = await self.batcher.lookup_many(resolutions, payload)
+            for result in results:
+                if result.state == 'ok':
+                    self.profiles.record(profile, result.resolution.lookup)
+            await self.send_message(chat_id, render.WHATSAPP_SUMMARY.render(results, omitted, profile.units))
+        except Exception as e:
+            logger.error("Error inesperado en consulta múltiple: %s", e)
+            await self.send_message(
+                chat_id,
+                "❌ Ocurrió un error inesperado.\n\n"
+                "Por favor, intenta nuevamente."
+            )
+
+    async def process_subscribe(self, chat_id: str, args: list):
+        """Palabra clave: suscribir <ciudad> <HH:MM>"""
+        city, minute = split_subscription(args)
+        if not city or minute is None:
+            current = self.scheduler.subscriptions(chat_id)
+            listing = ''.join(
+                f"• {name} - {format_time(at)}\n" for name, at in sorted(current.items())
+            )
+            await self.send_message(
+                chat_id,
+                "📬 *Uso:* suscribir <ciudad> <HH:MM>\n\n"
+                "Ejemplo: *suscribir Madrid 07:30*"
+                + (f"\n\n*Tus suscripciones:*\n{listing}" if listing else "")
+            )
+            return
+
+        resolution = self.gazetteer.resolve(city)
+        if resolution.kind == 'invalid':
+            await self.send_message(chat_id, f"🤔 '{city}' no parece el nombre de una ciudad.")
+            return
+
+        if not await self.scheduler.subscribe(chat_id, resolution.lookup, minute):
+            await self.send_message(
+                chat_id,
+                "⚠️ Llegaste al máximo de ciudades suscriptas.\n\n"
+                "Escribe *desuscribir <ciudad>* para liberar una."
+            )
+            return
+
+        await self.send_message(
+            chat_id,
+            f"✅ Todos los días a las *{format_time(minute)}* te enviaré el pronóstico de *{resolution.lookup}*.\n\n"
+            "Escribe *desuscribir* para dejar de recibirlo."
+            + did_you_mean(resolution, '*')
+        )
+
+    async def process_unsubscribe(self, chat_id: str, args: list):
+        """Palabra clave: desuscribir [ciudad]"""
+        city = ' '.join(args)
+        lookup = self.gazetteer.resolve(city).lookup if city else None
+        removed = await self.scheduler.unsubscribe(chat_id, lookup)
+        if removed:
+            await self.send_message(chat_id, f"🔕 Listo, ya no recibirás el pronóstico de *{', '.join(removed)}*.")
+        else:
+            await self.send_message(chat_id, "No tenías suscripciones activas con ese nombre.")
+
+    async def process_profile(self, chat_id: str, phone_number: str, args: list):
+        """Palabra clave: yo [ciudad] (ver el perfil o elegir la ciudad por defecto)"""
+        profile = await self.profiles.get(phone_number)
+        city = ' '.join(args)
+        if city:
+            resolution = self.gazetteer.resolve(city)
+            if resolution.kind == 'invalid':
+                await self.send_message(chat_id, f"🤔 '{city}' no parece el nombre de una ciudad.")
+                return
+            self.profiles.set_city(profile, resolution.lookup)
+            await self.send_message(
+                chat_id,
+                f"📍 Listo: *{resolution.lookup}* es tu ciudad. Envía *?* para ver su clima."
+                + did_you_mean(resolution, '*')
             )
+            return
+
+        if profile.city:
+            city = profile.city
+        elif profile.favorite:
+            city = f"{profile.favorite} (la última que consultaste)"
+        else:
+            city = "sin elegir"
+        await self.send_message(
+            chat_id,
+            "👤 *Tu perfil*\n\n"
+            f"📍 Ciudad: {city}\n"
+            f"🌡️ Unidades: {'°F, mph' if profile.units == IMPERIAL else '°C, m/s'}\n"
+            f"🕘 Últimas consultas: {', '.join(profile.history) or 'ninguna'}\n\n"
+            "*yo <ciudad>* cambia tu ciudad · *unidades c|f* las unidades"
+        )
+
+    async def process_units(self, chat_id: str, phone_number: str, args: list):
+        """Palabra clave: unidades c|f"""
+        units = parse_units(' '.join(args))
+        if units is None:
+            await self.send_message(chat_id, "🌡️ Uso: *unidades c* (Celsius) o *unidades f* (Fahrenheit)")
+            return
+        self.profiles.set_units(await self.profiles.get(phone_number), units)
+        await self.send_message(
+            chat_id, "✅ Te mostraré el clima en " + ("°F y mph." if units == IMPERIAL else "°C y m/s.")
+        )
+
+    async def send_degraded(self, chat_id: str, city: str, units: str, message: str):
+        """Responder con el último dato cacheado (aunque esté vencido) o con `message`"""
+        await reply_degraded(
+            self.batcher, city, units, functools.partial(self.send_weather_response, chat_id),
+            functools.partial(self.send_message, chat_id), message
+        )
+
+    async def send_weather_response(self, chat_id: str, report: WeatherReport, stale: bool = False,
+                                    units: str = 'metric'):
+        """Enviar respuesta formateada del clima basada en la respuesta de TU API"""
+        try:
+            # Plantilla precompilada compartida con el bot de Telegram
+            message = render.WHATSAPP.render(report, stale, units)
 
             await self.send_message(chat_id, message)
 
         except Exception as e:
-            logger.error(f"Error al formatear respuesta: {e}")
+            logger.error("Error al formatear respuesta: %s", e)
             await self.send_message(
                 chat_id,
                 "✅ Información del clima recibida, pero hubo un error al formatearla."
@@ -180,7 +441,8 @@ class WhatsAppWeatherBot:
             "• Buenos Aires\n"
             "• Madrid\n"
             "• New York\n"
-            "• London\n\n"
+            "• London\n"
+            "• Madrid, London, Paris (varias a la vez)\n\n"
             "📊 *Información incluida:*\n"
             "• Temperatura actual\n"
             "• Sensación térmica\n"
@@ -189,43 +451,29 @@ class WhatsAppWeatherBot:
             "• Presión atmosférica\n"
             "• Velocidad del viento\n\n"
             "💬 *Comandos:*\n"
-            "• help, ayuda o menu - Mostrar esta ayuda\n\n"
+            "• help, ayuda o menu - Mostrar esta ayuda\n"
+            "• suscribir <ciudad> <HH:MM> - Pronóstico diario\n"
+            "• desuscribir [ciudad] - Dejar de recibirlo\n"
+            "• yo [ciudad] - Tu perfil y ciudad por defecto\n"
+            "• unidades c|f - Celsius o Fahrenheit\n"
+            "• ? - El clima de tu ciudad de siempre\n\n"
             "🚀 ¡Envía el nombre de una ciudad para comenzar!"
         )
         await self.send_message(chat_id, help_text)
 
-    def get_weather_emoji(self, description: str) -> str:
-        """Obtener emoji apropiado según la descripción del clima"""
-        description_lower = description.lower()
-
-        if any(word in description_lower for word in ['sunny', 'clear', 'despejado', 'soleado']):
-            return '☀️'
-        elif any(word in description_lower for word in ['cloud', 'nublado', 'parcialmente']):
-            return '⛅'
-        elif any(word in description_lower for word in ['rain', 'lluvia', 'llovizna']):
-            return '🌧️'
-        elif any(word in description_lower for word in ['storm', 'tormenta']):
-            return '⛈️'
-        elif any(word in description_lower for word in ['snow', 'nieve']):
-            return '❄️'
-        elif any(word in description_lower for word in ['fog', 'mist', 'niebla']):
-            return '🌫️'
-        else:
-            return '🌤️'
-
     async def send_message(self, chat_id: str, message: str):
-        """Enviar mensaje a WhatsApp usando Green API"""
+        """Encolar mensaje a WhatsApp (lo envía el dispatcher saliente por Green API)"""
         try:
-            if not self.greenapi:
+            if not self.greenapis:
                 logger.error("Green API no está inicializada")
                 return False
 
-            response = self.greenapi.sending.sendMessage(chat_id, message)
-            logger.info(f"Mensaje enviado a {chat_id}: {response.data}")
+            outbound = self.outbounds.get(self.chat_instances.get(chat_id), self.outbound)
+            await outbound.send(chat_id, message)
             return True
 
         except Exception as e:
-            logger.error(f"Error al enviar mensaje: {e}")
+            logger.error("Error al encolar mensaje: %s", e)
             return False
 
     async def process_notification(self, notification):
@@ -254,42 +502,175 @@ class WhatsAppWeatherBot:
 
             message_text = message_data.get('textMessageData', {}).get('textMessage', '')
 
+            if len(self.outbounds) > 1:
+                instance_id = (body.get('instanceData') or {}).get('idInstance')
+                self.chat_instances[chat_id] = str(instance_id)
+                self.chat_instances.move_to_end(chat_id)
+                if len(self.chat_instances) > CHAT_INSTANCES_MAX:
+                    self.chat_instances.popitem(last=False)
+
             # Limpiar número de teléfono
             phone_number = sender.replace('@c.us', '') if '@c.us' in sender else sender
 
-            logger.info(f"Mensaje recibido de {phone_number}: {message_text}")
+            logger.debug("Mensaje recibido de %s: %s", phone_number, message_text)
+            mark_message_start()
 
             # Procesar mensaje
-            if message_text and not message_text.startswith('/'):
+            words = message_text.split()
+            keyword = words[0].lower() if words else ''
+            if keyword in SUBSCRIBE_KEYWORDS:
+                await self.process_subscribe(chat_id, words[1:])
+            elif keyword in UNSUBSCRIBE_KEYWORDS:
+                await self.process_unsubscribe(chat_id, words[1:])
+            elif keyword in PROFILE_KEYWORDS:
+                await self.process_profile(chat_id, phone_number, words[1:])
+            elif keyword in UNITS_KEYWORDS:
+                await self.process_units(chat_id, phone_number, words[1:])
+            elif message_text and not message_text.startswith('/'):
                 await self.process_weather_request(chat_id, phone_number, message_text)
             elif message_text.lower() in ['/start', '/help', 'help', 'ayuda', 'menu']:
                 await self.send_help_message(chat_id)
 
         except Exception as e:
-            logger.error(f"Error al procesar notificación: {e}")
+            logger.error("Error al procesar notificación: %s", e)
 
     async def start_polling(self):
         """Iniciar polling para recibir mensajes de WhatsApp"""
         logger.info("🔄 Iniciando polling de WhatsApp...")
 
-        while True:
-            try:
-                # Recibir notificaciones
-                response = self.greenapi.receiving.receiveNotification()
-
-                if response and hasattr(response, 'data') and response.data:
-                    await self.process_notification(response.data)
-
-                    # Eliminar notificación procesada
-                    receipt_id = response.data.get('receiptId')
-                    if receipt_id:
-                        self.greenapi.receiving.deleteNotification(receipt_id)
+        # Las llamadas a Green API corren en hilos y los mensajes se procesan en paralelo;
+        # cada notificación queda en disco antes de confirmarla
+        inbox = DurableInbox()
+        # Un poller por instancia sobre la misma bandeja (sólo el primero reprocesa)
+        pollers = []
+        for index, (instance_id, greenapi) in enumerate(self.greenapis.items()):
+            poller = NotificationPoller(greenapi, self.process_notification, inbox, replay=index == 0)
+            suffix = f'_{instance_id}' if len(self.greenapis) > 1 else ''
+            self.metrics.track_queue(f'inbound{suffix}', lambda poller=poller: poller.queue_depth)
+            self.metrics.track_stats(f'poller{suffix}', poller.stats)
+            pollers.append(poller)
+        self.metrics.track_stats('inbox', inbox.stats)
+        try:
+            await asyncio.gather(*(poller.run() for poller in pollers))
+        finally:
+            await inbox.close()
+
+    async def start_services(self):
+        """Pool hacia la API, dispatchers salientes, scheduler y precalentamiento (en paralelo)"""
+        await self.backend.start()
+        for outbound in self.outbounds.values():
+            outbound.start()
+        await asyncio.gather(
+            self.scheduler.start(), self.profiles.start(),
+            boot_warm_up(self.backend, self.cache_snapshot, self.batcher, self.gazetteer,
+                         API_BASE_URL, 'whatsapp'),
+        )
 
-                await asyncio.sleep(2)  # Esperar 2 segundos entre checks
+    async def stop_services(self):
+        await self.scheduler.stop()
+        for outbound in self.outbounds.values():
+            await outbound.stop()
+        await self.backend.close()
+        await self.cache_snapshot.stop()
+        await self.profiles.stop()
+        await save_hot_cities(self.profiles, self.cache, self.snapshot_path)
+
+
+def build_supervisor(metrics=None, workers: int = WHATSAPP_WORKERS) -> Supervisor:
+    """Supervisor multiproceso con un cliente de Green API por instancia"""
+    from whatsapp_api_client_python import API
+    greenapis = [
+        (instance_id, API.GreenApi(instance_id, token, host=GREEN_API_HOST))
+        for instance_id, token in GREEN_API_INSTANCES
+    ]
+    return Supervisor(greenapis, worker_command(__file__), workers=workers, metrics=metrics)
+
+
+async def run_supervisor():
+    """Modo multiproceso: este proceso sólo recibe y reparte; los workers responden"""
+    logger.info("🚀 Iniciando supervisor de WhatsApp con %d workers...", WHATSAPP_WORKERS)
+    if not GREEN_API_INSTANCES:
+        logger.error("GREEN_API_INSTANCE_ID y GREEN_API_TOKEN (o GREEN_API_INSTANCES) deben estar configurados")
+        return
+
+    metrics = BotMetrics('whatsapp')
+    diagnostics = LoopDiagnostics('whatsapp')
+    diagnostics.start()
+    metrics.track_stats('loop', diagnostics.stats)
+    metrics_server = MetricsServer()
+    diagnostics.add_routes(metrics_server.app)
+    supervisor = build_supervisor(metrics)
+    # Listo en cuanto haya al menos un worker en el anillo
+    metrics_server.readiness.add('workers', lambda: bool(supervisor.ring.nodes))
+    await metrics_server.start()
+
+    task = asyncio.create_task(supervisor.run())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        logger.info("Supervisor detenido")
+    finally:
+        await metrics_server.stop()
+        await diagnostics.stop()
+
+
+async def boot(bot: WhatsAppWeatherBot, readiness) -> bool:
+    """Verificar Green API y levantar servicios y precalentamiento en paralelo"""
+    readiness.set('green_api', False)
+    readiness.set('warmup', False)
+    authorized, _ = await asyncio.gather(bot.initialize_api(), bot.start_services())
+    readiness.set('green_api', authorized)
+    readiness.set('warmup')
+    return authorized
+
+
+async def run_worker():
+    """Worker del supervisor: procesa los chats que le tocan en el anillo"""
+    # Ctrl+C llega a todo el grupo de procesos: el worker sale cuando el supervisor cierra el canal
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGINT, lambda: None)
 
-            except Exception as e:
-                logger.error(f"Error en polling: {e}")
-                await asyncio.sleep(10)  # Esperar más tiempo si hay error
+    bot = WhatsAppWeatherBot()
+    # Todos los workers se precalientan del snapshot; sólo uno lo reescribe
+    if WORKER_NAME != 'w0':
+        bot.snapshot_path = None
+    # El cache de cada worker depende de sus chats: un snapshot propio
+    # (CACHE_SNAPSHOT_PATH vacío lo desactiva también en los workers)
+    if CACHE_SNAPSHOT_PATH:
+        bot.cache_snapshot.path = f"{CACHE_SNAPSHOT_PATH}.{WORKER_NAME}"
+    diagnostics = LoopDiagnostics('whatsapp')
+    diagnostics.start()
+    bot.metrics.track_stats('loop', diagnostics.stats)
+
+    # Cada worker envía sólo los pronósticos de los chats que le pertenecen
+    ring = HashRing()
+    bot.scheduler.owns = lambda chat_id: ring.owner(chat_id) == WORKER_NAME
+    reloads = set()
+
+    def on_ring(nodes):
+        ring.reset(nodes)
+        task = asyncio.create_task(bot.scheduler.reload())
+        reloads.add(task)
+        task.add_done_callback(reloads.discard)
+
+    metrics_server = MetricsServer()
+    diagnostics.add_routes(metrics_server.app)
+    await metrics_server.start()
+    try:
+        # Un worker que entra al anillo recibe chats enseguida: avisa recién estando caliente
+        if not await boot(bot, metrics_server.readiness):
+            logger.error("❌ Worker %s: no se pudo inicializar Green API", WORKER_NAME)
+            sys.exit(1)
+        logger.info("Worker %s listo", WORKER_NAME)
+        await WorkerLink(bot.process_notification, on_ring).run()
+    finally:
+        await asyncio.gather(*reloads, return_exceptions=True)
+        await bot.stop_services()
+        await metrics_server.stop()
+        await diagnostics.stop()
 
 async def main():
     """Función principal"""
@@ -297,14 +678,34 @@ async def main():
 
     bot = WhatsAppWeatherBot()
 
-    # Inicializar API
-    if await bot.initialize_api():
-        logger.info("Bot de WhatsApp iniciado correctamente")
-
-        # Iniciar polling
-        await bot.start_polling()
-    else:
-        logger.error("❌ No se pudo inicializar el bot de WhatsApp")
+    # Lag del loop, callbacks lentos y profiler a pedido (SIGUSR1); arranca
+    # antes que Green API para ver también las llamadas bloqueantes del inicio
+    diagnostics = LoopDiagnostics('whatsapp')
+    diagnostics.start()
+    bot.metrics.track_stats('loop', diagnostics.stats)
+
+    # /healthz responde desde el primer momento; /readyz recién con todo caliente
+    metrics_server = MetricsServer()
+    diagnostics.add_routes(metrics_server.app)
+    await metrics_server.start()
+    try:
+        # Inicializar API (en paralelo con el pool, el scheduler y el precalentamiento)
+        if await boot(bot, metrics_server.readiness):
+            logger.info("Bot de WhatsApp iniciado correctamente")
+            # Iniciar polling
+            await bot.start_polling()
+        else:
+            logger.error("❌ No se pudo inicializar el bot de WhatsApp")
+    finally:
+        await bot.stop_services()
+        await metrics_server.stop()
+        await diagnostics.stop()
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    configure_logging()
+    if '--worker' in sys.argv:
+        asyncio.run(run_worker())
+    elif WHATSAPP_WORKERS > 0:
+        asyncio.run(run_supervisor())
+    else:
+        asyncio.run(main())
\ No newline at end of file
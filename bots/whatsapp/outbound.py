@@ -0,0 +1,181 @@
+import os
+import time
+import zlib
+import random
+import asyncio
+import logging
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from weatherkit.ratelimit import TokenBucket, BucketMap
+from weatherkit.stats import LatencyWindow
+from weatherkit.metrics import message_started
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del dispatcher saliente
+SEND_WORKERS = int(os.getenv('WHATSAPP_SEND_WORKERS', '4'))
+SEND_QUEUE_SIZE = int(os.getenv('WHATSAPP_SEND_QUEUE_SIZE', '500'))
+SEND_RATE = float(os.getenv('WHATSAPP_SEND_RATE', '5'))
+SEND_BURST = float(os.getenv('WHATSAPP_SEND_BURST', '10'))
+CHAT_RATE = float(os.getenv('WHATSAPP_CHAT_RATE', '1'))
+CHAT_BURST = float(os.getenv('WHATSAPP_CHAT_BURST', '3'))
+SEND_RETRIES = int(os.getenv('WHATSAPP_SEND_RETRIES', '4'))
+SEND_BACKOFF_BASE = float(os.getenv('WHATSAPP_SEND_BACKOFF_BASE', '0.5'))
+SEND_BACKOFF_MAX = float(os.getenv('WHATSAPP_SEND_BACKOFF_MAX', '15'))
+
+
+class OutboundDispatcher:
+    """Cola de envíos hacia Green API con orden por chat y límite de tasa.
+
+    Cada chat_id se asigna siempre al mismo worker (hash estable), así los
+    mensajes de un chat salen en orden. Antes de cada envío se consume un
+    token de la cuenta y otro del chat; los errores transitorios (429, 5xx,
+    fallas de red) se reintentan con backoff exponencial con jitter.
+
+    Un chat sin tokens no frena al worker: sus mensajes se apartan en una
+    fila propia que vacía otra tarea a medida que el bucket se recarga, y
+    los que lleguen mientras tanto se suman detrás para no adelantarse.
+    """
+
+    def __init__(self, send, workers: int = SEND_WORKERS, queue_size: int = SEND_QUEUE_SIZE,
+                 metrics=None):
+        self._send = send
+        self.metrics = metrics
+        self.workers = workers
+        self.queues = [asyncio.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self.account_bucket = TokenBucket(SEND_RATE, SEND_BURST)
+        self.chat_buckets = BucketMap(CHAT_RATE, CHAT_BURST)
+        self.latency = LatencyWindow()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='greenapi-send')
+        self._tasks = []
+        # chat_id -> mensajes apartados hasta que el chat recupere tokens
+        self._held = {}
+        self._drains = set()
+        self.throttled = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def stats(self) -> dict:
+        """Métricas del dispatcher (profundidad de cola y latencia de envío)"""
+        return {
+            'queue_depth': self.queue_depth,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'throttled_chats': len(self._held),
+            'send_p50': self.latency.percentile(50),
+            'send_p99': self.latency.percentile(99),
+        }
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Esperar a que se vacíen las colas (hasta `timeout`) y detener workers"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Se descartan %d mensajes pendientes al apagar", self.queue_depth)
+        for task in [*self._tasks, *self._drains]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._drains, return_exceptions=True)
+        self._tasks = []
+        self._held.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def send(self, chat_id: str, message: str) -> None:
+        """Encolar un mensaje (espera sólo si la cola del worker está llena)"""
+        index = zlib.crc32(chat_id.encode()) % self.workers
+        await self.queues[index].put((chat_id, message, message_started.get()))
+
+    async def _worker(self, index: int) -> None:
+        queue = self.queues[index]
+        while True:
+            item = await queue.get()
+            chat_id = item[0]
+            held = self._held.get(chat_id)
+            if held is not None:
+                # El chat ya espera tokens: va detrás de sus mensajes anteriores
+                held.append(item)
+                continue
+            if not self.chat_buckets.get(chat_id).try_acquire():
+                self.throttled += 1
+                self._held[chat_id] = deque([item])
+                task = asyncio.create_task(self._drain(queue, chat_id))
+                self._drains.add(task)
+                task.add_done_callback(self._drains.discard)
+                continue
+            try:
+                await self._send_item(*item)
+            finally:
+                queue.task_done()
+
+    async def _drain(self, queue: asyncio.Queue, chat_id: str) -> None:
+        """Enviar en orden los mensajes apartados de un chat a medida que tiene tokens"""
+        held = self._held[chat_id]
+        bucket = self.chat_buckets.get(chat_id)
+        while held:
+            await bucket.acquire()
+            try:
+                await self._send_item(*held[0])
+            finally:
+                held.popleft()
+                queue.task_done()
+        del self._held[chat_id]
+
+    async def _send_item(self, chat_id: str, message: str, started) -> None:
+        try:
+            await self._deliver(chat_id, message, started)
+        except Exception as e:
+            self.failed += 1
+            logger.error("Error al enviar mensaje a %s: %s", chat_id, e)
+
+    async def _deliver(self, chat_id: str, message: str, started) -> None:
+        """Enviar con reintentos; el token del chat para el primer intento ya se consumió"""
+        chat_bucket = self.chat_buckets.get(chat_id)
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(SEND_RETRIES + 1):
+            if attempt:
+                await chat_bucket.acquire()
+            await self.account_bucket.acquire()
+
+            send_started = time.perf_counter()
+            response = await loop.run_in_executor(
+                self.executor, functools.partial(self._send, chat_id, message)
+            )
+            finished = time.perf_counter()
+            self.latency.observe(finished - send_started)
+            if self.metrics is not None:
+                self.metrics.send_latency.observe(finished - send_started)
+
+            code = getattr(response, 'code', None)
+            if code == 200:
+                self.sent += 1
+                if self.metrics is not None and started is not None:
+                    self.metrics.reply_latency.observe(finished - started)
+                logger.debug("Mensaje enviado a %s: %s", chat_id, response.data)
+                return
+
+            # 4xx distinto de 429: el reintento no va a cambiar nada
+            if code is not None and 400 <= code < 500 and code != 429:
+                break
+
+            if attempt < SEND_RETRIES:
+                self.retried += 1
+                backoff = min(SEND_BACKOFF_MAX, SEND_BACKOFF_BASE * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, backoff))
+
+        self.failed += 1
+        logger.error(
+            "No se pudo enviar mensaje a %s (status %s): %s",
+            chat_id, code, getattr(response, 'error', None)
+        )
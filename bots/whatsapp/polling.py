@@ -0,0 +1,157 @@
+import os
+import zlib
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del motor de polling
+POLL_WORKERS = int(os.getenv('WHATSAPP_POLL_WORKERS', '8'))
+POLL_QUEUE_SIZE = int(os.getenv('WHATSAPP_POLL_QUEUE_SIZE', '100'))
+POLL_THREADS = int(os.getenv('WHATSAPP_POLL_THREADS', '4'))
+POLL_IDLE_MIN = float(os.getenv('WHATSAPP_POLL_IDLE_MIN', '0.25'))
+POLL_IDLE_MAX = float(os.getenv('WHATSAPP_POLL_IDLE_MAX', '5'))
+POLL_ERROR_MAX = float(os.getenv('WHATSAPP_POLL_ERROR_MAX', '30'))
+
+
+class NotificationPoller:
+    """Polling de Green API sin bloquear el event loop.
+
+    Un único receptor trae notificaciones (las llamadas del SDK son
+    síncronas y corren en un pool de hilos), las guarda en la bandeja de
+    entrada persistente y recién entonces confirma el receiptId, sin
+    esperar a que se procesen. Un grupo de workers las procesa en
+    paralelo, cada uno con su cola: un chat va siempre al mismo worker
+    (hash estable del chatId), así sus mensajes se responden en orden.
+    Cada notificación se marca como procesada al terminar; al
+    arrancar se reencolan las que quedaron pendientes. Mientras haya
+    mensajes se vuelve a consultar enseguida; con la cola vacía la espera
+    crece hasta POLL_IDLE_MAX.
+    """
+
+    def __init__(self, greenapi, handler, inbox, workers: int = POLL_WORKERS,
+                 queue_size: int = POLL_QUEUE_SIZE, threads: int = POLL_THREADS, replay: bool = True):
+        self.greenapi = greenapi
+        self.handler = handler
+        self.inbox = inbox
+        self.workers = workers
+        # Con varias instancias sobre la misma bandeja, sólo un poller reprocesa
+        self.replay = replay
+        self.queues = [asyncio.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='greenapi')
+        self.received = 0
+        self.duplicates = 0
+        self.replayed = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'received': self.received,
+            'duplicates': self.duplicates,
+            'replayed': self.replayed,
+        }
+
+    async def call(self, func, *args):
+        """Ejecutar una llamada síncrona del SDK fuera del event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def run(self) -> None:
+        """Arrancar receptor y workers hasta que se cancele la tarea"""
+        tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        try:
+            # Lo que quedó sin procesar en la ejecución anterior va primero
+            pending = await self.inbox.pending() if self.replay else []
+            if pending:
+                logger.info("Reprocesando %d notificaciones pendientes", len(pending))
+            for item in pending:
+                self.replayed += 1
+                await self._enqueue(*item)
+            await self._receive_loop()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _receive_loop(self) -> None:
+        idle_delay = 0.0
+        error_delay = 0.0
+
+        while True:
+            try:
+                response = await self.call(self.greenapi.receiving.receiveNotification)
+                error_delay = 0.0
+            except Exception as e:
+                error_delay = min(POLL_ERROR_MAX, error_delay * 2 or 1.0)
+                logger.error("Error en polling: %s (reintento en %.1fs)", e, error_delay)
+                await asyncio.sleep(error_delay)
+                continue
+
+            notification = response.data if response is not None else None
+            if not notification:
+                # Cola vacía: esperar cada vez un poco más
+                idle_delay = min(POLL_IDLE_MAX, idle_delay * 2 or POLL_IDLE_MIN)
+                await asyncio.sleep(idle_delay)
+                continue
+
+            idle_delay = 0.0
+            self.received += 1
+            receipt_id = notification.get('receiptId')
+
+            try:
+                row_id = await self.inbox.put(notification)
+            except Exception as e:
+                # Sin guardarla no se confirma: Green API la vuelve a entregar
+                error_delay = min(POLL_ERROR_MAX, error_delay * 2 or 1.0)
+                logger.error("Error al guardar notificación %s: %s (reintento en %.1fs)",
+                             receipt_id, e, error_delay)
+                await asyncio.sleep(error_delay)
+                continue
+
+            # Ya está a salvo en disco: confirmarla libera la cola de Green API
+            if receipt_id is not None:
+                await self._ack(receipt_id)
+
+            if row_id is None:
+                self.duplicates += 1
+            else:
+                # Espera sólo si la cola de ese worker está llena (backpressure)
+                await self._enqueue(row_id, notification)
+
+    async def _enqueue(self, row_id: int, notification) -> None:
+        """Encolar en el worker del chat (los mensajes de un chat no se adelantan)"""
+        body = notification.get('body') if isinstance(notification, dict) else None
+        sender = body.get('senderData') if isinstance(body, dict) else None
+        chat_id = (sender.get('chatId') if isinstance(sender, dict) else None) or ''
+        index = zlib.crc32(str(chat_id).encode()) % self.workers
+        await self.queues[index].put((row_id, notification))
+
+    async def _ack(self, receipt_id) -> None:
+        """Borrar la notificación de la cola de Green API"""
+        try:
+            await self.call(self.greenapi.receiving.deleteNotification, receipt_id)
+        except Exception as e:
+            logger.error("Error al confirmar notificación %s: %s", receipt_id, e)
+
+    async def _worker(self, index: int) -> None:
+        queue = self.queues[index]
+        while True:
+            row_id, notification = await queue.get()
+            try:
+                await self.handler(notification)
+            except Exception as e:
+                logger.error("Worker %d: error al procesar notificación: %s", index, e)
+            try:
+                await self.inbox.complete(row_id)
+            except Exception as e:
+                # Queda pendiente: se reprocesa en el próximo arranque
+                logger.error("Worker %d: no se pudo marcar la notificación %d: %s", index, row_id, e)
+            finally:
+                queue.task_done()
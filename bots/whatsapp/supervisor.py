@@ -0,0 +1,431 @@
+import os
+import sys
+import time
+import bisect
+import signal
+import socket
+import asyncio
+import hashlib
+import logging
+
+from weatherkit.model import loads, dumps
+
+from polling import NotificationPoller, POLL_WORKERS
+from inbox import DurableInbox
+
+logger = logging.getLogger(__name__)
+
+# Variables de entorno del modo multiproceso
+WHATSAPP_WORKERS = int(os.getenv('WHATSAPP_WORKERS', '0'))  # 0 = un solo proceso
+WORKER_NAME = os.getenv('WHATSAPP_WORKER_NAME', '')
+WORKER_FD = int(os.getenv('WHATSAPP_WORKER_FD', '-1'))
+HASH_REPLICAS = int(os.getenv('WHATSAPP_HASH_REPLICAS', '64'))
+WORKER_RESTART_MAX = float(os.getenv('WHATSAPP_WORKER_RESTART_MAX', '30'))
+WORKER_STOP_TIMEOUT = float(os.getenv('WHATSAPP_WORKER_STOP_TIMEOUT', '15'))
+
+# Un worker que vivió más que esto reinicia su backoff al caerse
+_STABLE_UPTIME = 60
+_LINE_LIMIT = 2 ** 20
+
+
+class HashRing:
+    """Hashing consistente con nodos virtuales.
+
+    Al agregar o quitar un nodo sólo cambian de dueño las claves de los
+    tramos del anillo que le tocan a ese nodo (~1/N del total).
+    """
+
+    def __init__(self, nodes=(), replicas: int = HASH_REPLICAS):
+        self.replicas = replicas
+        self.nodes = set()
+        self._points = []
+        self._owners = []
+        self.reset(nodes)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+    def reset(self, nodes) -> None:
+        self.nodes = set(nodes)
+        points = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in self.nodes for i in range(self.replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def add(self, node: str) -> None:
+        if node not in self.nodes:
+            self.reset(self.nodes | {node})
+
+    def remove(self, node: str) -> None:
+        if node in self.nodes:
+            self.reset(self.nodes - {node})
+
+    def owner(self, key: str):
+        """Nodo dueño de `key` (None con el anillo vacío)"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+def chat_of(notification: dict) -> str:
+    """chatId de una notificación de Green API ('' si no trae)"""
+    body = notification.get('body') or {}
+    return (body.get('senderData') or {}).get('chatId') or body.get('chatId') or ''
+
+
+def _encode(message: dict) -> bytes:
+    return dumps(message) + b'\n'
+
+
+class _WorkerHandle:
+    __slots__ = ('name', 'process', 'reader', 'writer', 'inflight', 'ready', 'retiring', 'started', 'task')
+
+    def __init__(self, name: str, process, reader, writer):
+        self.name = name
+        self.process = process
+        self.reader = reader
+        self.writer = writer
+        self.inflight = {}
+        self.ready = False
+        self.retiring = False
+        self.started = time.monotonic()
+        self.task = None
+
+
+class Supervisor:
+    """Reparte las notificaciones de WhatsApp entre varios procesos worker.
+
+    El supervisor es el único que habla con la cola de Green API (un poller
+    por instancia) y el único dueño de la bandeja de entrada persistente.
+    Cada notificación va al worker dueño de su chatId en un anillo de
+    hashing consistente, así el orden por chat y lo que el worker guarda
+    de ese chat quedan en un solo proceso. La comunicación es local:
+    líneas JSON sobre un socketpair heredado por el worker.
+
+    Rebalanceo sin desorden: mientras un chat tenga mensajes en vuelo en
+    un worker, los siguientes van al mismo worker aunque el anillo ya diga
+    otra cosa; recién con el chat vacío se aplica el nuevo dueño. Si un
+    worker se cae, lo que tenía en vuelo se reenvía al nuevo dueño y el
+    worker se vuelve a lanzar con backoff. SIGTTIN agrega un worker y
+    SIGTTOU retira uno (deja de recibir chats nuevos y sale al vaciarse).
+    """
+
+    def __init__(self, greenapis: list, command: list, workers: int = WHATSAPP_WORKERS, metrics=None):
+        self.greenapis = greenapis
+        self.command = command
+        self.size = max(1, workers)
+        self.metrics = metrics
+        self.ring = HashRing()
+        self.workers = {}
+        self.chats = {}
+        self.pollers = []
+        self._seq = 0
+        self._orphans = []
+        self._failures = {}
+        self._available = asyncio.Event()
+        self._stopping = False
+        self.dispatched = 0
+        self.redispatched = 0
+        self.restarts = 0
+
+    def stats(self) -> dict:
+        return {
+            'workers': len(self.workers),
+            'workers_ready': len(self.ring.nodes),
+            'inflight': sum(len(handle.inflight) for handle in self.workers.values()),
+            'chats_inflight': len(self.chats),
+            'dispatched': self.dispatched,
+            'redispatched': self.redispatched,
+            'restarts': self.restarts,
+        }
+
+    async def run(self) -> None:
+        """Lanzar los workers y hacer polling de todas las instancias hasta que se cancele"""
+        inbox = DurableInbox()
+        # Las esperas de los pollers son las respuestas de los workers: escalar con N
+        self.pollers = [
+            NotificationPoller(api, self.dispatch, inbox, workers=POLL_WORKERS * self.size, replay=index == 0)
+            for index, (_, api) in enumerate(self.greenapis)
+        ]
+        if self.metrics is not None:
+            self.metrics.track_stats('supervisor', self.stats)
+            self.metrics.track_stats('inbox', inbox.stats)
+            for (instance, _), poller in zip(self.greenapis, self.pollers):
+                suffix = f'_{instance}' if len(self.pollers) > 1 else ''
+                self.metrics.track_stats(f'poller{suffix}', poller.stats)
+
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTTIN, self.scale, 1)
+        loop.add_signal_handler(signal.SIGTTOU, self.scale, -1)
+        for index in range(self.size):
+            await self._spawn(f"w{index}")
+        logger.info("Supervisor con %d workers y %d instancias de Green API", self.size, len(self.pollers))
+        try:
+            await asyncio.gather(*(poller.run() for poller in self.pollers))
+        finally:
+            loop.remove_signal_handler(signal.SIGTTIN)
+            loop.remove_signal_handler(signal.SIGTTOU)
+            await self._shutdown()
+            await inbox.close()
+
+    async def dispatch(self, notification: dict) -> None:
+        """Handler de los pollers: entregar al worker del chat y esperar que lo procese"""
+        item = (self._next_seq(), chat_of(notification), notification, asyncio.get_running_loop().create_future())
+        while not self._assign(item):
+            self._available.clear()
+            await self._available.wait()
+        self.dispatched += 1
+        await item[3]
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def _target(self, chat: str):
+        entry = self.chats.get(chat)
+        if entry is not None:
+            handle = self.workers.get(entry[0])
+            if handle is not None and handle.ready:
+                return handle
+        name = self.ring.owner(chat)
+        return self.workers.get(name) if name is not None else None
+
+    def _assign(self, item) -> bool:
+        """Mandar `item` al worker que corresponde; False si no hay ninguno listo"""
+        seq, chat, notification, _ = item
+        handle = self._target(chat)
+        if handle is None:
+            return False
+        entry = self.chats.setdefault(chat, [handle.name, 0])
+        entry[0] = handle.name
+        entry[1] += 1
+        handle.inflight[seq] = item
+        # Si el worker murió la escritura no llega; el lector detecta el EOF y reenvía
+        handle.writer.write(_encode({'op': 'notification', 'seq': seq, 'body': notification}))
+        return True
+
+    def _finish(self, handle: _WorkerHandle, seq: int) -> None:
+        item = handle.inflight.pop(seq, None)
+        if item is None:
+            return
+        _, chat, _, future = item
+        self._release(chat)
+        if not future.done():
+            future.set_result(None)
+        if handle.retiring and not handle.inflight:
+            handle.writer.close()
+
+    def _release(self, chat: str) -> None:
+        entry = self.chats.get(chat)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.chats[chat]
+
+    async def _spawn(self, name: str) -> None:
+        parent, child = socket.socketpair()
+        env = dict(
+            os.environ,
+            WHATSAPP_WORKERS='0',
+            WHATSAPP_WORKER_NAME=name,
+            WHATSAPP_WORKER_FD=str(child.fileno()),
+            **self._worker_env(name),
+        )
+        try:
+            process = await asyncio.create_subprocess_exec(*self.command, pass_fds=(child.fileno(),), env=env)
+        finally:
+            child.close()
+        reader, writer = await asyncio.open_connection(sock=parent, limit=_LINE_LIMIT)
+        handle = _WorkerHandle(name, process, reader, writer)
+        self.workers[name] = handle
+        handle.task = asyncio.create_task(self._read(handle))
+        logger.info("Worker %s lanzado (pid %d)", name, process.pid)
+
+    def _worker_env(self, name: str) -> dict:
+        """Cuota de envío por worker y puerto de métricas propio"""
+        env = {}
+        # El límite de la cuenta de Green API se reparte entre los workers
+        for key, default in (('WHATSAPP_SEND_RATE', '5'), ('WHATSAPP_SEND_BURST', '10')):
+            env[key] = str(float(os.getenv(key, default)) / self.size)
+        port = int(os.getenv('METRICS_PORT', '9100'))
+        env['METRICS_PORT'] = str(port + 1 + int(name[1:])) if port else '0'
+        return env
+
+    async def _read(self, handle: _WorkerHandle) -> None:
+        try:
+            while True:
+                line = await handle.reader.readline()
+                if not line:
+                    break
+                message = loads(line)
+                op = message.get('op')
+                if op == 'done':
+                    self._finish(handle, message['seq'])
+                elif op == 'ready':
+                    self._ready(handle)
+        except (ConnectionError, ValueError) as e:
+            logger.error("Worker %s: canal roto: %s", handle.name, e)
+        await self._lost(handle)
+
+    def _ready(self, handle: _WorkerHandle) -> None:
+        handle.ready = True
+        self.ring.add(handle.name)
+        self._broadcast_ring()
+        logger.info("Worker %s listo; anillo: %s", handle.name, ', '.join(sorted(self.ring.nodes)))
+        orphans, self._orphans = self._orphans, []
+        for item in orphans:
+            if not self._assign(item):
+                self._orphans.append(item)
+        self._available.set()
+
+    def _broadcast_ring(self) -> None:
+        line = _encode({'op': 'ring', 'nodes': sorted(self.ring.nodes)})
+        for handle in self.workers.values():
+            if handle.ready and not handle.writer.is_closing():
+                handle.writer.write(line)
+
+    async def _lost(self, handle: _WorkerHandle) -> None:
+        """El worker salió: sacarlo del anillo, reenviar lo suyo y relanzarlo"""
+        returncode = await handle.process.wait()
+        handle.ready = False
+        self.workers.pop(handle.name, None)
+        self.ring.remove(handle.name)
+        self._broadcast_ring()
+        handle.writer.close()
+
+        items = list(handle.inflight.values())
+        handle.inflight.clear()
+        for _, chat, _, _ in items:
+            self._release(chat)
+        # En orden de llegada para respetar el orden por chat
+        for item in items:
+            self.redispatched += 1
+            if not self._assign(item):
+                self._orphans.append(item)
+        if items:
+            logger.warning("Worker %s: %d notificaciones reenviadas a otros workers", handle.name, len(items))
+
+        if self._stopping or handle.retiring:
+            logger.info("Worker %s terminó (código %s)", handle.name, returncode)
+            return
+        failures = 0 if time.monotonic() - handle.started > _STABLE_UPTIME else self._failures.get(handle.name, 0) + 1
+        self._failures[handle.name] = failures
+        delay = min(WORKER_RESTART_MAX, 2 ** failures - 1)
+        logger.error("Worker %s se cayó (código %s); se relanza en %.0fs", handle.name, returncode, delay)
+        self.restarts += 1
+        await asyncio.sleep(delay)
+        if not self._stopping and handle.name not in self.workers:
+            await self._spawn(handle.name)
+
+    def scale(self, delta: int) -> None:
+        """Agregar (delta > 0) o retirar (delta < 0) un worker en caliente"""
+        if delta > 0:
+            index = next(i for i in range(len(self.workers) + 1) if f"w{i}" not in self.workers)
+            self.size += 1
+            asyncio.ensure_future(self._spawn(f"w{index}"))
+        elif len(self.ring.nodes) > 1:
+            name = max(self.ring.nodes, key=lambda node: int(node[1:]))
+            handle = self.workers[name]
+            self.size -= 1
+            handle.retiring = True
+            # Sin chats nuevos; los que tiene en vuelo terminan ahí
+            self.ring.remove(name)
+            self._broadcast_ring()
+            if not handle.inflight:
+                handle.writer.close()
+            logger.info("Retirando worker %s", name)
+
+    async def _shutdown(self) -> None:
+        """Cerrar los canales (cada worker termina lo que tiene y sale) y esperarlos"""
+        self._stopping = True
+        handles = list(self.workers.values())
+        for handle in handles:
+            handle.writer.close()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(handle.process.wait() for handle in handles)), WORKER_STOP_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            for handle in handles:
+                if handle.process.returncode is None:
+                    handle.process.kill()
+        await asyncio.gather(*(handle.task for handle in handles), return_exceptions=True)
+        for _, _, _, future in self._orphans:
+            future.cancel()
+
+
+class _ChatSlot:
+    __slots__ = ('lock', 'pending')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class WorkerLink:
+    """Lado worker del canal con el supervisor.
+
+    Procesa las notificaciones en paralelo entre chats y en orden dentro de
+    cada chat, confirma cada una al terminar y avisa los cambios del anillo
+    con `on_ring(nodes)`. Cuando el supervisor cierra el canal termina lo
+    que tiene en vuelo y vuelve.
+    """
+
+    def __init__(self, handler, on_ring=None, fd: int = WORKER_FD):
+        self.handler = handler
+        self.on_ring = on_ring
+        self.fd = fd
+        self._chats = {}
+        self._tasks = set()
+        self._writer = None
+
+    async def run(self) -> None:
+        sock = socket.socket(fileno=self.fd)
+        reader, self._writer = await asyncio.open_connection(sock=sock, limit=_LINE_LIMIT)
+        self._write({'op': 'ready'})
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = loads(line)
+                op = message.get('op')
+                if op == 'notification':
+                    task = asyncio.create_task(self._process(message['seq'], message['body']))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                elif op == 'ring' and self.on_ring is not None:
+                    self.on_ring(message['nodes'])
+        finally:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._writer.close()
+
+    def _write(self, message: dict) -> None:
+        if not self._writer.is_closing():
+            self._writer.write(_encode(message))
+
+    async def _process(self, seq: int, notification: dict) -> None:
+        chat = chat_of(notification)
+        slot = self._chats.get(chat)
+        if slot is None:
+            slot = self._chats[chat] = _ChatSlot()
+        slot.pending += 1
+        try:
+            # asyncio.Lock despierta en orden de llegada: respeta el orden del chat
+            async with slot.lock:
+                await self.handler(notification)
+        except Exception as e:
+            logger.error("Error al procesar notificación de %s: %s", chat, e)
+        finally:
+            slot.pending -= 1
+            if not slot.pending:
+                del self._chats[chat]
+            self._write({'op': 'done', 'seq': seq})
+
+
+def worker_command(script: str) -> list:
+    """Comando para lanzar un worker con el mismo intérprete"""
+    return [sys.executable, os.path.abspath(script), '--worker']
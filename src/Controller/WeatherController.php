@@ -8,6 +8,8 @@ use Symfony\Component\HttpFoundation\JsonResponse;
 use Symfony\Component\HttpFoundation\Request;
 use Symfony\Component\HttpFoundation\Response;
 use Symfony\Component\Routing\Annotation\Route;
+use Symfony\Contracts\HttpClient\Exception\ClientExceptionInterface;
+use Symfony\Contracts\HttpClient\Exception\TransportExceptionInterface;
 use Twig\Environment;
 use Twig\Error\LoaderError;
 use Twig\Error\RuntimeError;
@@ -15,6 +17,9 @@ use Twig\Error\SyntaxError;
 
 class WeatherController extends AbstractController
 {
+    // Ciudades que se consultan por lote; las siguientes vuelven con status 413
+    private const BATCH_MAX_CITIES = 10;
+
     #[Route('/api/weather/current/{city}', name: 'weather_current', methods: ['GET'])]
     public function current(WeatherService $weatherService, string $city): JsonResponse
     {
@@ -35,6 +40,52 @@ class WeatherController extends AbstractController
     }
 
 
+    #[Route('/api/weather/batch', name: 'weather_batch', methods: ['POST'])]
+    public function batch(Request $request, WeatherService $weatherService): JsonResponse
+    {
+        $payload = json_decode($request->getContent(), true);
+        $cities = is_array($payload) ? ($payload['cities'] ?? null) : null;
+
+        if (!is_array($cities) || !$cities) {
+            return $this->json(['error' => 'Ciudades requeridas'], 400);
+        }
+
+        // Cada ciudad falla por separado: una ciudad inválida no invalida el lote
+        $results = [];
+        $cities = array_values(array_unique($cities));
+        foreach ($cities as $index => $city) {
+            if ($index >= self::BATCH_MAX_CITIES) {
+                // Avisar cuáles quedaron afuera para que el cliente las pida por separado
+                $results[] = ['city' => $city, 'status' => 413, 'data' => ['message' => 'Demasiadas ciudades en el lote']];
+                continue;
+            }
+            try {
+                $results[] = ['city' => $city, 'status' => 200, 'data' => $weatherService->getCurrentWeather($city)];
+            } catch (\Exception $e) {
+                [$status, $message] = $this->upstreamError($e);
+                $results[] = ['city' => $city, 'status' => $status, 'data' => ['message' => $message]];
+            }
+        }
+
+        return $this->json(['results' => $results]);
+    }
+
+    /**
+     * Status y mensaje para una consulta fallida: sólo el 404 de OpenWeather es
+     * "ciudad no encontrada"; timeouts, API key inválida o 5xx son errores del proveedor
+     * y el cliente no debe cachearlos como negativos.
+     */
+    private function upstreamError(\Exception $e): array
+    {
+        if ($e instanceof ClientExceptionInterface && $e->getResponse()->getStatusCode() === 404) {
+            return [404, 'Ciudad no encontrada'];
+        }
+        if ($e instanceof TransportExceptionInterface) {
+            return [503, 'El proveedor del clima no responde'];
+        }
+        return [502, 'Error del proveedor del clima'];
+    }
+
     #[Route('/api/weather/search', name: 'weather_search')]
     public function search(Request $request, WeatherService $weatherService): Response
     {